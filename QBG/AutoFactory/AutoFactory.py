@@ -11,8 +11,10 @@ sys.path.append('C:/Users/Administrator/Desktop/Daily-Frequency-Quant/AutoFactor
 sys.path.append('C:/Users/Administrator/Desktop/Daily-Frequency-Quant/AutoFactory/Model/')
 
 from DataLoader import DataLoader
+from UniverseBuilder import UniverseBuilder
 from BackTester import BackTester
 from AutoFormula import AutoFormula
+from PopulationEvaluator import PopulationEvaluator
 from Model import Model
 from DataSetConstructor import DataSetConstructor
 
@@ -37,6 +39,11 @@ AutoFactory类是一个总体的集成类，通过调用其他类实现以下功
 -- 更新：新增滚动回测方法，测试模型的长期稳健性。默认可以回溯100天滚动5天预测
 2021-09-21
 -- 更新：每日预测的逻辑需要改变，具体为：首先需要新增dump_model方法保存模型，然后需要一个字段表明是否需要重训模型
+2026-10-18
+-- 更新：reset_data可以传入UniverseBuilder，直接切换股票池
+-- 新增：test_factors批量测试因子，long_stock_predict改为一次性计算所有因子
+-- 新增：test_population多进程并行测试一批公式
+-- 新增：test_factor_decay测试因子在多个持有期上的IC衰减
 """
 
 
@@ -84,7 +91,15 @@ class AutoFactory:
         self.autoformula = AutoFormula(start_date=start_date, end_date=self.end_date, data=self.data)
         self.dsc = DataSetConstructor(self.data, signal_path=self.dump_signal_path)
 
-    def reset_data(self):  # 可以自行更改top，然后重置
+    def reset_data(self, universe=None, top_constraint=None):  # 可以自行更改top，然后重置
+        """
+        :param universe: 新的UniverseBuilder，传入时直接用已有的数据重新生成top，不需要重新读取数据
+        :param top_constraint: 不传入universe时，可以指定默认股票池的流动性筛选方式
+        """
+        if universe is None and top_constraint is not None:
+            universe = UniverseBuilder.default(top_constraint)
+        if universe is not None:
+            self.data.top = universe.build(self.data.data_dic)
         self.back_tester = BackTester(data=self.data)  # 模拟交易回测
         self.autoformula = AutoFormula(start_date=self.start_date, end_date=self.end_date, data=self.data)
         self.dsc = DataSetConstructor(self.data, signal_path=self.dump_signal_path)
@@ -111,6 +126,73 @@ class AutoFactory:
             return self.autoformula.test_formula(formula, self.data, start_date, end_date,
                                                  prediction_mode=prediction_mode)  # 只返回signal
 
+    def test_factors(self, formulas, start_date=None, end_date=None, prediction_mode=False):  # 批量测试因子
+        """
+        :param formulas: 回测的公式列表，公式之间共同的子树只计算一次
+        :param start_date: 回测开始日期
+        :param end_date: 回测结束日期
+        :param prediction_mode: 是否是最新预测模式，是的话不需要测试，只生成signal
+        :return: 与formulas顺序一致的(统计类的实例, 信号矩阵)列表，预测模式下只返回信号矩阵列表
+        """
+        if prediction_mode:
+            return self.autoformula.test_formulas(formulas, self.data, start_date, end_date,
+                                                  prediction_mode=prediction_mode)
+        if start_date is None:
+            start_date = self.start_date
+        if end_date is None:
+            end_date = self.end_date
+        results = self.autoformula.test_formulas(formulas, self.data, start_date, end_date)
+        for formula, (stats, signal) in zip(formulas, results):
+            print('{}\nmean IC: {:.4f}, auto_corr: {:.4f}, positive_IC_rate: {:.4f}, IC_IR: {:.4f}'. \
+                  format(formula, stats.mean_IC, stats.auto_corr, stats.positive_IC_rate, stats.IC_IR))
+        return results
+
+    def test_factor_decay(self, formula, start_date=None, end_date=None, horizons=(1, 2, 5, 10),
+                          return_type='close_close'):  # 测试因子的IC衰减
+        """
+        :param formula: 回测的公式
+        :param start_date: 回测开始日期
+        :param end_date: 回测结束日期
+        :param horizons: 持有期列表，收益率直接从已有的价格矩阵生成，不需要重新读取数据
+        :param return_type: 买入和卖出使用的价格，例如close_close，open_open
+        :return: 返回DecayStats实例以及信号矩阵
+        """
+        if start_date is None:
+            start_date = self.start_date
+        if end_date is None:
+            end_date = self.end_date
+        stats, signal = self.autoformula.test_formula_decay(formula, self.data, start_date, end_date,
+                                                            horizons=horizons, return_type=return_type)
+        for k, h in enumerate(stats.horizons):
+            print('horizon: {}, mean IC: {:.4f}, mean rank IC: {:.4f}, IC_IR: {:.4f}'. \
+                  format(h, stats.mean_IC[k], stats.mean_rank_IC[k], stats.IC_IR[k]))
+        return stats, signal
+
+    def test_population(self, formulas, start_date=None, end_date=None, num_workers=None, timeout=300,
+                        share_path=None):  # 多进程并行测试一批公式
+        """
+        :param formulas: 公式列表，可以是字符串或者FormulaTree生成的公式树
+        :param start_date: 回测开始日期
+        :param end_date: 回测结束日期
+        :param num_workers: 进程数，默认是CPU核数
+        :param timeout: 单个公式最长的计算时间，超时的公式直接放弃
+        :param share_path: 子进程共享矩阵的文件夹，默认放在数据路径下
+        :return: 按完成顺序排列的(公式, 统计类的实例, 错误信息)列表
+        """
+        if share_path is None:
+            share_path = '{}/Population'.format(self.data_path)
+        evaluator = PopulationEvaluator(self.data, share_path, start_date=start_date, end_date=end_date,
+                                        num_workers=num_workers, timeout=timeout)
+        results = []
+        for formula, stats, error in evaluator.evaluate(formulas):
+            if stats is None:
+                print('{}\nfailed: {}'.format(formula, error))
+            else:
+                print('{}\nmean IC: {:.4f}, auto_corr: {:.4f}, positive_IC_rate: {:.4f}, IC_IR: {:.4f}'. \
+                      format(formula, stats.mean_IC, stats.auto_corr, stats.positive_IC_rate, stats.IC_IR))
+            results.append((formula, stats, error))
+        return results
+
     def rolling_backtest(self, model_name='lgbm', start_date=None, end_date=None, n=3, time_window=5,
                          back_window=100, strategy='long_short', frequency='weekly', start_weekday=1,
                          zt_filter=True):  # 滚动回测
@@ -245,25 +327,18 @@ class AutoFactory:
             model = None
         print('getting signal...')
         if type(factor) == str:
-            num = 0
-            signals_dic = {}
+            formulas = []
             with open('F:/Documents/AutoFactoryData/Factors/{}.txt'.format(factor)) as file:
                 while True:
                     fml = file.readline().strip()
                     if not fml:
                         break
-                    signal = self.test_factor(fml, end_date=date, prediction_mode=True)
-                    signals_dic[num] = signal
-                    num += 1
-            print('there are {} factors'.format(num))
+                    formulas.append(fml)
         else:
-            num = 0
-            signals_dic = {}
-            for fml in factor:
-                signal = self.test_factor(fml, end_date=date, prediction_mode=True)
-                signals_dic[num] = signal
-                num += 1
-            print('there are {} factors'.format(num))
+            formulas = list(factor)
+        signals = self.test_factors(formulas, end_date=date, prediction_mode=True)  # 所有因子一起计算，共同子树只算一次
+        signals_dic = {num: signal for num, signal in enumerate(signals)}
+        print('there are {} factors'.format(len(signals)))
         if retrain_model:
             model = Model()
             self.dsc = DataSetConstructor(self.data)
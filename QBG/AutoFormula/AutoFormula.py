@@ -8,6 +8,12 @@
 -- 更新：AutoFormula类初始化需要传入一个data类
 2021-09-20
 -- 更新：新增多个算子
+2026-10-18
+-- 更新：cal_formula按子树的字符串形式缓存中间结果，叶子节点返回只读视图而不是副本，cache.stats()可以查看命中情况
+-- 新增：cal_formulas和test_formulas，多个公式合并成去重的有向无环图按拓扑顺序计算，中间结果用完即释放
+-- 更新：逐元素的算子直接写入用完的参数，其他没有进入缓存的中间结果用完后放入BufferPool，作为之后算子的out矩阵，减少分配新矩阵
+-- 新增：test_formula_decay，多个持有期的收益率只生成一次并缓存，一次计算IC和Rank IC的衰减
+-- 修复：缓存按(data_dic, 精度)失效，原先Data.astype原地转换data_dic后仍然返回旧精度的缓存结果
 """
 import numpy as np
 import sys
@@ -18,16 +24,20 @@ sys.path.append('C:/Users/Administrator/Desktop/Daily-Frequency-Quant/AutoFactor
 from AutoTester import AutoTester
 from FormulaTree import FormulaTree, Node, FormulaParser
 from SignalGenerator import SignalGenerator
+from FormulaCache import FormulaCache, BufferPool
 
 
 class AutoFormula:
-    def __init__(self, start_date, end_date, data, height=3, symmetric=False):
+    def __init__(self, start_date, end_date, data, height=3, symmetric=False, cache_bytes=1024 ** 3,
+                 pool_buffers=8):
         """
         :param start_date: 该公式树
         :param end_date:
         :param data: Data实例
         :param height: 最大深度
         :param symmetric: 是否对称
+        :param cache_bytes: 子树计算结果缓存的最大字节数，0表示不缓存
+        :param pool_buffers: 每种形状和数据类型最多回收的中间结果个数，0表示不回收
         """
         self.height = height
         self.symmetric = symmetric
@@ -38,6 +48,180 @@ class AutoFormula:
         self.operation = SignalGenerator(data=data)
         self.formula_parser = FormulaParser()
         self.AT = AutoTester()
+        self.cache = FormulaCache(max_bytes=cache_bytes)  # 相同的子树只计算一次
+        self.pool = BufferPool(max_buffers=pool_buffers)  # 没有进入缓存的中间结果用完后作为下一个算子的out矩阵
+        self.cache_owner = None  # 缓存对应的data_dic
+        self.cache_dtype = None  # 缓存对应的计算精度
+        self.forward_rets = {}  # (return_type, 持有期)到多个持有期的收益率
+
+    def reset_cache(self, data_dic):
+        """
+        :param data_dic: 本次计算使用的原始数据的字典，换了数据或者Data.astype改变了精度之后缓存和回收的矩阵都失效
+        """
+        dtype = self.operation.dtype  # Data.astype原地转换data_dic，只比较字典本身发现不了
+        if data_dic is not self.cache_owner or dtype != self.cache_dtype:
+            self.cache.clear()
+            self.pool.clear()
+            self.forward_rets = {}
+            self.cache_owner = data_dic
+            self.cache_dtype = dtype
+
+    def run_operation(self, name, args, done):
+        """
+        :param name: 算子名
+        :param args: 算子的参数
+        :param done: 本次计算之后不再使用的参数
+        :return: 算子的结果，逐元素的算子直接写入用完的参数，其他算子写入从BufferPool取出的矩阵
+        """
+        shape = None
+        for arg in args:
+            if isinstance(arg, np.ndarray):
+                shape = arg.shape
+                break
+        if shape is None:
+            return self.operation.operation_dic[name](*args)
+        dtype = self.operation.get_out_dtype(name)
+        if name in self.operation.elementwise_operations:
+            for arg in done:
+                if self.is_owned(arg) and arg.shape == shape and arg.dtype == dtype:
+                    return self.operation.operation_dic[name](*args, out=arg)
+        return self.operation.operation_dic[name](*args, out=self.pool.get(shape, dtype))
+
+    @staticmethod
+    def is_owned(arg):
+        """
+        :param arg: 算子的参数
+        :return: 是否是算子新建的中间结果，缓存中的矩阵和叶子节点都是只读的
+        """
+        return isinstance(arg, np.ndarray) and arg.flags.writeable and arg.flags.c_contiguous and \
+            not isinstance(arg.base, np.ndarray)
+
+    def release(self, args, value):
+        """
+        :param args: 已经用完的参数
+        :param value: 算子的结果，不能被回收
+        """
+        released = []
+        for arg in args:
+            if self.is_owned(arg) and arg is not value and all(arg is not r for r in released):
+                self.pool.release(arg)
+                released.append(arg)
+
+    @staticmethod
+    def get_children(tree):
+        """
+        :param tree: 公式树的一个非叶子节点
+        :return: 按算子参数顺序排列的子节点
+        """
+        if tree.operation_type == '1':
+            return [tree.left]
+        if tree.operation_type == '1_num':
+            return [tree.left, tree.num]
+        if tree.operation_type == '2':
+            return [tree.left, tree.right]
+        if tree.operation_type == '2_num':
+            return [tree.left, tree.right, tree.num]
+        if tree.operation_type == '3':
+            return [tree.left, tree.middle, tree.right]
+        raise ValueError('unknown operation type {}'.format(tree.operation_type))
+
+    def get_keys(self, tree, keys=None):
+        """
+        :param tree: 公式树
+        :param keys: 节点id到字符串形式的字典，递归时复用
+        :return: 每个子树的字符串形式，与cal_formula(return_type='str')一致，作为缓存的键
+        """
+        if keys is None:
+            keys = {}
+        if tree.variable_type == 'data':
+            keys[id(tree)] = str(tree.name)
+        else:
+            children = self.get_children(tree)
+            for child in children:
+                self.get_keys(child, keys)
+            keys[id(tree)] = tree.name + '{' + ','.join(keys[id(child)] for child in children) + '}'
+        return keys
+
+    def evaluate(self, tree, data_dic, keys):
+        """
+        :param tree: 公式树
+        :param data_dic: 原始数据的字典
+        :param keys: get_keys得到的子树字符串形式
+        :return: 子树的值，叶子节点是只读的视图而不是副本，中间结果优先从缓存中读取
+        """
+        if tree.variable_type == 'data':
+            if isinstance(tree.name, (int, float, np.integer, np.floating)):
+                return tree.name
+            value = data_dic[tree.name].view()
+            value.flags.writeable = False
+            return value
+        value = self.cache.get(keys[id(tree)])
+        if value is not None:
+            return value
+        args = [self.evaluate(child, data_dic, keys) for child in self.get_children(tree)]
+        value = self.run_operation(tree.name, args, args)  # 树中每个子树的结果只被父节点使用一次
+        self.cache.put(keys[id(tree)], value)
+        self.release(args, value)
+        return value
+
+    def cal_formulas(self, formulas, data_dic):  # 批量计算多个公式
+        """
+        :param formulas: 公式列表，元素可以是字符串或者公式树
+        :param data_dic: 原始数据的字典
+        :return: 与formulas顺序一致的signal矩阵列表
+        所有公式先合并成一张去重的有向无环图，按公式顺序后序遍历得到拓扑顺序，
+        每个中间结果在最后一个使用它的节点算完之后立即释放，降低批量计算时的峰值内存
+        """
+        self.reset_cache(data_dic)
+        trees = [self.formula_parser.parse(f) if type(f) == str else f for f in formulas]
+        keys = {}
+        for tree in trees:
+            self.get_keys(tree, keys)
+
+        values = {}  # 已经计算好且仍有节点需要使用的结果
+        consumers = {}  # 每个节点还剩多少次使用
+        steps = []  # 拓扑顺序的(键, 算子名, 子节点的键)
+
+        def visit(node):
+            key = keys[id(node)]
+            if key in consumers:
+                return key
+            consumers[key] = 0
+            if node.variable_type == 'data':
+                values[key] = self.evaluate(node, data_dic, keys)
+            else:
+                children = [visit(child) for child in self.get_children(node)]
+                for child in children:
+                    consumers[child] += 1
+                steps.append((key, node.name, children))
+            return key
+
+        outputs = [visit(tree) for tree in trees]
+        for key in outputs:
+            consumers[key] += 1  # 公式本身的结果要保留到最后
+
+        for key, name, children in steps:
+            args = [values[child] for child in children]
+            done = []
+            for child in children:
+                consumers[child] -= 1
+                if consumers[child] == 0:
+                    done.append(values.pop(child))
+            value = self.cache.get(key) if key in self.cache else None
+            if value is None:
+                value = self.run_operation(name, args, done)
+            values[key] = value
+            self.release(done, value)
+
+        signals = []
+        returned = set()
+        for key in outputs:
+            value = values[key]
+            if isinstance(value, np.ndarray) and (not value.flags.writeable or key in returned):
+                value = value.copy()  # 只读的叶子、缓存中的矩阵以及重复的公式返回副本
+            returned.add(key)
+            signals.append(value)
+        return signals
 
     def cal_formula(self, tree, data_dic, return_type='signal'):  # 递归计算公式树的值
         """
@@ -47,27 +231,11 @@ class AutoFormula:
         :return: 返回计算好的signal矩阵
         """
         if return_type == 'signal':
-            if tree.variable_type == 'data':
-                if type(tree.name) == int or type(tree.name) == float:
-                    return tree.name
-                return data_dic[tree.name].copy()  # 当前版本需要返回一个副本
-            else:
-                if tree.operation_type == '1':
-                    return self.operation.operation_dic[tree.name](self.cal_formula(tree.left, data_dic, return_type))
-                if tree.operation_type == '1_num':
-                    return self.operation.operation_dic[tree.name](self.cal_formula(tree.left, data_dic, return_type),
-                                                                   tree.num.name)
-                if tree.operation_type == '2':
-                    return self.operation.operation_dic[tree.name](self.cal_formula(tree.left, data_dic, return_type),
-                                                                   self.cal_formula(tree.right, data_dic, return_type))
-                if tree.operation_type == '2_num':
-                    return self.operation.operation_dic[tree.name](self.cal_formula(tree.left, data_dic, return_type),
-                                                                   self.cal_formula(tree.right, data_dic, return_type),
-                                                                   self.cal_formula(tree.num, data_dic, return_type))
-                if tree.operation_type == '3':
-                    return self.operation.operation_dic[tree.name](self.cal_formula(tree.left, data_dic, return_type),
-                                                                   self.cal_formula(tree.middle, data_dic, return_type),
-                                                                   self.cal_formula(tree.right, data_dic, return_type))
+            self.reset_cache(data_dic)
+            value = self.evaluate(tree, data_dic, self.get_keys(tree))
+            if isinstance(value, np.ndarray) and not value.flags.writeable:
+                value = value.copy()  # 缓存中的矩阵是只读的，返回给调用方的是副本
+            return value
         if return_type == 'str':
             if tree.variable_type == 'data':
                 return tree.name  # 返回字符串
@@ -83,11 +251,11 @@ class AutoFormula:
                 if tree.operation_type == '2_num':
                     return tree.name + '{' + self.cal_formula(tree.left, data_dic, return_type) + ',' + \
                            self.cal_formula(tree.right, data_dic, return_type) + ',' + \
-                           self.cal_formula(tree.num, data_dic, return_type) + '}'
+                           str(self.cal_formula(tree.num, data_dic, return_type)) + '}'
                 if tree.operation_type == '3':
                     return tree.name + '{' + self.cal_formula(tree.left, data_dic, return_type) + ',' + \
-                           self.cal_formula(tree.middle, data_dic, return_type) + ',' + \
-                           self.cal_formula(tree.right, data_dic, return_type) + '}'
+                           str(self.cal_formula(tree.middle, data_dic, return_type)) + ',' + \
+                           str(self.cal_formula(tree.right, data_dic, return_type)) + '}'
 
     def test_formula(self, formula, data, start_date=None, end_date=None, prediction_mode=False):
         """
@@ -115,3 +283,53 @@ class AutoFormula:
             if type(formula) == str:
                 formula = self.formula_parser.parse(formula)
             return self.cal_formula(formula, data.data_dic)
+
+    def test_formulas(self, formulas, data, start_date=None, end_date=None, prediction_mode=False):
+        """
+        :param formulas: 需要测试的因子表达式列表，共同的子树只计算一次
+        :param data: Data类
+        :param start_date: 如果不提供则按照Data类默认的来
+        :param end_date: 如果不提供则按照Data类默认的来
+        :param prediction_mode: 是否是最新预测模式，是的话不需要测试，只生成signal
+        :return: 与formulas顺序一致的(统计值, 信号矩阵)列表，预测模式下只返回信号矩阵列表
+        """
+        signals = self.cal_formulas(formulas, data.data_dic)
+        if prediction_mode:
+            return signals
+        if start_date is None:
+            start_date = str(data.start_date)
+        if end_date is None:
+            end_date = str(data.end_date)
+        start, end = data.get_real_date(start_date, end_date)
+        return [(self.AT.test(signal[start:end + 1], data.ret[start + 1:end + 2], top=data.top[start:end + 1]), signal)
+                for signal in signals]
+
+    def test_formula_decay(self, formula, data, start_date=None, end_date=None, horizons=(1, 2, 5, 10),
+                           return_type='close_close'):
+        """
+        :param formula: 需要测试的因子表达式，如果是字符串形式，需要先解析成树
+        :param data: Data类
+        :param start_date: 如果不提供则按照Data类默认的来
+        :param end_date: 如果不提供则按照Data类默认的来
+        :param horizons: 持有期列表
+        :param return_type: 买入和卖出使用的价格，例如close_close，与Data的return_type去掉持有期之后一致
+        :return: 返回DecayStats实例以及该因子产生的信号矩阵
+        """
+        if type(formula) == str:
+            formula = self.formula_parser.parse(formula)
+        signal = self.cal_formula(formula, data.data_dic)  # 会按data_dic重置缓存
+        key = (return_type, tuple(horizons))
+        if key not in self.forward_rets:
+            self.forward_rets[key] = self.AT.forward_returns(data.data_dic, horizons, return_type)
+        rets = self.forward_rets[key]
+
+        if start_date is None:
+            start_date = str(data.start_date)
+        if end_date is None:
+            end_date = str(data.end_date)
+        start, end = data.get_real_date(start_date, end_date)
+        end = min(end, len(data.top) - 2)  # 最后一天没有delay之后的收益率
+        s = signal[start:end + 1].copy()
+        s[np.isnan(s)] = 0
+        return self.AT.test_decay(s, rets[:, start + 1:end + 2], top=data.top[start:end + 1],
+                                  horizons=horizons), signal
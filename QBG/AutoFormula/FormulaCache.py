@@ -0,0 +1,123 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的FormulaCache类用于缓存公式子树的计算结果，BufferPool类用于回收中间结果的矩阵
+This code defines the FormulaCache class, an LRU cache of evaluated formula subtrees bounded by bytes,
+and the BufferPool class, which recycles intermediate matrices as out buffers
+
+键是子树的字符串形式，例如tsmean{close,5}，同一个子树无论出现在同一个公式中还是不同公式中都只计算一次；
+缓存的矩阵设为只读，防止被后续的算子或者调用方原地修改；总字节数超过上限时按最久未使用的顺序淘汰
+
+开发日志：
+2026-10-18
+-- 新增：FormulaCache类，记录命中、未命中和淘汰次数
+-- 新增：BufferPool类，按形状和数据类型回收已经用完的中间结果，作为下一个算子的out矩阵
+"""
+
+import numpy as np
+from collections import OrderedDict
+
+
+class FormulaCache:
+    def __init__(self, max_bytes=1024 ** 3):
+        """
+        :param max_bytes: 缓存的最大字节数，0表示不缓存
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key: 子树的字符串形式
+        :return: 缓存的矩阵，不存在时返回None
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """
+        :param key: 子树的字符串形式
+        :param value: 计算结果，只缓存矩阵，超过上限的单个矩阵不缓存
+        """
+        if not isinstance(value, np.ndarray) or value.nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+        value.flags.writeable = False
+        self.entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        :return: 命中、未命中、淘汰次数以及当前的条目数和字节数
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.nbytes}
+
+
+class BufferPool:
+    def __init__(self, max_buffers=8):
+        """
+        :param max_buffers: 每种形状和数据类型最多保留的矩阵个数，0表示不回收
+        """
+        self.max_buffers = max_buffers
+        self.buffers = {}  # (形状, 数据类型)到空闲矩阵列表
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, shape, dtype):
+        """
+        :param shape: 需要的形状
+        :param dtype: 需要的数据类型
+        :return: 一个空闲的矩阵，内容是上一次使用留下的，没有时返回None
+        """
+        buffers = self.buffers.get((tuple(shape), np.dtype(dtype)))
+        if buffers:
+            self.hits += 1
+            return buffers.pop()
+        self.misses += 1
+        return None
+
+    def release(self, array):
+        """
+        :param array: 不再使用的中间结果，调用方之后不能再持有它；只读的矩阵和其他矩阵的视图不回收
+        """
+        if not isinstance(array, np.ndarray) or not array.flags.writeable or not array.flags.c_contiguous:
+            return
+        if isinstance(array.base, np.ndarray):
+            return
+        buffers = self.buffers.setdefault((array.shape, array.dtype), [])
+        if len(buffers) < self.max_buffers and all(b is not array for b in buffers):
+            buffers.append(array)
+
+    def clear(self):
+        self.buffers.clear()
+
+    def stats(self):
+        """
+        :return: 复用和新建的次数以及当前空闲矩阵的个数
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'buffers': sum(len(buffers) for buffers in self.buffers.values())}
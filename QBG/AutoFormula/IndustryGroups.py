@@ -0,0 +1,71 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的IndustryGroups类用于行业截面算子的分组计算
+This code defines the IndustryGroups class, which computes per-industry group statistics for all days at once
+
+每个行业分类准则第一次使用时，把行业矩阵转换为整数组号：第i行行业序号为k的股票组号为i * K + k，
+之后对任意信号矩阵用一次np.bincount就能得到所有交易日所有行业的总和，再按组号取回即可，不需要逐行逐行业循环
+未被分类的股票（行业矩阵中为-1）也作为一个行业，与原先的处理一致
+
+开发日志：
+2026-10-18
+-- 新增：IndustryGroups类，支持swf，sws，swt，concept任意分类准则的行业均值和行业中性化
+-- 更新：行业内求和始终用float64，结果的精度与输入一致
+-- 更新：mean和neutralize支持out参数
+"""
+
+import numpy as np
+
+from CrossSection import result_dtype
+
+
+class IndustryGroups:
+    def __init__(self, industry):
+        """
+        :param industry: 行业字典，键是分类准则，值是行业序号矩阵
+        """
+        self.industry = industry
+        self.groups = {}  # 分类准则到(组号, 每组股票数)的缓存
+
+    def get_groups(self, level):
+        """
+        :param level: 分类准则，swf，sws，swt或者concept
+        :return: 展平的组号数组，以及每组的股票数
+        """
+        if level not in self.groups:
+            if self.industry is None or level not in self.industry:
+                raise KeyError('industry level {} not found'.format(level))
+            ind = np.asarray(self.industry[level])
+            uniq, inv = np.unique(ind, return_inverse=True)
+            gid = inv.reshape(ind.shape).astype(np.int64) + np.arange(ind.shape[0])[:, None] * len(uniq)
+            gid = gid.ravel()
+            self.groups[level] = (gid, np.bincount(gid, minlength=ind.shape[0] * len(uniq)))
+        return self.groups[level]
+
+    def mean(self, a, level='sws', out=None):
+        """
+        :param a: 信号矩阵，形状与行业矩阵一致
+        :param level: 分类准则
+        :param out: 写入结果的矩阵，None时新建
+        :return: 每只股票所在行业当天的均值，行业内有nan时为nan
+        """
+        gid, counts = self.get_groups(level)
+        sums = np.bincount(gid, weights=np.asarray(a, dtype=np.float64).ravel(), minlength=len(counts))
+        with np.errstate(invalid='ignore', divide='ignore'):  # 当天没有出现的行业不会被取到
+            means = sums / counts
+        if out is None:
+            return means[gid].reshape(a.shape).astype(result_dtype(a), copy=False)
+        np.copyto(out, means[gid].reshape(a.shape), casting='same_kind')
+        return out
+
+    def neutralize(self, a, level='sws', out=None):
+        """
+        :param a: 信号矩阵
+        :param level: 分类准则
+        :param out: 写入结果的矩阵，不能是a本身，None时新建
+        :return: 减去所在行业当天均值后的信号
+        """
+        if out is None:
+            return a - self.mean(a, level)
+        return np.subtract(a, self.mean(a, level, out=out), out=out)
@@ -0,0 +1,229 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的PopulationEvaluator类用多进程并行测试一批公式
+This code defines the PopulationEvaluator class, which scores a population of formulas across a pool of processes
+
+Data中的矩阵先用PanelStore写到一个共享文件夹，每个子进程启动时以只读memmap的方式映射这些文件，
+不需要把Data序列化后发给每个进程；主进程通过管道逐个给空闲的子进程分配公式，结果按完成的顺序返回，
+某个公式超过timeout秒还没有算完时直接结束对应的子进程并重新启动一个
+-- data_dic来自回测缓存且没有被手动赋值的字段不再复制，共享文件夹的manifest中用links记录它们所在的缓存文件夹
+-- 只共享公式可以用到的二维矩阵，日内的三维张量不写入；与上一次共享的形状、精度和crc32一致的矩阵不重复写入
+
+开发日志：
+2026-10-18
+-- 新增：PopulationEvaluator类，支持设置进程数和单个公式的超时时间
+-- 修复：子进程默认用spawn启动，主进程用过numba的并行算子之后fork出子进程，退出时可能卡死
+-- 更新：share直接映射已有的回测缓存，只写入二维矩阵，内容没有变化时跳过
+"""
+
+import numpy as np
+import sys
+import os
+import time
+import zlib
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+sys.path.append('C:/Users/Administrator/Desktop/Daily-Frequency-Quant/AutoFactory/Tester')
+sys.path.append('C:/Users/Administrator/Desktop/Daily-Frequency-Quant/AutoFactory/DataLoader')
+
+from AutoTester import AutoTester
+from AutoFormula import AutoFormula
+from PanelStore import PanelStore, LazyDataDic
+
+
+class SharedData:  # 子进程中代替Data，只包含计算和测试公式需要的矩阵
+    def __init__(self, path, dtype='float64'):
+        """
+        :param path: PopulationEvaluator写入矩阵的文件夹
+        :param dtype: 计算精度，与主进程中的Data一致
+        """
+        store = PanelStore(path)
+        links = store.manifest.get('links', {})  # 字段名到其所在的回测缓存文件夹
+        names = list(store.manifest['fields']) + list(links)
+        self.dtype = np.dtype(dtype)
+        self.data_dic = {name[len('data_'):]: self.load(links.get(name, path), name)
+                         for name in names if name.startswith('data_')}
+        self.ret = self.load(links.get('return', path), 'return')
+        self.top = self.load(links.get('top', path), 'top')
+        self.industry = None
+        if any(name.startswith('industry_') for name in names):
+            self.industry = {name[len('industry_'):]: self.load(links.get(name, path), name)
+                             for name in names if name.startswith('industry_')}
+
+    @staticmethod
+    def load(path, name):
+        return np.load('{}/{}.npy'.format(path, name), mmap_mode='r')
+
+
+def _worker(path, dtype, start, end, cache_bytes, conn):
+    """
+    :param path: 共享矩阵的文件夹
+    :param dtype: 计算精度
+    :param start: 测试区间开始的位置
+    :param end: 测试区间结束的位置
+    :param cache_bytes: 子进程中子树缓存的最大字节数
+    :param conn: 与主进程通信的管道，收到None时退出
+    """
+    data = SharedData(path, dtype)
+    autoformula = AutoFormula(start_date=None, end_date=None, data=data, cache_bytes=cache_bytes)
+    while True:
+        formula = conn.recv()
+        if formula is None:
+            break
+        try:
+            signal = autoformula.cal_formula(autoformula.formula_parser.parse(formula), data.data_dic)
+            stats = AutoTester.test(signal[start:end + 1], data.ret[start + 1:end + 2], top=data.top[start:end + 1])
+            conn.send((stats, None))
+        except Exception as e:  # 公式本身出错时只返回错误信息，子进程继续工作
+            conn.send((None, '{}: {}'.format(type(e).__name__, e)))
+    conn.close()
+
+
+class PopulationEvaluator:
+    def __init__(self, data, path, start_date=None, end_date=None, num_workers=None, timeout=300,
+                 cache_bytes=256 * 1024 ** 2, start_method='spawn', fields=None):
+        """
+        :param data: Data类的实例
+        :param path: 写入共享矩阵的文件夹，子进程从这里映射数据
+        :param fields: 公式用到的data_dic字段，默认是所有二维矩阵
+        :param start_date: 测试开始日期，默认是Data的开始日期
+        :param end_date: 测试结束日期，默认是Data的结束日期
+        :param num_workers: 子进程数，默认是CPU核数
+        :param timeout: 单个公式最长的计算时间，单位是秒，注意每个子进程第一次用到某个numba算子时需要编译
+        :param cache_bytes: 每个子进程中子树缓存的最大字节数
+        :param start_method: 子进程的启动方式，默认spawn，与Windows一致；fork继承了主进程中numba线程池的状态，可能死锁
+        """
+        if start_date is None:
+            start_date = str(data.start_date)
+        if end_date is None:
+            end_date = str(data.end_date)
+        self.start, self.end = data.get_real_date(start_date, end_date)
+        self.path = path
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.timeout = timeout
+        self.cache_bytes = cache_bytes
+        self.context = mp.get_context(start_method)
+        self.fields = fields
+        self.dtype = str(getattr(data, 'dtype', 'float64'))
+        self.autoformula = AutoFormula(start_date=start_date, end_date=end_date, data=data, cache_bytes=0)
+        self.share(data)
+
+    def share(self, data):
+        """
+        :param data: Data类的实例
+        :return: 无返回值，回测缓存中的字段只记录位置，其余公式需要的矩阵写入共享文件夹，内容没有变化的不重复写入
+        """
+        store = PanelStore(self.path)
+        old = store.manifest['fields']
+        store.manifest['fields'] = {}
+        store.manifest['links'] = {}
+        arrays = {'return': data.ret, 'top': data.top}
+        names = self.fields
+        if names is None:
+            names = list(data.data_dic.keys())
+        for prefix, dic, keys in [('data_', data.data_dic, names), ('industry_', data.industry, None)]:
+            if dic is None:
+                continue
+            for name in (keys if keys is not None else list(dic.keys())):
+                source = dic.source(name) if isinstance(dic, LazyDataDic) else None
+                if source is not None:  # 回测缓存中的字段不需要复制，也不需要映射就能知道形状
+                    cache, field = source
+                    if len(cache.manifest['fields'][field]['shape']) == 2:
+                        store.manifest['links'][prefix + name] = cache.path
+                    continue
+                value = dic[name]
+                if isinstance(value, np.ndarray) and value.ndim == 2:  # 日内的三维张量公式用不到
+                    arrays[prefix + name] = value
+
+        for name, value in arrays.items():
+            value = np.ascontiguousarray(value)
+            crc = zlib.crc32(value.view(np.uint8).reshape(-1))
+            field = old.get(name)
+            if field is not None and field.get('crc') == crc and field['dtype'] == str(value.dtype) and \
+                    field['shape'] == list(value.shape) and os.path.exists('{}/{}.npy'.format(self.path, name)):
+                store.manifest['fields'][name] = field  # 与上一次共享的一致，跳过
+                continue
+            store.write(name, value, dump_manifest=False)
+            store.manifest['fields'][name]['crc'] = crc
+        for name in old:  # 不再需要的旧文件
+            if name not in store.manifest['fields'] and os.path.exists('{}/{}.npy'.format(self.path, name)):
+                os.remove('{}/{}.npy'.format(self.path, name))
+        store.dump_manifest()
+
+    def start_worker(self):
+        """
+        :return: 子进程和主进程一端的管道
+        """
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker, args=(self.path, self.dtype, self.start, self.end,
+                                                             self.cache_bytes, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def to_str(self, formula):
+        """
+        :param formula: 字符串或者公式树
+        :return: 公式的字符串形式
+        """
+        if type(formula) == str:
+            return formula
+        return self.autoformula.cal_formula(formula, None, return_type='str')
+
+    def evaluate(self, formulas):
+        """
+        :param formulas: 需要测试的公式列表，可以是字符串或者公式树，例如FormulaTree.init_tree生成的树
+        :return: 生成器，按完成的顺序返回(公式字符串, Stats实例, 错误信息)，出错或者超时时Stats为None
+        """
+        pending = deque(self.to_str(formula) for formula in formulas)
+        workers = [self.start_worker() for _ in range(min(self.num_workers, len(pending)))]
+        running = {}  # 管道到(公式, 开始时间)
+        try:
+            while pending or running:
+                for process, conn in workers:
+                    if conn not in running and pending:
+                        formula = pending.popleft()
+                        conn.send(formula)
+                        running[conn] = (formula, time.time())
+                deadline = min(t for _, t in running.values()) + self.timeout
+                for conn in wait(list(running.keys()), timeout=max(deadline - time.time(), 0)):
+                    formula, _ = running.pop(conn)
+                    try:
+                        stats, error = conn.recv()
+                    except EOFError:  # 子进程异常退出
+                        stats, error = None, 'worker exited'
+                        self.restart(workers, conn)
+                    yield formula, stats, error
+                now = time.time()
+                for conn, (formula, t) in list(running.items()):
+                    if now - t >= self.timeout:  # 超时，结束该子进程后重新启动一个
+                        del running[conn]
+                        self.restart(workers, conn)
+                        yield formula, None, 'timeout after {}s'.format(self.timeout)
+        finally:
+            for process, conn in workers:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for process, conn in workers:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                conn.close()
+
+    def restart(self, workers, conn):
+        """
+        :param workers: (子进程, 管道)列表
+        :param conn: 需要重启的子进程对应的管道
+        """
+        for k, (process, c) in enumerate(workers):
+            if c is conn:
+                process.terminate()
+                process.join()
+                conn.close()
+                workers[k] = self.start_worker()
+                return
@@ -0,0 +1,454 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义时序滚动窗口算子的numba内核，供SignalGenerator注册使用
+This code defines the numba kernels of the rolling-window time series operators used by SignalGenerator
+
+原先的实现对每个(i, j)重新计算整个窗口的均值和标准差，复杂度是O(T·N·num)；这里按行推进，每只股票维护窗口内的
+幂和，每一步只加入新值、移出旧值，复杂度是O(T·N)
+-- 幂和基于一个平移量c计算，即累加(x - c)的幂，减少大数相减带来的精度损失
+-- 每隔num步用当前窗口的均值作为新的平移量重新计算一次幂和，消除累积误差，均摊下来每一步仍然是O(1)
+-- 窗口方差相对于上次重算以来的最大偏离过小时，幂和的有效位数不够，此时立即重算该股票的窗口
+-- 窗口中有nan时结果为nan，与np.mean和np.std的行为一致；前num - 1行为0
+-- 窗口内的值全部相同时标准差严格为0，偏度、峰度和wdirect都返回0
+-- 结果与输入的精度一致，输入是float32时结果也是float32，但窗口内的和始终用float64累加
+
+开发日志：
+2026-10-18
+-- 新增：tsmean，tsstd，tsskew，tskurtosis，wdirect的滚动内核，tsmean单独用只维护一阶和的rolling_mean
+-- 新增：tsrank的滚动内核rolling_rank
+-- 新增：tscorr和tsautocorr的滚动内核rolling_corr，可选Welford式的更新
+-- 更新：结果的精度与输入一致，支持float32
+-- 更新：所有内核支持out参数，结果直接写入传入的矩阵
+"""
+
+import numba as nb
+import numpy as np
+
+
+@nb.jit(nopython=True)
+def _rebase(a, i, num, j, c, s1, s2, s3, s4, sw, dmax, bad, run):
+    """
+    以窗口[i - num + 1, i]的均值为平移量，重新计算第j只股票的幂和
+    """
+    c[j] = 0.0
+    bad[j] = 0
+    for k in range(num):
+        x = a[i - num + 1 + k, j]
+        if np.isnan(x):
+            bad[j] += 1
+        else:
+            c[j] += x
+    if bad[j] < num:
+        c[j] /= num - bad[j]
+    s1[j] = 0.0
+    s2[j] = 0.0
+    s3[j] = 0.0
+    s4[j] = 0.0
+    sw[j] = 0.0
+    dmax[j] = 0.0
+    run[j] = 0
+    for k in range(num):
+        x = a[i - num + 1 + k, j]
+        if np.isnan(x):
+            run[j] = 0
+            continue
+        d = x - c[j]
+        s1[j] += d
+        s2[j] += d * d
+        s3[j] += d * d * d
+        s4[j] += d * d * d * d
+        sw[j] += (k + 1) * d
+        dmax[j] = max(dmax[j], d * d)
+        if k > 0 and x == a[i - num + k, j]:
+            run[j] += 1
+        else:
+            run[j] = 1
+
+
+@nb.jit(nopython=True)
+def _slide(a, i, num, j, c, s1, s2, s3, s4, sw, dmax, bad, run):
+    """
+    第j只股票的窗口从[i - num, i - 1]移动到[i - num + 1, i]
+    """
+    old = a[i - num, j]
+    x = a[i, j]
+    if np.isnan(old):
+        bad[j] -= 1
+        d_old = 0.0
+    else:
+        d_old = old - c[j]
+    sw[j] -= s1[j]  # 每个值的权重减一，被移出的值权重从1变为0
+    s1[j] -= d_old
+    s2[j] -= d_old * d_old
+    s3[j] -= d_old * d_old * d_old
+    s4[j] -= d_old * d_old * d_old * d_old
+    if np.isnan(x):
+        bad[j] += 1
+        run[j] = 0
+        return
+    d = x - c[j]
+    s1[j] += d
+    s2[j] += d * d
+    s3[j] += d * d * d
+    s4[j] += d * d * d * d
+    sw[j] += num * d
+    dmax[j] = max(dmax[j], d * d)
+    if x == a[i - 1, j]:
+        run[j] += 1
+    else:
+        run[j] = 1
+
+
+@nb.jit(nopython=True)
+def _output(a, out):
+    """
+    :param a: 输入矩阵
+    :param out: 写入结果的矩阵，None时新建
+    :return: 置0之后的结果矩阵
+    """
+    if out is None:
+        return np.zeros(a.shape, dtype=a.dtype)
+    out[:] = 0
+    return out
+
+
+@nb.jit(nopython=True)
+def rolling_moment(a, num, kind, out=None):
+    """
+    :param a: 二维矩阵，第一维是时间
+    :param num: 窗口长度
+    :param kind: 0均值，1标准差，2偏度，3峰度，4 wdirect
+    :param out: 写入结果的矩阵，不能是a本身，None时新建
+    :return: 和a形状相同的矩阵
+    """
+    s = _output(a, out)
+    n = a.shape[1]
+    if num < 1 or len(a) < num:
+        return s
+    c = np.zeros(n)
+    s1 = np.zeros(n)
+    s2 = np.zeros(n)
+    s3 = np.zeros(n)
+    s4 = np.zeros(n)
+    sw = np.zeros(n)
+    dmax = np.zeros(n)  # 上次重算以来加入过的最大偏离的平方，用于判断精度
+    bad = np.zeros(n, dtype=np.int64)
+    run = np.zeros(n, dtype=np.int64)
+    w_sum = num * (num + 1) / 2
+    for i in range(num - 1, len(a)):
+        for j in range(n):
+            if (i - num + 1) % num == 0:
+                _rebase(a, i, num, j, c, s1, s2, s3, s4, sw, dmax, bad, run)
+            else:
+                _slide(a, i, num, j, c, s1, s2, s3, s4, sw, dmax, bad, run)
+            if bad[j] > 0:
+                s[i, j] = np.nan
+                continue
+            if run[j] >= num:  # 窗口内的值全部相同
+                if kind == 0:
+                    s[i, j] = a[i, j]
+                continue
+            mu = s1[j] / num  # 平移后的均值
+            if kind == 0:
+                s[i, j] = c[j] + mu
+                continue
+            m2 = s2[j] / num - mu * mu
+            if m2 <= 1e-4 * dmax[j] and (i - num + 1) % num != 0:  # 窗口方差相对平移量太小，幂和的精度不够，重算
+                _rebase(a, i, num, j, c, s1, s2, s3, s4, sw, dmax, bad, run)
+                mu = s1[j] / num
+                m2 = s2[j] / num - mu * mu
+            if m2 <= 0:
+                continue
+            std = np.sqrt(m2)
+            if kind == 1:
+                s[i, j] = std
+            elif kind == 2:
+                m3 = s3[j] / num - 3 * mu * s2[j] / num + 2 * mu ** 3
+                s[i, j] = m3 / std ** 3
+            elif kind == 3:
+                m4 = s4[j] / num - 4 * mu * s3[j] / num + 6 * mu * mu * s2[j] / num - 3 * mu ** 4
+                s[i, j] = m4 / m2 ** 2 - 3
+            else:
+                s[i, j] = (sw[j] - mu * w_sum) / std
+    return s
+
+
+@nb.jit(nopython=True)
+def rolling_mean(a, num, out=None):
+    """
+    :param a: 二维矩阵，第一维是时间
+    :param num: 窗口长度
+    :param out: 写入结果的矩阵，不能是a本身，None时新建
+    :return: 滚动均值，只需要维护一阶和
+    """
+    s = _output(a, out)
+    n = a.shape[1]
+    if num < 1 or len(a) < num:
+        return s
+    s1 = np.zeros(n)
+    bad = np.zeros(n, dtype=np.int64)
+    for i in range(num - 1, len(a)):
+        if (i - num + 1) % num == 0:  # 定期重算，消除累积误差
+            s1[:] = 0.0
+            bad[:] = 0
+            for k in range(i - num + 1, i + 1):
+                for j in range(n):
+                    if np.isnan(a[k, j]):
+                        bad[j] += 1
+                    else:
+                        s1[j] += a[k, j]
+        else:
+            for j in range(n):
+                old = a[i - num, j]
+                x = a[i, j]
+                if np.isnan(old):
+                    bad[j] -= 1
+                else:
+                    s1[j] -= old
+                if np.isnan(x):
+                    bad[j] += 1
+                else:
+                    s1[j] += x
+        for j in range(n):
+            s[i, j] = np.nan if bad[j] > 0 else s1[j] / num
+    return s
+
+
+@nb.jit(nopython=True, parallel=True)
+def rolling_rank(a, num, out=None):
+    """
+    :param a: 二维矩阵，第一维是时间
+    :param num: 窗口长度
+    :param out: 写入结果的矩阵，不能是a本身，None时新建
+    :return: 当前值在窗口中的排名，即窗口内严格小于当前值的非nan个数除以num - 1，当前值为nan时按0比较
+    窗口长度不超过31，排好序的窗口每次移入移出都要平移O(num)个元素，反而比直接计数慢；这里对每一行用连续内存逐行比较计数，
+    nan与任何值比较都为假，因此不需要单独判断，编译器可以向量化，各行之间用prange并行
+    """
+    s = _output(a, out)
+    if num < 2 or len(a) < num:
+        return s
+    n = a.shape[1]
+    for i in nb.prange(num - 1, len(a)):
+        tar = np.empty(n)
+        cnt = np.zeros(n)
+        for j in range(n):
+            tar[j] = 0.0 if np.isnan(a[i, j]) else a[i, j]
+        for k in range(i - num + 1, i + 1):
+            for j in range(n):
+                if a[k, j] < tar[j]:
+                    cnt[j] += 1
+        for j in range(n):
+            s[i, j] = cnt[j] / (num - 1)
+    return s
+
+
+@nb.jit(nopython=True)
+def _corr_rebase(a, b, i, num, j, st):
+    """
+    以窗口均值为平移量，重新计算第j只股票的和，st的各列依次为cx, cy, sx, sy, sxx, syy, sxy, bad, dxx, dyy
+    """
+    cx = 0.0
+    cy = 0.0
+    bad = 0
+    for k in range(i - num + 1, i + 1):
+        if np.isnan(a[k, j]) or np.isnan(b[k, j]):
+            bad += 1
+        else:
+            cx += a[k, j]
+            cy += b[k, j]
+    if bad < num:
+        cx /= num - bad
+        cy /= num - bad
+    sx = 0.0
+    sy = 0.0
+    sxx = 0.0
+    syy = 0.0
+    sxy = 0.0
+    dxx = 0.0
+    dyy = 0.0
+    for k in range(i - num + 1, i + 1):
+        if np.isnan(a[k, j]) or np.isnan(b[k, j]):
+            continue
+        dx = a[k, j] - cx
+        dy = b[k, j] - cy
+        sx += dx
+        sy += dy
+        sxx += dx * dx
+        syy += dy * dy
+        sxy += dx * dy
+        dxx = max(dxx, dx * dx)
+        dyy = max(dyy, dy * dy)
+    st[j, 0] = cx
+    st[j, 1] = cy
+    st[j, 2] = sx
+    st[j, 3] = sy
+    st[j, 4] = sxx
+    st[j, 5] = syy
+    st[j, 6] = sxy
+    st[j, 7] = bad
+    st[j, 8] = dxx
+    st[j, 9] = dyy
+
+
+@nb.jit(nopython=True)
+def _corr_update(st, j, x, y, sign):
+    """
+    sign为1时加入一对值，为-1时移出；含nan的一对值只计入bad
+    """
+    if np.isnan(x) or np.isnan(y):
+        st[j, 7] += sign
+        return
+    dx = x - st[j, 0]
+    dy = y - st[j, 1]
+    st[j, 2] += sign * dx
+    st[j, 3] += sign * dy
+    st[j, 4] += sign * dx * dx
+    st[j, 5] += sign * dy * dy
+    st[j, 6] += sign * dx * dy
+    if sign > 0:
+        st[j, 8] = max(st[j, 8], dx * dx)
+        st[j, 9] = max(st[j, 9], dy * dy)
+
+
+@nb.jit(nopython=True)
+def _welford_update(st, j, x, y, sign):
+    """
+    Welford式的滑动更新，st的各列依次为mx, my, cxx, cyy, cxy, n, bad
+    """
+    if np.isnan(x) or np.isnan(y):
+        st[j, 6] += sign
+        return
+    if sign > 0:
+        st[j, 5] += 1
+        n = st[j, 5]
+        dx = x - st[j, 0]
+        dy = y - st[j, 1]
+        st[j, 0] += dx / n
+        st[j, 1] += dy / n
+        st[j, 2] += dx * (x - st[j, 0])
+        st[j, 3] += dy * (y - st[j, 1])
+        st[j, 4] += dx * (y - st[j, 1])
+    else:
+        n = st[j, 5]
+        if n <= 1:
+            st[j, :6] = 0.0
+            return
+        mx = (n * st[j, 0] - x) / (n - 1)
+        my = (n * st[j, 1] - y) / (n - 1)
+        st[j, 2] -= (x - mx) * (x - st[j, 0])
+        st[j, 3] -= (y - my) * (y - st[j, 1])
+        st[j, 4] -= (x - mx) * (y - st[j, 1])
+        st[j, 0] = mx
+        st[j, 1] = my
+        st[j, 5] = n - 1
+
+
+@nb.jit(nopython=True)
+def _welford_rebase(a, b, i, num, j, st):
+    """
+    用两遍扫描精确地重算第j只股票窗口的均值和协方差，消除滑动更新累积的误差
+    """
+    mx = 0.0
+    my = 0.0
+    n = 0
+    bad = 0
+    for k in range(i - num + 1, i + 1):
+        if np.isnan(a[k, j]) or np.isnan(b[k, j]):
+            bad += 1
+        else:
+            mx += a[k, j]
+            my += b[k, j]
+            n += 1
+    if n > 0:
+        mx /= n
+        my /= n
+    cxx = 0.0
+    cyy = 0.0
+    cxy = 0.0
+    for k in range(i - num + 1, i + 1):
+        if np.isnan(a[k, j]) or np.isnan(b[k, j]):
+            continue
+        cxx += (a[k, j] - mx) ** 2
+        cyy += (b[k, j] - my) ** 2
+        cxy += (a[k, j] - mx) * (b[k, j] - my)
+    st[j, 0] = mx
+    st[j, 1] = my
+    st[j, 2] = cxx
+    st[j, 3] = cyy
+    st[j, 4] = cxy
+    st[j, 5] = n
+    st[j, 6] = bad
+
+
+@nb.jit(nopython=True)
+def _run_update(run, j, c, m, i):
+    """
+    更新第j只股票第c个序列连续相等的值的个数
+    """
+    if np.isnan(m[i, j]):
+        run[j, c] = 0
+    elif i > 0 and m[i, j] == m[i - 1, j]:
+        run[j, c] += 1
+    else:
+        run[j, c] = 1
+
+
+@nb.jit(nopython=True, parallel=True)
+def rolling_corr(a, b, num, stable=False, out=None):
+    """
+    :param a: 二维矩阵，第一维是时间
+    :param b: 与a形状相同的矩阵
+    :param num: 窗口长度
+    :param stable: 为True时用Welford式的滑动均值和协方差更新，否则用带平移量的幂和，两者都每隔num步精确重算一次
+    :param out: 写入结果的矩阵，不能是a或b本身，None时新建
+    :return: 滚动相关系数，窗口中有nan时为nan，任一序列在窗口内方差为0时为0，前num - 1行为0
+    """
+    s = _output(a, out)
+    n = a.shape[1]
+    if num < 2 or len(a) < num:
+        return s
+    st = np.zeros((n, 10))
+    run = np.zeros((n, 2), dtype=np.int64)  # a和b各自连续相等的值的个数，达到num说明窗口内方差严格为0
+    block = 64
+    for blk in nb.prange((n + block - 1) // block):
+        for i in range(len(a)):
+            for j in range(blk * block, min(blk * block + block, n)):
+                _run_update(run, j, 0, a, i)
+                _run_update(run, j, 1, b, i)
+                if i < num - 1:
+                    continue
+                rebased = (i - num + 1) % num == 0
+                if stable:
+                    if rebased:
+                        _welford_rebase(a, b, i, num, j, st)
+                    else:
+                        _welford_update(st, j, a[i - num, j], b[i - num, j], -1)
+                        _welford_update(st, j, a[i, j], b[i, j], 1)
+                    if st[j, 6] > 0:
+                        s[i, j] = np.nan
+                        continue
+                    vx = st[j, 2]
+                    vy = st[j, 3]
+                    cov = st[j, 4]
+                else:
+                    if rebased:
+                        _corr_rebase(a, b, i, num, j, st)
+                    else:
+                        _corr_update(st, j, a[i - num, j], b[i - num, j], -1)
+                        _corr_update(st, j, a[i, j], b[i, j], 1)
+                    if st[j, 7] > 0:
+                        s[i, j] = np.nan
+                        continue
+                    vx = st[j, 4] - st[j, 2] * st[j, 2] / num
+                    vy = st[j, 5] - st[j, 3] * st[j, 3] / num
+                    if not rebased and (vx <= 1e-4 * num * st[j, 8] or vy <= 1e-4 * num * st[j, 9]):
+                        _corr_rebase(a, b, i, num, j, st)  # 方差相对平移量太小，精度不够，重算
+                        vx = st[j, 4] - st[j, 2] * st[j, 2] / num
+                        vy = st[j, 5] - st[j, 3] * st[j, 3] / num
+                    cov = st[j, 6] - st[j, 2] * st[j, 3] / num
+                if run[j, 0] >= num or run[j, 1] >= num or vx <= 0 or vy <= 0:
+                    continue
+                r = cov / np.sqrt(vx * vy)
+                s[i, j] = min(max(r, -1.0), 1.0)
+    return s
@@ -9,20 +9,44 @@ v1.0
 2021-09-13
 -- 新增：csindneutral算子，获得行业中性的信号
 -- 更新：为了方便算子计算，SignalGenerator类需要传入一个data类进行初始化
+
+2026-10-18
+-- 更新：tsmean，tsstd，tsskew，tskurtosis，wdirect改用RollingKernels中的滚动内核，每一步O(1)更新
+-- 更新：tsrank改用rolling_rank，按行连续比较计数并用prange并行
+-- 更新：tscorr和tsautocorr改用rolling_corr，不再对每个位置调用np.corrcoef，方差为0的窗口结果为0
+-- 更新：csrank和zscore改用CrossSection中对所有行一起计算的实现，csrank的并列值默认取平均排名
+-- 更新：csindneutral和csind改用IndustryGroups按组号bincount计算，行业分类准则可选，不再固定为申万二级行业
+-- 新增：dtype精度设置，默认与Data一致，所有算子的输入先转换为该精度，float32时结果也是float32
+-- 更新：所有算子支持out参数，直接写入传入的矩阵；prod不再重复计算a * b，返回的是nan和inf替换为0之后的结果
+-- 更新：condition改为两次np.copyto，不再逐行赋值
+-- 修复：没有指定dtype时精度在每次计算时从Data读取，原先固定为初始化时的精度，Data.astype之后仍按旧精度计算
 """
 
-import numba as nb
 import numpy as np
 
+from RollingKernels import rolling_moment, rolling_mean, rolling_rank, rolling_corr
+from CrossSection import cs_rank, cs_zscore
+from IndustryGroups import IndustryGroups
+
 
 class SignalGenerator:
-    def __init__(self, data):
+    def __init__(self, data, ties='average', industry_level='sws', dtype=None):
         """
         :param data: Data类的实例
+        :param ties: csrank中并列值的处理方式，average取平均排名，ordinal按出现顺序排名
+        :param industry_level: csindneutral和csind使用的行业分类准则，swf，sws，swt或者concept
+        :param dtype: 算子计算使用的精度，默认跟随Data，float32时矩和相关系数等内部仍然用float64累加
         """
         self.operation_dic = {}
         self.get_operation()
         self.data = data
+        self.dtype = dtype
+        self.ties = ties
+        self.industry_level = industry_level
+        self.industry_groups = None
+
+        self.bool_operations = ['lt', 'le', 'gt', 'ge']  # 结果是布尔矩阵的算子
+        self.elementwise_operations = ['neg', 'add', 'minus', 'prod', 'div']  # out可以是输入本身的算子
 
         # 单独注册需要用到额外信息的算子
         self.operation_dic['zscore'] = self.zscore
@@ -34,66 +58,60 @@ class SignalGenerator:
         截面算子，因为要调用top
         """
 
-    def csrank(self, a):
-        b = a.copy()  # 测试用，可以不用复制
-        b[np.isnan(b)] = 0
-        for i in range(len(a)):
-            n = np.sum(b[i, self.data.top[i]] != 0)
-            if n == 0:
-                continue
-            tmp = b[i, self.data.top[i]].copy()
-            pos = tmp.argsort()
-            for j in range(len(tmp)):
-                tmp[pos[j]] = j
-            tmp /= (len(tmp) - 1)
-            b[i, self.data.top[i]] = tmp
-        return b
-
-    def zscore(self, a):
-        b = a.copy()
-        b[np.isnan(b)] = 0
-        for i in range(len(a)):
-            if np.sum(b[i][self.data.top[i]] != 0) <= 1:
-                continue
-            b[i][self.data.top[i]] -= np.mean(b[i][self.data.top[i]])
-            b[i][self.data.top[i]] /= np.std(b[i][self.data.top[i]])
-            b[i][(self.data.top[i]) & (b[i] > 3)] = 3
-            b[i][(self.data.top[i]) & (b[i] < -3)] = -3
-        return b
-
-    def csindneutral(self, a):  # 截面中性化，暂时先使用申万二级行业，之后需要加入可选行业中性化
-        s = a.copy()
-        ind = self.data.industry['sws']  # 申万二级行业的位置
-        for i in range(len(s)):
-            ind_num_dic = {}  # 存放行业总数
-            ind_sum_dic = {}  # 存放行业总值
-            for j in list(set(ind[i])):
-                ind_num_dic[j] = np.sum(ind[i] == j)
-                ind_sum_dic[j] = np.sum(a[i, ind[i] == j])
-            for key in ind_sum_dic.keys():
-                ind_sum_dic[key] /= ind_num_dic[key]
-            for j in range(s.shape[1]):
-                s[i, j] = a[i, j] - ind_sum_dic[ind[i, j]]  # 减去行业平均，如果是没有出现过的行业，那么就是0
-        return s
-
-    def csind(self, a):  # 截面替换成所处行业的均值
-        s = a.copy()
-        ind = self.data.industry['sws']  # 申万二级行业的位置
-        for i in range(len(s)):
-            ind_num_dic = {}  # 存放行业总数
-            ind_sum_dic = {}  # 存放行业总值
-            for j in list(set(ind[i])):
-                ind_num_dic[j] = np.sum(ind[i] == j)
-                ind_sum_dic[j] = np.sum(a[i, ind[i] == j])
-            for key in ind_sum_dic.keys():
-                ind_sum_dic[key] /= ind_num_dic[key]
-            for j in range(s.shape[1]):
-                s[i, j] = ind_sum_dic[ind[i, j]]  # 减去行业平均，如果是没有出现过的行业，那么就是0
-        return s
-
-    def get_operation(self):
-        def neg(a):
-            return -a
+    @property
+    def dtype(self):  # 没有指定精度时跟随Data，Data.astype之后不需要重建SignalGenerator
+        if self.fixed_dtype is not None:
+            return self.fixed_dtype
+        return np.dtype(getattr(self.data, 'dtype', np.float64))
+
+    @dtype.setter
+    def dtype(self, dtype):
+        self.fixed_dtype = None if dtype is None else np.dtype(dtype)
+
+    def cast(self, a):  # 转换为计算精度，精度一致时不复制
+        if isinstance(a, np.ndarray) and a.dtype != self.dtype:
+            return a.astype(self.dtype)
+        return a
+
+    def get_out_dtype(self, name):
+        """
+        :param name: 算子名
+        :return: 该算子结果的数据类型，用于预先分配out矩阵
+        """
+        return np.dtype(bool) if name in self.bool_operations else self.dtype
+
+    def csrank(self, a, out=None):
+        return cs_rank(self.cast(a), self.data.top, ties=self.ties, out=out)
+
+    def zscore(self, a, out=None):
+        return cs_zscore(self.cast(a), self.data.top, out=out)
+
+    def get_industry_groups(self):  # 第一次用到行业算子时才生成组号
+        if self.industry_groups is None:
+            self.industry_groups = IndustryGroups(self.data.industry)
+        return self.industry_groups
+
+    def csindneutral(self, a, level=None, out=None):  # 截面中性化，减去所在行业当天的均值
+        """
+        :param a: 信号矩阵
+        :param level: 行业分类准则，默认使用初始化时的industry_level
+        :param out: 写入结果的矩阵，None时新建
+        """
+        return self.get_industry_groups().neutralize(self.cast(a), self.industry_level if level is None else level,
+                                                     out=out)
+
+    def csind(self, a, level=None, out=None):  # 截面替换成所处行业的均值
+        """
+        :param a: 信号矩阵
+        :param level: 行业分类准则，默认使用初始化时的industry_level
+        :param out: 写入结果的矩阵，None时新建
+        """
+        return self.get_industry_groups().mean(self.cast(a), self.industry_level if level is None else level,
+                                               out=out)
+
+    def get_operation(self):  # 所有算子都可以传入out矩阵直接写入结果，除逐元素的算子外out不能是输入本身
+        def neg(a, out=None):
+            return np.negative(self.cast(a), out=out)
 
         self.operation_dic['neg'] = neg
 
@@ -101,108 +119,51 @@ class SignalGenerator:
         1_num型运算符
         """
 
-        def tsdelay(a, num):
-            s = np.zeros(a.shape)
-            s[num:] = a[:-num].copy()
+        def tsdelay(a, num, out=None):
+            a = self.cast(a)
+            s = np.empty(a.shape, dtype=a.dtype) if out is None else out
+            s[:num] = 0
+            s[num:] = a[:-num]
             return s
 
         self.operation_dic['tsdelay'] = tsdelay
 
-        def tsdelta(a, num):
-            s = np.zeros(a.shape)
-            s[num:] = a[num:] - a[:-num]
+        def tsdelta(a, num, out=None):
+            a = self.cast(a)
+            s = np.empty(a.shape, dtype=a.dtype) if out is None else out
+            s[:num] = 0
+            np.subtract(a[num:], a[:-num], out=s[num:])
             return s
 
         self.operation_dic['tsdelta'] = tsdelta
 
-        @nb.jit
-        def tsstd(a, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    s[i, j] = np.std(a[i - num + 1:i + 1, j])
-            return s
+        def tsstd(a, num, out=None):
+            return rolling_moment(self.cast(a), num, 1, out=out)
 
         self.operation_dic['tsstd'] = tsstd
 
-        @nb.jit
-        def tsmean(a, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    s[i, j] = np.mean(a[i - num + 1:i + 1, j])
-            return s
+        def tsmean(a, num, out=None):
+            return rolling_mean(self.cast(a), num, out=out)
 
         self.operation_dic['tsmean'] = tsmean
 
-        @nb.jit
-        def tskurtosis(a, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    if np.std(a[i - num + 1:i + 1, j]) == 0:
-                        continue
-                    s[i, j] = np.mean((a[i - num + 1:i + 1,
-                                       j] - np.mean(a[i - num + 1:i + 1,
-                                                    j])) ** 4) / (np.std(a[i - num + 1:i + 1, j]) ** 4) - 3
-            return s
+        def tskurtosis(a, num, out=None):
+            return rolling_moment(self.cast(a), num, 3, out=out)
 
         self.operation_dic['tskurtosis'] = tskurtosis
 
-        @nb.jit
-        def tsskew(a, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    s[i, j] = np.mean((a[i - num + 1:i + 1, j] - np.mean(a[i - num + 1:i + 1, j])) ** 3) / \
-                              (np.std(a[i - num + 1:i + 1, j])) ** 3
-            return s
+        def tsskew(a, num, out=None):
+            return rolling_moment(self.cast(a), num, 2, out=out)
 
         self.operation_dic['tsskew'] = tsskew
 
-        @nb.jit
-        def wdirect(a, num):  # 过去一段时间中心化之后时序加权
-            s = np.zeros(a.shape)
-            w = np.array([i for i in range(1, num + 1)])
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    if np.std(a[i - num + 1:i + 1, j]) == 0:
-                        continue
-                    s[i, j] = np.sum(w * (a[i - num + 1:i + 1, j] - np.mean(a[i - num + 1:i + 1, j]))) / \
-                              np.std(a[i - num + 1:i + 1, j])
-            return s
+        def wdirect(a, num, out=None):  # 过去一段时间中心化之后时序加权
+            return rolling_moment(self.cast(a), num, 4, out=out)
 
         self.operation_dic['wdirect'] = wdirect
 
-        @nb.jit
-        def tsrank(a, num):
-            s = np.zeros(a.shape)
-
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    k = 0
-                    tar = a[i, j]
-                    if np.isnan(tar):
-                        tar = 0
-                    for c in a[i - num + 1:i + 1, j]:
-                        if np.isnan(c):
-                            continue
-                        if c < tar:
-                            k += 1
-                    s[i, j] = k / (num - 1)
-            return s
+        def tsrank(a, num, out=None):
+            return rolling_rank(self.cast(a), num, out=out)
 
         self.operation_dic['tsrank'] = tsrank
 
@@ -210,26 +171,27 @@ class SignalGenerator:
         2型运算符
         """
 
-        def add(a, b):
-            return a + b
+        def add(a, b, out=None):
+            return np.add(self.cast(a), self.cast(b), out=out)
 
         self.operation_dic['add'] = add
 
-        def minus(a, b):
-            return a - b
+        def minus(a, b, out=None):
+            return np.subtract(self.cast(a), self.cast(b), out=out)
 
         self.operation_dic['minus'] = minus
 
-        def prod(a, b):
-            c = a * b
+        def prod(a, b, out=None):
+            c = np.multiply(self.cast(a), self.cast(b), out=out)
             c[np.isnan(c)] = 0
             c[np.isinf(c)] = 0
-            return a * b
+            return c
 
         self.operation_dic['prod'] = prod
 
-        def div(a, b):
-            c = a / b
+        def div(a, b, out=None):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                c = np.divide(self.cast(a), self.cast(b), out=out)
             c[np.isnan(c)] = 0
             c[np.isinf(c)] = 0
             return c
@@ -240,15 +202,8 @@ class SignalGenerator:
         2_num型运算符
         """
 
-        @nb.jit
-        def tscorr(a, b, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    s[i, j] = np.corrcoef(a[i - num + 1:i + 1, j], b[i - num + 1:i + 1, j])[0, 1]
-            return s
+        def tscorr(a, b, num, out=None):
+            return rolling_corr(self.cast(a), self.cast(b), num, out=out)
 
         self.operation_dic['tscorr'] = tscorr
 
@@ -256,55 +211,48 @@ class SignalGenerator:
         1_num_num型运算符
         """
 
-        @nb.jit
-        def tsautocorr(a, delta, num):
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if i < delta + num - 1:
-                    continue
-                for j in range(a.shape[1]):
-                    s[i, j] = np.corrcoef(a[i - num + 1:i + 1, j], a[i - num + 1 - delta:i + 1 - delta, j])[0, 1]
+        def tsautocorr(a, delta, num, out=None):
+            a = self.cast(a)
+            if delta == 0:
+                return rolling_corr(a, a, num, out=out)
+            s = np.empty(a.shape, dtype=a.dtype) if out is None else out
+            s[:delta] = 0
+            rolling_corr(a[delta:], a[:-delta], num, out=s[delta:])  # 前delta + num - 1行为0
             return s
 
         self.operation_dic['tsautocorr'] = tsautocorr
 
-        def condition(a, b, c):
+        def condition(a, b, c, out=None):
             """
             :param a: 条件，一个布尔型矩阵
-            :param b: 真的取值
-            :param c: 假的取值
+            :param b: 真的取值，数字或者矩阵
+            :param c: 假的取值，数字或者矩阵
+            :param out: 写入结果的矩阵，None时新建
             :return: 信号
             """
-            s = np.zeros(a.shape)
-            for i in range(len(a)):
-                if type(b) == int or type(b) == float:
-                    s[i, a[i]] = b
-                else:
-                    s[i, a[i]] = b[i, a[i]]
-                if type(c) == int or type(c) == float:
-                    s[i, ~a[i]] = c
-                else:
-                    s[i, ~a[i]] = c[i, ~a[i]]
+            s = np.empty(a.shape, dtype=self.dtype) if out is None else out
+            np.copyto(s, c, casting='unsafe')
+            np.copyto(s, b, casting='unsafe', where=a)
             return s
 
         self.operation_dic['condition'] = condition
 
-        def lt(a, b):
-            return a < b
+        def lt(a, b, out=None):
+            return np.less(a, b, out=out)
 
         self.operation_dic['lt'] = lt
 
-        def le(a, b):
-            return a <= b
+        def le(a, b, out=None):
+            return np.less_equal(a, b, out=out)
 
         self.operation_dic['le'] = le
 
-        def gt(a, b):
-            return a > b
+        def gt(a, b, out=None):
+            return np.greater(a, b, out=out)
 
         self.operation_dic['gt'] = gt
 
-        def ge(a, b):
-            return a >= b
+        def ge(a, b, out=None):
+            return np.greater_equal(a, b, out=out)
 
         self.operation_dic['ge'] = ge
@@ -0,0 +1,145 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的DailyStore类负责每日数据文件的读写，get_pv_data写入和get_matrix_data读取都通过它完成
+This code defines the DailyStore class, the single reader and writer of the per-day data files
+
+原先写入的是stock_{date}.csv，读取的却是stock_{date}.pkl，两边的文件名对不上；现在文件名由DailyStore统一生成，
+读取时按照写入格式、其余格式、旧版.pkl的顺序查找存在的文件
+-- csv：可移植，读取时对已知字段指定dtype，跳过pandas的类型推断
+-- npz：numpy的二进制格式，每一列一个数组，不需要额外依赖
+-- parquet，feather：列式二进制格式，需要安装pyarrow
+
+开发日志：
+2026-10-18
+-- 新增：DailyStore类，支持csv，npz，parquet和feather四种格式，以及格式之间的转换
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import pickle
+
+
+class DailyStore:
+    extensions = {'csv': 'csv', 'npz': 'npz', 'parquet': 'parquet', 'feather': 'feather'}
+    # 已知字段的类型，读取csv时直接指定，其余字段仍由pandas推断
+    dtypes = {'code': str, 'sec_code': str, 'time': str, 'date': str, 'day': str,
+              'open': np.float64, 'close': np.float64, 'high': np.float64, 'low': np.float64, 'avg': np.float64,
+              'factor': np.float64, 'volume': np.float64, 'money': np.float64, 'pre_close': np.float64,
+              'turnover_ratio': np.float64, 'net_pct_main': np.float64, 'net_pct_xl': np.float64,
+              'net_pct_l': np.float64, 'net_pct_m': np.float64, 'net_pct_s': np.float64}
+
+    def __init__(self, data_path, file_format='csv'):
+        """
+        :param data_path: 存放数据的路径
+        :param file_format: 写入的格式，csv，npz，parquet或者feather
+        """
+        if file_format not in self.extensions:
+            raise ValueError('unknown file format {}'.format(file_format))
+        self.data_path = data_path
+        self.file_format = file_format
+
+    def file(self, kind, date, file_format=None):
+        """
+        :param kind: 文件种类，例如stock，fundamental，money_flow，index
+        :param date: 日期
+        :param file_format: 格式，默认是写入格式
+        :return: 文件路径
+        """
+        if file_format is None:
+            file_format = self.file_format
+        ext = self.extensions.get(file_format, file_format)
+        return '{}/StockDailyData/{}/{}_{}.{}'.format(self.data_path, date, kind, date, ext)
+
+    def find(self, kind, date):
+        """
+        :return: 实际存在的文件路径及其格式，写入格式优先，最后查找旧版的.pkl
+        """
+        formats = [self.file_format] + [f for f in self.extensions if f != self.file_format] + ['pkl']
+        for file_format in formats:
+            file = self.file(kind, date, file_format)
+            if os.path.exists(file):
+                return file, file_format
+        raise FileNotFoundError('{} data of {} not found'.format(kind, date))
+
+    def exists(self, kind, date):
+        try:
+            self.find(kind, date)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def write(self, kind, date, frame):
+        """
+        :param kind: 文件种类
+        :param date: 日期
+        :param frame: 当天的DataFrame，索引不写入
+        """
+        os.makedirs('{}/StockDailyData/{}'.format(self.data_path, date), exist_ok=True)
+        frame = frame.reset_index(drop=True)
+        if self.file_format == 'csv':
+            frame.to_csv(self.file(kind, date), index=False)
+        elif self.file_format == 'npz':
+            arrays = {}
+            for name in frame.columns:
+                if frame[name].dtype.kind in 'biufcM':
+                    arrays[str(name)] = frame[name].to_numpy()
+                else:  # 字符串统一存为定长的unicode数组，读取时不需要pickle
+                    arrays[str(name)] = np.asarray(frame[name].to_numpy(), dtype=str)
+            with open(self.file(kind, date), 'wb') as f:
+                np.savez(f, **arrays)
+        elif self.file_format == 'parquet':
+            frame.to_parquet(self.file(kind, date), index=False)
+        else:
+            frame.to_feather(self.file(kind, date))
+
+    def read(self, kind, date, columns=None):
+        """
+        :param kind: 文件种类
+        :param date: 日期
+        :param columns: 需要的列，默认全部，只读取需要的列可以省去大部分解析
+        :return: DataFrame
+        """
+        file, file_format = self.find(kind, date)
+        if file_format == 'pkl':  # 旧版文件，可能是pickle，也可能是以.pkl为后缀的csv
+            with open(file, 'rb') as f:
+                is_pickle = f.read(1) == b'\x80'
+            if is_pickle:
+                with open(file, 'rb') as f:
+                    frame = pickle.load(f)
+                return frame if columns is None else frame[[c for c in frame.columns if c in columns]]
+            file_format = 'csv'
+        if file_format == 'csv':
+            if columns is None:
+                return pd.read_csv(file, dtype=self.dtypes, engine='c')
+            columns = set(columns)
+            return pd.read_csv(file, dtype=self.dtypes, usecols=lambda c: c in columns, engine='c')
+        if file_format == 'npz':
+            with np.load(file) as f:
+                names = f.files if columns is None else [name for name in f.files if name in columns]
+                return pd.DataFrame({name: f[name] for name in names})
+        if file_format == 'parquet':
+            return pd.read_parquet(file, columns=None if columns is None else list(columns))
+        return pd.read_feather(file, columns=None if columns is None else list(columns))
+
+    def convert(self, kinds=('stock', 'fundamental', 'money_flow'), dates=None, remove=False):
+        """
+        :param kinds: 需要转换的文件种类
+        :param dates: 需要转换的日期，默认全部
+        :param remove: 转换后是否删除原文件
+        :return: 无返回值，把已有的文件转换为写入格式
+        """
+        if dates is None:
+            dates = sorted(os.listdir('{}/StockDailyData'.format(self.data_path)))
+        for date in dates:
+            for kind in kinds:
+                if not self.exists(kind, date):
+                    continue
+                file, file_format = self.find(kind, date)
+                if file_format == self.file_format:
+                    continue
+                self.write(kind, date, self.read(kind, date))
+                if remove:
+                    os.remove(file)
+            print('{} converted.'.format(date))
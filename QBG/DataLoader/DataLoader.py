@@ -37,6 +37,21 @@ v1.0
 
 2021-10-01
 -- DataFrame类型的数据默认写入方式为csv，避免pandas的版本不同而无法读入
+
+2026-10-18
+-- 更新：回测缓存改为PanelStore按列存储，每个字段一个.npy文件，读缓存时按需memmap，不再整体反序列化raw_data_dic.pkl
+-- 更新：get_matrix_data重写缓存时按天整体写入矩阵，不再逐个单元格iloc赋值，可选多线程读取每日文件
+-- 更新：结束日期超出缓存时默认增量更新，只读取新增的交易日，并只重新计算尾部的ret和top
+-- 更新：top改由UniverseBuilder向量化生成，不再逐个单元格判断上市时间
+-- 更新：get_pv_data通过FetchScheduler并发查询，限流、失败重试，并记录已完成的任务以便中断后继续
+-- 更新：交易日从本地缓存的TradingCalendar获取，不再逐个工作日试探；日频数据可以按batch_days个交易日批量查询
+-- 更新：Data类持有TradingCalendar，get_real_date通过searchsorted查找，支持datetime.date和np.datetime64
+-- 更新：10m数据由IntradayLoader逐天写入memmap张量，峰值内存不再随回测区间增长；支持字段和bar的子集以及float32
+-- 修复：原先intra_avg不在分钟文件中导致KeyError，每只股票的avg都没有写入
+-- 更新：日内数据获取完一天后由IntradayStore打包成一个文件，新增pack_intraday方法转换已有的按股票存放的文件夹
+-- 修复：每日数据写入的是.csv，读取的却是.pkl；现在读写都通过DailyStore，支持csv，npz，parquet和feather，
+        读取csv时指定dtype并只解析需要的列
+-- 新增：get_matrix_data的dtype参数和Data.astype，日频矩阵可以用float32存储和计算
 """
 
 import numpy as np
@@ -44,13 +59,23 @@ import pandas as pd
 import os
 import pickle
 import jqdatasdk
-from jqdatasdk import *
 import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from PanelStore import PanelStore, LazyDataDic
+from UniverseBuilder import UniverseBuilder
+from FetchScheduler import FetchScheduler, FetchJournal
+from TradingCalendar import TradingCalendar
+from IntradayLoader import IntradayLoader
+from IntradayStore import IntradayStore
+from DailyStore import DailyStore
 
 
 class Data:
     def __init__(self, code_order_dic, order_code_dic, date_position_dic, position_date_dic,
-                 data_dic, ret, industry, start_date, end_date, top):
+                 data_dic, ret, industry, start_date, end_date, top, dtype='float64'):
         """
         :param code_order_dic: 股票代码到矩阵位置的字典
         :param order_code_dic: 矩阵位置到股票代码的字典
@@ -61,6 +86,7 @@ class Data:
         :param start_date: 回测开始日期
         :param end_date: 回测结束日期
         :param top: top矩阵中存储每一个交易日可选的股票
+        :param dtype: data_dic中矩阵的精度，SignalGenerator默认按该精度计算
         """
         self.code_order_dic = code_order_dic
         self.order_code_dic = order_code_dic
@@ -72,59 +98,107 @@ class Data:
         self.start_date = start_date
         self.end_date = end_date
         self.top = top
+        self.dtype = np.dtype(dtype)
+        self.calendar = TradingCalendar([position_date_dic[i] for i in range(len(position_date_dic))])  # 每一行的日期
+
+    def astype(self, dtype):
+        """
+        :param dtype: 新的精度，例如float32可以节省一半的内存
+        :return: 无返回值，data_dic中的二维浮点矩阵转换为该精度，懒加载的字段在第一次访问时转换
+        """
+        self.dtype = np.dtype(dtype)
+        target = self.data_dic
+        if isinstance(self.data_dic, LazyDataDic):  # 直接替换已经映射的字段，转换精度不算手动赋值
+            self.data_dic.dtype = self.dtype
+            target = self.data_dic.loaded
+        for name in list(target.keys()):
+            value = target[name]
+            if isinstance(value, np.ndarray) and value.ndim == 2 and value.dtype.kind == 'f':
+                target[name] = value.astype(self.dtype, copy=False)
 
     def get_real_date(self, start_date, end_date):
         """
-        :param start_date: 任意输入的开始日期
+        :param start_date: 任意输入的开始日期，可以是字符串，datetime.date或np.datetime64
         :param end_date: 任意输入的结束日期
         :return: 返回有交易的真正的起始日期对应的下标
         """
-        tmp_start = start_date.split('-')
-        i = 0
-        while True:
-            s = datetime.date(int(tmp_start[0]), int(tmp_start[1]), int(tmp_start[2])) + datetime.timedelta(days=i)
-            try:
-                start = self.date_position_dic[s]
-                break
-            except KeyError:
-                i += 1
-        i = 0
-        tmp_end = end_date.split('-')
-        while True:
-            s = datetime.date(int(tmp_end[0]), int(tmp_end[1]), int(tmp_end[2])) + datetime.timedelta(days=i)
-            try:
-                end = self.date_position_dic[s]
-                break
-            except KeyError:
-                i -= 1
+        start = int(self.calendar.next_index(start_date))
+        end = int(self.calendar.prev_index(end_date))
+        if start >= len(self.calendar) or end < 0:
+            raise ValueError('{} to {} is out of the data range {} to {}'.format(
+                start_date, end_date, self.calendar.dates[0], self.calendar.dates[-1]))
         return start, end
 
+    def get_positions(self, dates, side='next'):
+        """
+        :param dates: 日期数组
+        :param side: next表示当天或之后最近的交易日，prev表示当天或之前
+        :return: 对应的矩阵行号数组
+        """
+        if side == 'next':
+            return self.calendar.next_index(dates)
+        return self.calendar.prev_index(dates)
+
 
 class DataLoader:
+    # 日频数据字段，分别来自量价、基本面和资金流文件
+    stock_names = ['open', 'close', 'high', 'low', 'avg', 'factor', 'volume']
+    fundamental_names = ['turnover_ratio']
+    money_flow_names = ['net_pct_main', 'net_pct_xl', 'net_pct_l', 'net_pct_m', 'net_pct_s']
+    ind_names = ['swf', 'sws', 'swt', 'concept']  # 行业分类准则
+
     def __init__(self, user_id, password, data_path='F:/Documents/AutoFactoryData',
-                 back_test_data_path='F:/Documents/AutoFactoryData/BackTestData'):
+                 back_test_data_path='F:/Documents/AutoFactoryData/BackTestData', api=None, file_format='csv'):
         """
         :param user_id: 登录聚宽的用户id
         :param password: 登录密码
         :param data_path: 存放数据的路径
         :param back_test_data_path: 回测数据的存放路径
+        :param api: 数据接口模块，默认是jqdatasdk，离线测试时可以传入接口一致的替代模块
+        :param file_format: 每日数据文件的写入格式，csv，npz，parquet或者feather，读取时各种格式都能识别
         """
         self.data_path = data_path
         self.back_test_data_path = back_test_data_path  # 该路径用于存放某一次回测所需要的任何字典
         self.user_id = user_id
         self.password = password
-        jqdatasdk.auth(self.user_id, self.password)  # 登录聚宽
+        self.api = jqdatasdk if api is None else api
+        self.daily_store = DailyStore(data_path, file_format=file_format)  # 每日数据文件统一由它读写
+        self.api.auth(self.user_id, self.password)  # 登录聚宽
 
     """
     get_pv_data定义了从聚宽读取量价数据(pv for Price & Volume)并保存在本地的方法
     """
 
-    def get_pv_data(self, start_date, end_date, data_type=None):  # 获得日频量价关系数据
+    def get_trade_calendar(self, end_date=None, scheduler=None):
+        """
+        :param end_date: 需要覆盖到的日期，本地缓存不够新时重新从聚宽获取
+        :param scheduler: FetchScheduler实例，用于调用接口
+        :return: TradingCalendar实例
+        """
+        path = '{}/trade_days.pkl'.format(self.data_path)
+        if os.path.exists(path):
+            calendar = TradingCalendar.load(path)
+            if end_date is None or (len(calendar) > 0 and calendar.last_date() >= end_date):
+                return calendar
+        if scheduler is None:
+            scheduler = FetchScheduler()
+        calendar = TradingCalendar(scheduler.call(self.api.get_all_trade_days))
+        calendar.dump(path)
+        return calendar
+
+    def get_pv_data(self, start_date, end_date, data_type=None, num_workers=1, rate=None, max_retries=3,
+                    resume=True, batch_days=1, use_calendar=True):  # 获得日频量价关系数据
         """
         :param start_date: 开始日期
         :param end_date: 结束日期，增量更新时这两个值设为相同
         :param data_type: 数据类型，stock_daily表示日频股票
-        :return: 无返回值
+        :param batch_days: 日频数据每次查询多少个交易日，大于1时按区间批量查询后在本地按天拆分
+        :param use_calendar: 是否使用缓存的交易日历，否则逐个工作日查询，根据返回是否为空判断有无交易
+        :param num_workers: 并发查询的线程数
+        :param rate: 每秒最多调用多少次接口，None表示不限流
+        :param max_retries: 每次接口调用失败后最多重试多少次
+        :param resume: 是否记录已完成的任务，中断后用相同参数重新运行时从中断处继续
+        :return: 没有完成的任务列表，全部完成时为空
         """
         if data_type is None:  # 参数默认值不要是可变的，否则可能出错
             data_type = ['stock_daily', 'industry']  # 默认获取股票日数据，行业和概念分类
@@ -135,120 +209,414 @@ class DataLoader:
         begin = datetime.date(int(start_date[0]), int(start_date[1]), int(start_date[2]))
         end = datetime.date(int(end_date[0]), int(end_date[1]), int(end_date[2]))
 
-        all_stocks = list(get_all_securities(types=['stock'], date=end_date).index)  # 只获取最后一天的
-
-        if 'stock_daily' in data_type:  # 获取日频量价、资金流数据
-
-            lst = os.listdir('{}/StockDailyData'.format(self.data_path))  # 所有的日期文件夹
-
+        journal = None
+        if resume:
+            journal = FetchJournal('{}/FetchJournal/{}_{}_{}.log'.format(self.data_path, begin, end,
+                                                                        '_'.join(sorted(data_type))))
+        scheduler = FetchScheduler(num_workers=num_workers, rate=rate, max_retries=max_retries, journal=journal)
+
+        all_stocks = list(scheduler.call(self.api.get_all_securities, types=['stock'], date=end).index)  # 只获取最后一天的
+        if use_calendar:
+            weekdays = self.get_trade_calendar(end, scheduler).between(begin, end)
+        else:
+            weekdays = []  # 略过周末
             for i in range((end - begin).days + 1):
                 date = begin + datetime.timedelta(days=i)
-                if date.weekday() in [5, 6]:  # 略过周末
-                    continue
-
-                # 获得价格数据
-                stock_data = get_price(all_stocks, frequency='daily',
-                                       fields=['open', 'close', 'low', 'high', 'volume', 'money', 'pre_close',
-                                               'factor', 'avg'],
-                                       start_date=date, end_date=date)
-                if len(stock_data) == 0:  # 判断当天有无交易
-                    continue
-                if str(date) not in lst:
-                    os.makedirs('{}/StockDailyData/{}'.format(self.data_path, date))
-                stock_data.index = stock_data['code']
-                # 获得资金流数据
-                money_flow = get_money_flow(all_stocks, start_date=date, end_date=date)
-                money_flow.index = money_flow['sec_code']
-                # 获取财务数据
-                fundamental = get_fundamentals(query(valuation, indicator), date=date)
-                fundamental.index = fundamental['code']
-                money_flow.to_csv('{}/StockDailyData/{}/money_flow_{}.csv'.format(self.data_path, date, date),
-                                  index=False)
-                fundamental.to_csv('{}/StockDailyData/{}/fundamental_{}.csv'.format(self.data_path, date, date),
-                                  index=False)
-                stock_data.to_csv('{}/StockDailyData/{}/stock_{}.csv'.format(self.data_path, date, date),
-                                  index=False)
-                print('{} done.'.format(date))
+                if date.weekday() not in [5, 6]:
+                    weekdays.append(date)
+
+        failed = []
+        if 'stock_daily' in data_type:  # 获取日频量价、资金流数据，先于其他数据获取，以确定哪些是交易日
+            if batch_days > 1:
+                tasks = []
+                for i in range(0, len(weekdays), batch_days):
+                    dates = weekdays[i:i + batch_days]
+                    tasks.append(('stock_daily/{}_{}'.format(dates[0], dates[-1]),
+                                  partial(self.fetch_stock_daily_batch, scheduler, all_stocks, dates)))
+                failed += scheduler.run(tasks)
+            else:
+                failed += scheduler.run([('stock_daily/{}'.format(date),
+                                          partial(self.fetch_stock_daily, scheduler, all_stocks, date))
+                                         for date in weekdays])
+            if scheduler.stopped:  # 已经达到查询上限，剩下的任务下一次运行时继续
+                return failed
 
+        tasks = []
         if 'index_daily' in data_type:
-            begin = datetime.date(int(start_date[0]), int(start_date[1]), int(start_date[2]))
-            end = datetime.date(int(end_date[0]), int(end_date[1]), int(end_date[2]))
-            for i in range((end - begin).days + 1):
-                date = begin + datetime.timedelta(days=i)
-                if date.weekday() in [5, 6]:  # 略过周末
-                    continue
-                all_indexes = get_all_securities(types=['index'], date=date)
-                all_indexes.to_csv('{}/StockDailyData/{}/index_{}.csv'.format(self.data_path, date, date),
-                                  index=False)
-                print('{} done.'.format(date))
+            for date in weekdays:
+                tasks.append(('index_daily/{}'.format(date), partial(self.fetch_index_daily, scheduler, date)))
 
         if 'industry' in data_type:  # 获取行业分类，最后以字典形式存储
             print('getting industry data...')
-            concepts = list(get_concepts().index)  # 获得所有的概念名称
-            begin = datetime.date(int(start_date[0]), int(start_date[1]), int(start_date[2]))
-            end = datetime.date(int(end_date[0]), int(end_date[1]), int(end_date[2]))
-            for i in range((end - begin).days + 1):
-                date = begin + datetime.timedelta(days=i)
-                if date.weekday() in [5, 6]:  # 略过周末
-                    continue
-                industry_dic = {'concept': {}, 'swf': {}, 'sws': {}, 'swt': {}}
-                ind = list(get_industries('sw_l1').index)  # 申万一级行业
-                for name in ind:
-                    industry_dic['swf'][name] = get_industry_stocks(name, date=date)
-                ind = list(get_industries('sw_l2').index)  # 申万二级行业
-                for name in ind:
-                    industry_dic['sws'][name] = get_industry_stocks(name, date=date)
-                ind = list(get_industries('sw_l3').index)  # 申万三级行业
-                for name in ind:
-                    industry_dic['swt'][name] = get_industry_stocks(name, date=date)
-                for name in concepts:
-                    industry_dic['concept'][name] = get_concept_stocks(name, date=date)
-                with open('{}/StockDailyData/{}/industry_{}.pkl'.format(self.data_path, date, date), 'wb') as f:
-                    pickle.dump(industry_dic, f)
-                print('{} done.'.format(date))
-
-        if '1m' in data_type:
-            lst = os.listdir('{}/StockIntraDayData/1m'.format(self.data_path))
-            for i in range((end - begin).days + 1):
-                date = begin + datetime.timedelta(days=i)
-                if date.weekday() in [5, 6]:  # 略过周末
+            concepts = list(scheduler.call(self.api.get_concepts).index)  # 获得所有的概念名称
+            for date in weekdays:
+                tasks.append(('industry/{}'.format(date), partial(self.fetch_industry, scheduler, concepts, date)))
+
+        for frequency in ['1m', '10m']:
+            if frequency not in data_type:
+                continue
+            for date in weekdays:
+                if IntradayStore(self.data_path, frequency).exists(date):  # 当天已经打包
                     continue
-                if str(date) not in lst:
-                    os.makedirs('{}/StockIntraDayData/1m/{}'.format(self.data_path, date))
-                stocks = os.listdir('{}/StockIntraDayData/1m/{}'.format(self.data_path, date))  # 上一次查询已有的股票
+                os.makedirs('{}/StockIntraDayData/{}/{}'.format(self.data_path, frequency, date), exist_ok=True)
+                stocks = os.listdir('{}/StockIntraDayData/{}/{}'.format(self.data_path, frequency, date))
                 for stock in all_stocks:  # 剔除创业板股票，避免超出查询限制
                     if stock[:3] == '300' or stock[:3] == '688':
                         continue
-                    if '{}.pkl'.format(stock) in stocks:
+                    if '{}.csv'.format(stock) in stocks:  # 上一次查询已有的股票
                         continue
-                    end_date = date + datetime.timedelta(days=1)
-                    intra_day_data = get_price(stock, frequency='1m',
-                                               fields=['open', 'close', 'low', 'high', 'volume', 'money', 'pre_close',
-                                                       'factor'],
-                                               start_date=date, end_date=end_date)
-                    intra_day_data.to_csv('{}/StockIntraDayData/1m/{}/{}.csv'.format(self.data_path, date, stock),
-                                          index=False)
-
-        if '10m' in data_type:
-            lst = os.listdir('{}/StockIntraDayData/10m'.format(self.data_path))
-            for i in range((end - begin).days + 1):
-                date = begin + datetime.timedelta(days=i)
-                if date.weekday() in [5, 6]:  # 略过周末
+                    tasks.append(('{}/{}/{}'.format(frequency, date, stock),
+                                  partial(self.fetch_intraday, scheduler, stock, date, frequency)))
+        failed += scheduler.run(tasks)
+        for frequency in ['1m', '10m']:  # 当天所有股票都获取完成后打包成一个文件
+            if frequency not in data_type:
+                continue
+            failed_dates = set(key.split('/')[1] for key in failed if key.startswith(frequency + '/'))
+            for date in weekdays:
+                if str(date) not in failed_dates and \
+                        os.path.exists('{}/StockIntraDayData/{}/{}'.format(self.data_path, frequency, date)):
+                    self.pack_intraday(frequency, dates=[date], remove=True)
+        if not failed and journal is not None:
+            journal.remove()
+        return failed
+
+    def fetch_stock_daily(self, scheduler, all_stocks, date):
+        """
+        :param scheduler: FetchScheduler实例
+        :param all_stocks: 需要查询的股票
+        :param date: 日期
+        :return: 获取并写入某一天的量价、资金流和财务数据
+        """
+        # 获得价格数据
+        stock_data = scheduler.call(self.api.get_price, all_stocks, frequency='daily',
+                                    fields=['open', 'close', 'low', 'high', 'volume', 'money', 'pre_close',
+                                            'factor', 'avg'],
+                                    start_date=date, end_date=date)
+        if len(stock_data) == 0:  # 判断当天有无交易
+            return
+        stock_data.index = stock_data['code']
+        # 获得资金流数据
+        money_flow = scheduler.call(self.api.get_money_flow, all_stocks, start_date=date, end_date=date)
+        money_flow.index = money_flow['sec_code']
+        # 获取财务数据
+        fundamental = scheduler.call(self.api.get_fundamentals,
+                                     self.api.query(self.api.valuation, self.api.indicator), date=date)
+        fundamental.index = fundamental['code']
+        self.write_stock_daily(date, stock_data, money_flow, fundamental)
+
+    def fetch_stock_daily_batch(self, scheduler, all_stocks, dates):
+        """
+        :param scheduler: FetchScheduler实例
+        :param all_stocks: 需要查询的股票
+        :param dates: 连续的若干个交易日
+        :return: 三个接口各调用一次获取整个区间，然后按天拆分写入
+        """
+        stock_data = scheduler.call(self.api.get_price, all_stocks, frequency='daily',
+                                    fields=['open', 'close', 'low', 'high', 'volume', 'money', 'pre_close',
+                                            'factor', 'avg'],
+                                    start_date=dates[0], end_date=dates[-1])
+        money_flow = scheduler.call(self.api.get_money_flow, all_stocks, start_date=dates[0], end_date=dates[-1])
+        fundamental = scheduler.call(self.api.get_fundamentals_continuously,
+                                     self.api.query(self.api.valuation, self.api.indicator),
+                                     end_date=dates[-1], count=len(dates), panel=False)
+        stock_dic = dict(tuple(stock_data.groupby(pd.to_datetime(stock_data['time']).dt.date)))
+        money_flow_dic = dict(tuple(money_flow.groupby(pd.to_datetime(money_flow['date']).dt.date)))
+        fundamental_dic = dict(tuple(fundamental.groupby(pd.to_datetime(fundamental['day']).dt.date)))
+        for date in dates:
+            if date not in stock_dic:  # 当天无交易
+                continue
+            self.write_stock_daily(date, stock_dic[date].set_index('code', drop=False),
+                                   money_flow_dic.get(date, money_flow.iloc[:0]).set_index('sec_code', drop=False),
+                                   fundamental_dic.get(date, fundamental.iloc[:0]).set_index('code', drop=False))
+
+    def write_stock_daily(self, date, stock_data, money_flow, fundamental):
+        """
+        :param date: 日期
+        :param stock_data: 当天的量价数据
+        :param money_flow: 当天的资金流数据
+        :param fundamental: 当天的财务数据
+        """
+        self.daily_store.write('money_flow', date, money_flow)
+        self.daily_store.write('fundamental', date, fundamental)
+        self.daily_store.write('stock', date, stock_data)  # 最后写入量价数据，它存在即表示当天的数据完整
+        print('{} done.'.format(date))
+
+    def fetch_index_daily(self, scheduler, date):
+        """
+        :param scheduler: FetchScheduler实例
+        :param date: 日期，只写入有交易的日期
+        """
+        if not os.path.exists('{}/StockDailyData/{}'.format(self.data_path, date)):
+            return
+        all_indexes = scheduler.call(self.api.get_all_securities, types=['index'], date=date)
+        self.daily_store.write('index', date, all_indexes)
+        print('{} done.'.format(date))
+
+    def fetch_industry(self, scheduler, concepts, date):
+        """
+        :param scheduler: FetchScheduler实例
+        :param concepts: 所有的概念名称
+        :param date: 日期，只写入有交易的日期
+        """
+        if not os.path.exists('{}/StockDailyData/{}'.format(self.data_path, date)):
+            return
+        industry_dic = {'concept': {}, 'swf': {}, 'sws': {}, 'swt': {}}
+        for key, level in [('swf', 'sw_l1'), ('sws', 'sw_l2'), ('swt', 'sw_l3')]:  # 申万一二三级行业
+            ind = list(scheduler.call(self.api.get_industries, level).index)
+            for name in ind:
+                industry_dic[key][name] = scheduler.call(self.api.get_industry_stocks, name, date=date)
+        for name in concepts:
+            industry_dic['concept'][name] = scheduler.call(self.api.get_concept_stocks, name, date=date)
+        with open('{}/StockDailyData/{}/industry_{}.pkl'.format(self.data_path, date, date), 'wb') as f:
+            pickle.dump(industry_dic, f)
+        print('{} done.'.format(date))
+
+    def fetch_intraday(self, scheduler, stock, date, frequency='10m'):
+        """
+        :param scheduler: FetchScheduler实例
+        :param stock: 股票代码
+        :param date: 日期
+        :param frequency: 1m或者10m
+        """
+        fields = ['open', 'close', 'low', 'high', 'volume', 'money']
+        if frequency == '1m':
+            fields += ['pre_close', 'factor']
+        intra_day_data = scheduler.call(self.api.get_price, stock, frequency=frequency, fields=fields,
+                                        start_date=date, end_date=date + datetime.timedelta(days=1))
+        intra_day_data.to_csv('{}/StockIntraDayData/{}/{}/{}.csv'.format(self.data_path, frequency, date, stock),
+                              index=False)
+
+    def pack_intraday(self, frequency='10m', dates=None, remove=False, num_workers=1):
+        """
+        :param frequency: 1m或者10m
+        :param dates: 需要打包的日期，默认是所有按股票存放的文件夹
+        :param remove: 打包后是否删除原文件夹
+        :param num_workers: 读取原文件的线程数
+        :return: 无返回值，把按股票存放的日内数据转换为每天一个文件
+        """
+        store = IntradayStore(self.data_path, frequency=frequency, bars=24 if frequency == '10m' else 240)
+        store.convert(dates=dates, remove=remove, num_workers=num_workers)
+
+    def convert_daily(self, file_format, dates=None, remove=False):
+        """
+        :param file_format: 目标格式，之后也按这个格式写入
+        :param dates: 需要转换的日期，默认全部
+        :param remove: 转换后是否删除原文件
+        :return: 无返回值，把已有的每日数据文件转换为目标格式
+        """
+        self.daily_store = DailyStore(self.data_path, file_format=file_format)
+        self.daily_store.convert(dates=dates, remove=remove)
+
+    def read_daily_frames(self, dates, num_workers=1):
+        """
+        :param dates: 需要读取的日期列表
+        :param num_workers: 并行读取的线程数，1表示串行
+        :return: 按日期顺序生成(date, (stock_data, fundamental, money_flow))
+        """
+        def read(date):
+            stock_data = self.daily_store.read('stock', date, columns=['code'] + self.stock_names)
+            fundamental = self.daily_store.read('fundamental', date, columns=['code'] + self.fundamental_names)
+            money_flow = self.daily_store.read('money_flow', date, columns=['sec_code'] + self.money_flow_names)
+            return stock_data, fundamental, money_flow
+
+        if num_workers <= 1:
+            for date in dates:
+                yield date, read(date)
+            return
+        chunk = num_workers * 4  # 分块提交，避免一次性把所有日期的DataFrame读入内存
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for c in range(0, len(dates), chunk):
+                for date, frames in zip(dates[c:c + chunk], executor.map(read, dates[c:c + chunk])):
+                    yield date, frames
+
+    @staticmethod
+    def scatter_frame(data_dic, k, frame, code_col, names, code_index):
+        """
+        :param data_dic: 数据字典
+        :param k: 写入的行
+        :param frame: 某一天的DataFrame
+        :param code_col: 股票代码所在的列
+        :param names: 需要写入的字段
+        :param code_index: 股票代码到矩阵列位置的pd.Index
+        :return: 写入的行数
+        """
+        if len(frame) == 0:
+            return 0
+        pos = code_index.get_indexer(frame[code_col].values)
+        valid = pos >= 0  # 不在code_index中的股票位置是-1
+        pos = pos[valid]
+        for name in names:
+            data_dic[name][k, pos] = frame[name].values[valid]
+        return len(pos)
+
+    def scatter_industry(self, industry, k, date, industry_order_dic, code_index):
+        """
+        :param industry: 行业字典，值是矩阵
+        :param k: 写入的行
+        :param date: 日期
+        :param industry_order_dic: 行业编号到序号的字典
+        :param code_index: 股票代码到矩阵列位置的pd.Index
+        """
+        with open('{}/StockDailyData/{}/industry_{}.pkl'.format(self.data_path, date, date), 'rb') as file:
+            data = pickle.load(file)
+        for ind_name in self.ind_names:
+            ind = data[ind_name]  # 该天的一个行业分类，形式是行业编号：代码列表
+            for key, value in ind.items():  # value是一个列表，里面是股票代码
+                pos = code_index.get_indexer(value)
+                industry[ind_name][k, pos[pos >= 0]] = industry_order_dic[ind_name][key]
+
+    @staticmethod
+    def cal_ret(data_dic, return_type, start=0):
+        """
+        :param data_dic: 数据字典
+        :param return_type: 收益率类型，例如close_close_1
+        :param start: 从第几行开始计算，增量更新时只需要计算尾部
+        :return: 第start行之后的收益率矩阵
+        """
+        start_name = return_type.split('_')[0]
+        end_name = return_type.split('_')[1]
+        length = int(return_type.split('_')[-1])
+        days = len(data_dic[start_name])
+        ret = np.zeros((days - start, data_dic[start_name].shape[1]))
+        if days - length > start:
+            ret[:days - length - start] = data_dic[end_name][start + length:] / \
+                data_dic[start_name][start:days - length] - 1
+        ret[np.isnan(ret)] = 0
+        return ret
+
+    @staticmethod
+    def cal_top(data_dic, top_constraint='volume', start=0, universe=None):
+        """
+        :param data_dic: 数据字典
+        :param top_constraint: 流动性筛选方式
+        :param start: 从第几行开始计算，增量更新时只需要计算尾部
+        :param universe: 自定义的UniverseBuilder，默认是价格10到100，上市满50个交易日，成交量前1000
+        :return: 第start行之后的top矩阵
+        """
+        if universe is None:
+            universe = UniverseBuilder.default(top_constraint)
+        return universe.build(data_dic, start=start)
+
+    def extend_matrix_data(self, back_test_name, store, start_end_date, end_date, return_type='close_close_1',
+                           top_constraint='volume'):
+        """
+        :param back_test_name: 该回测的名字
+        :param store: 该回测的PanelStore
+        :param start_end_date: 缓存的起止日期
+        :param end_date: 新的结束日期
+        :param return_type: 收益率类型
+        :param top_constraint: 流动性筛选方式
+        :return: 无返回值，直接更新缓存，代价只和新增的交易日数量有关
+        """
+        print('extending cache to {}...'.format(end_date))
+        path = '{}/{}'.format(self.back_test_data_path, back_test_name)
+        with open('{}/code_order_dic.pkl'.format(path), 'rb') as f:
+            code_order_dic = pickle.load(f)
+        with open('{}/order_code_dic.pkl'.format(path), 'rb') as f:
+            order_code_dic = pickle.load(f)
+        with open('{}/date_position_dic.pkl'.format(path), 'rb') as f:
+            date_position_dic = pickle.load(f)
+        with open('{}/position_date_dic.pkl'.format(path), 'rb') as f:
+            position_date_dic = pickle.load(f)
+        need_industry = store.exists(['industry_{}'.format(name) for name in self.ind_names]) and \
+            os.path.exists('{}/industry_order_dic.pkl'.format(path))  # 缓存中有行业数据时一并更新
+        if need_industry:
+            with open('{}/industry_order_dic.pkl'.format(path), 'rb') as f:
+                industry_order_dic = pickle.load(f)
+            with open('{}/order_industry_dic.pkl'.format(path), 'rb') as f:
+                order_industry_dic = pickle.load(f)
+
+        # 缓存结束日期之后的行只是用来计算收益率的，可能不完整，从这里开始重新读入
+        length = int(return_type.split('_')[-1])
+        tail = len(position_date_dic)
+        for i in range(len(position_date_dic)):
+            if position_date_dic[i] > start_end_date[1]:
+                tail = i
+                break
+        last = end_date + datetime.timedelta(days=length + 1 + 2)
+        new_dates = []
+        for name in sorted(os.listdir('{}/StockDailyData'.format(self.data_path))):
+            tmp = name.split('-')
+            date = datetime.date(int(tmp[0]), int(tmp[1]), int(tmp[2]))
+            if start_end_date[1] < date <= last and date.weekday() not in [5, 6]:
+                new_dates.append(date)
+
+        frames_lst = []
+        for date, frames in self.read_daily_frames(new_dates):
+            if len(frames[0]) == 0:  # 当前无交易
+                continue
+            for code in frames[0]['code']:  # 新上市的股票放在矩阵最右侧
+                if code[:3] in ['688', '300'] or code in code_order_dic:
                     continue
-                if str(date) not in lst:
-                    os.makedirs('{}/StockIntraDayData/10m/{}'.format(self.data_path, date))
-                stocks = os.listdir('{}/StockIntraDayData/10m/{}'.format(self.data_path, date))  # 上一次查询已有的股票
-                for stock in all_stocks:  # 剔除创业板股票，避免超出查询限制
-                    if stock[:3] == '300' or stock[:3] == '688':
-                        continue
-                    if '{}.csv'.format(stock) in stocks:
-                        continue
-                    end_date = date + datetime.timedelta(days=1)
-                    intra_day_data = get_price(stock, frequency='10m',
-                                               fields=['open', 'close', 'low', 'high', 'volume', 'money'],
-                                               start_date=date, end_date=end_date)
-                    intra_day_data.to_csv('{}/StockIntraDayData/10m/{}/{}.csv'.format(self.data_path, date, stock),
-                                          index=False)
+                code_order_dic[code] = len(code_order_dic)
+                order_code_dic[len(order_code_dic)] = code
+            if need_industry:
+                with open('{}/StockDailyData/{}/industry_{}.pkl'.format(self.data_path, date, date), 'rb') as file:
+                    industry_dic = pickle.load(file)
+                for key, value in industry_dic.items():
+                    for name in value.keys():
+                        if name not in industry_order_dic[key]:
+                            order_industry_dic[key][len(industry_order_dic[key])] = name
+                            industry_order_dic[key][name] = len(industry_order_dic[key])
+            frames_lst.append((date, frames))
+
+        for i in range(tail, len(position_date_dic)):
+            del date_position_dic[position_date_dic[i]]
+            del position_date_dic[i]
+        code_index = pd.Index([order_code_dic[i] for i in range(len(order_code_dic))])
+        names = self.stock_names + self.fundamental_names + self.money_flow_names
+        new_dic = {name: np.zeros((len(frames_lst), len(code_index))) for name in names}
+        industry = {name: -np.ones((len(frames_lst), len(code_index))) for name in self.ind_names}
+        for k in range(len(frames_lst)):
+            date, (stock_data, fundamental, money_flow) = frames_lst[k]
+            date_position_dic[date] = tail + k
+            position_date_dic[tail + k] = date
+            self.scatter_frame(new_dic, k, stock_data, 'code', self.stock_names, code_index)
+            self.scatter_frame(new_dic, k, fundamental, 'code', self.fundamental_names, code_index)
+            self.scatter_frame(new_dic, k, money_flow, 'sec_code', self.money_flow_names, code_index)
+            if need_industry:
+                self.scatter_industry(industry, k, date, industry_order_dic, code_index)
+            print('{} done.'.format(date))
+
+        # 收益率和top只有尾部会变化，回溯足够多的行用于计算
+        back = max(tail - max(length, 50), 0)
+        data_dic = {}
+        for name in names:
+            old = store.load('data_{}'.format(name), mmap_mode='r')
+            data_dic[name] = np.zeros((len(frames_lst) + tail - back, len(code_index)))
+            data_dic[name][:tail - back, :old.shape[1]] = old[back:tail]
+            data_dic[name][tail - back:] = new_dic[name]
+            del old
+        ret_start = max(tail - length, 0)
+        ret = self.cal_ret(data_dic, return_type, start=ret_start - back)
+        top = self.cal_top(data_dic, top_constraint=top_constraint, start=max(tail, 1) - back)
+
+        for name in names:
+            store.append('data_{}'.format(name), new_dic[name], start=tail, dump_manifest=False)
+        if need_industry:
+            for name in self.ind_names:
+                store.append('industry_{}'.format(name), industry[name], start=tail, fill_value=-1,
+                             dump_manifest=False)
+        store.append('return', ret, start=ret_start, dump_manifest=False)
+        store.append('top', top, start=max(tail, 1), fill_value=False, dump_manifest=False)
+        store.set_axis([position_date_dic[i] for i in range(len(position_date_dic))],
+                       [order_code_dic[i] for i in range(len(order_code_dic))])
+
+        with open('{}/start_end_date.pkl'.format(path), 'wb') as f:
+            pickle.dump((start_end_date[0], end_date), f)
+        with open('{}/code_order_dic.pkl'.format(path), 'wb') as f:
+            pickle.dump(code_order_dic, f)
+        with open('{}/order_code_dic.pkl'.format(path), 'wb') as f:
+            pickle.dump(order_code_dic, f)
+        with open('{}/date_position_dic.pkl'.format(path), 'wb') as f:
+            pickle.dump(date_position_dic, f)
+        with open('{}/position_date_dic.pkl'.format(path), 'wb') as f:
+            pickle.dump(position_date_dic, f)
+        if need_industry:
+            with open('{}/industry_order_dic.pkl'.format(path), 'wb') as f:
+                pickle.dump(industry_order_dic, f)
+            with open('{}/order_industry_dic.pkl'.format(path), 'wb') as f:
+                pickle.dump(order_industry_dic, f)
 
     """
     get_matrix_data方法读取给定起始日期的原始数据，并生成需要的收益率矩阵，字典等
@@ -268,9 +636,17 @@ class DataLoader:
 
     def get_matrix_data(self, back_test_name='default', frequency=None,
                         start_date='2021-01-01', end_date='2021-06-30', back_windows=10,
-                        return_type='close_close_1', top_constraint='volume', need_industry=False):
+                        return_type='close_close_1', top_constraint='volume', need_industry=False, num_workers=1,
+                        incremental=True, intra_fields=None, intra_bars=None, intra_dtype='float64',
+                        dtype='float64'):
         # 在获取足够多的行业数据之前要通过字段确定是否要加入industry字段
         """
+        :param dtype: 日频矩阵的精度，float32可以在同样的内存中放下两倍的回测区间或者股票数，ret仍然是float64
+        :param intra_dtype: 日内张量的数据类型，可以用float32
+        :param intra_bars: 需要的日内bar，例如slice(0, 6)表示开盘第一个小时，默认全部24个
+        :param intra_fields: 需要的日内字段，例如['close', 'volume']，默认全部
+        :param incremental: 结束日期超出缓存时，是否只追加新的交易日而不是全部重写
+        :param num_workers: 重写缓存时并行读取每日文件的线程数
         :param need_industry: 是否需要处理行业信息，在获得足够多行业信息后将删除
         :param back_test_name: 该回测的名字
         :param frequency: 回测频率，目前默认且仅支持日频
@@ -295,11 +671,13 @@ class DataLoader:
             if back_test_name not in lst:
                 os.makedirs('{}/{}'.format(self.back_test_data_path, back_test_name))
             lst = os.listdir('{}/{}'.format(self.back_test_data_path, back_test_name))
-            names_to_check = ['code_order_dic.pkl', 'raw_data_dic.pkl', 'return.pkl',
-                              'order_code_dic.pkl', 'date_position_dic.pkl',
-                              'position_date_dic.pkl', 'top.pkl', 'start_end_date.pkl']
+            names_to_check = ['code_order_dic.pkl', 'order_code_dic.pkl', 'date_position_dic.pkl',
+                              'position_date_dic.pkl', 'start_end_date.pkl']
+            fields_to_check = ['return', 'top']  # 矩阵数据存放在按列存储的panel中
             if need_industry:
-                names_to_check += ['industry.pkl', 'industry_order_dic.pkl', 'order_industry_dic.pkl']
+                names_to_check += ['industry_order_dic.pkl', 'order_industry_dic.pkl']
+                fields_to_check += ['industry_swf', 'industry_sws', 'industry_swt', 'industry_concept']
+            store = PanelStore('{}/{}/panel'.format(self.back_test_data_path, back_test_name))
             # 判断是否要重写
             rewrite = False
             for name in names_to_check:
@@ -307,11 +685,17 @@ class DataLoader:
                     print('{} not found'.format(name))
                     rewrite = True
                     break
+            if not rewrite and not store.exists(fields_to_check):
+                print('panel not found')
+                rewrite = True
             if not rewrite:
                 with open('{}/{}/start_end_date.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
                     start_end_date = pickle.load(f)
-                if start_date < start_end_date[0] or end_date > start_end_date[1]:
+                if start_date < start_end_date[0] or (end_date > start_end_date[1] and not incremental):
                     rewrite = True
+                elif end_date > start_end_date[1]:  # 只需要在缓存尾部追加新的交易日
+                    self.extend_matrix_data(back_test_name, store, start_end_date, end_date,
+                                            return_type=return_type, top_constraint=top_constraint)
 
             if rewrite:  # code_order_dic用于存储该回测区间内出现过的股票代码到矩阵位置的映射
                 print('getting data...')
@@ -333,21 +717,20 @@ class DataLoader:
                     if str(date) in dates:
                         date_position_dic[date] = days  # 这个日期对应的矩阵第几行
                         position_date_dic[days] = date  # 第几行对应的是哪一天的日期
-                        data = pd.read_csv('{}/StockDailyData/{}/stock_{}.pkl'.format(self.data_path,
-                                                                             date, date))
+                        data = self.daily_store.read('stock', date, columns=['code'])
 
-                            if len(data) == 0:  # 说明当前无交易，略过
+                        if len(data) == 0:  # 说明当前无交易，略过
+                            continue
+                        codes = list(data['code'])
+                        for code in codes:
+                            if code[:3] in ['688', '300']:  # 剔除创业板和科创版的股票
                                 continue
-                            codes = list(data['code'])
-                            for code in codes:
-                                if code[:3] in ['688', '300']:  # 剔除创业板和科创版的股票
-                                    continue
-                                try:
-                                    code_order_dic[code]
-                                except KeyError:  # 代码规范：最好写明具体的错误类型
-                                    code_order_dic[code] = order
-                                    order_code_dic[order] = code
-                                    order += 1
+                            try:
+                                code_order_dic[code]
+                            except KeyError:  # 代码规范：最好写明具体的错误类型
+                                code_order_dic[code] = order
+                                order_code_dic[order] = code
+                                order += 1
                         days += 1
                 with open('{}/{}/code_order_dic.pkl'.format(self.back_test_data_path, back_test_name), 'wb') as f:
                     pickle.dump(code_order_dic, f)
@@ -389,124 +772,68 @@ class DataLoader:
                         pickle.dump(order_industry_dic, f)
 
                 # 获得数据字典
-                names = ['open', 'close', 'high', 'low', 'avg', 'factor', 'volume', 'turnover_ratio',
-                         'net_pct_main', 'net_pct_xl', 'net_pct_l', 'net_pct_m', 'net_pct_s']
+                names = self.stock_names + self.fundamental_names + self.money_flow_names
 
                 data_dic = {}  # 原始数据字典
                 for name in names:
                     data_dic[name] = np.zeros((days, len(code_order_dic)))
 
                 industry = {}  # 行业分类字典
-                ind_names = ['swf', 'sws', 'swt', 'concept']  # 行业分类准则
-                for name in ind_names:
+                for name in self.ind_names:
                     industry[name] = -np.ones((days, len(code_order_dic)))  # 初始化为-1，如果有股票不被分类
 
-                ret = np.zeros((days, len(code_order_dic)))
-                start_name = return_type.split('_')[0]
-                end_name = return_type.split('_')[1]
-
-                k = 0
+                code_index = pd.Index([order_code_dic[i] for i in range(len(order_code_dic))])  # 代码到列位置的索引
+                fill_dates = []  # 需要读入的交易日，按顺序排列
                 for i in range(-back_windows, (end_date - start_date).days + 1 + length + 1):
                     date = start_date + datetime.timedelta(days=i)
                     if date.weekday() in [5, 6]:
                         continue
                     if str(date) in dates:
-                        # 处理基本数据
-                        data = pd.read_csv('{}/StockDailyData/{}/stock_{}.pkl'.format(self.data_path,
-                                                                             date, date))
-                        if len(data) == 0:
-                            continue
-                        index = list(data['code'])
-                        for j in range(len(data)):
-                            if index[j][:3] in ['688', '300']:  # 剔除科创版和创业板股票
-                                continue
-                            for name in names[:7]:
-                                data_dic[name][k, code_order_dic[index[j]]] = data[name].iloc[j]
-
-                        # 处理基本面
-                        data = pd.read_csv('{}/StockDailyData/{}/fundamental_{}.pkl'.format(self.data_path,
-                                                                                   date, date))
-                        index = list(data.index)
-                        for j in range(len(data)):
-                            if index[j][:3] in ['688', '300']:  # 剔除科创版和创业板股票
-                                continue
-                            for name in names[7:8]:
-                                try:
-                                    data_dic[name][k, code_order_dic[index[j]]] = data[name].iloc[j]
-                                except KeyError:
-                                    pass
-
-                        # 处理资金流
-                        data = pd.read_csv('{}/StockDailyData/{}/money_flow_{}.pkl'.format(self.data_path,
-                                                                                  date, date))
-                        index = list(data.index)
-                        for j in range(len(data)):
-                            if index[j][:3] in ['688', '300']:  # 剔除科创版和创业板股票
-                                continue
-                            for name in names[8:]:
-                                data_dic[name][k, code_order_dic[index[j]]] = data[name].iloc[j]
+                        fill_dates.append(date)
 
-                        # 处理行业
-                        if need_industry:
-                            with open('{}/StockDailyData/{}/industry_{}.pkl'.format(self.data_path,
-                                                                                    date, date), 'rb') as file:
-                                data = pickle.load(file)
-                                for ind_name in ind_names:
-                                    ind = data[ind_name]  # 该天的一个行业分类，形式是行业编号：代码列表
-                                    for key, value in ind.items():  # value是一个列表，里面是股票代码
-                                        ind_num = industry_order_dic[ind_name][key]
-
-                                        for code in value:  # 这个列表里面的股票代码
-                                            try:
-                                                industry[ind_name][k, code_order_dic[code]] = ind_num
-                                            except KeyError:
-                                                pass
-
-                        print('{} done.'.format(date))
-                        k += 1
-                ret[:-length] = data_dic[end_name][length:] / data_dic[start_name][:-length] - 1
-                ret[np.isnan(ret)] = 0
-
-                # 生成top
-                top = (data_dic['close'] < 100) & (data_dic['close'] > 10)
-                for i in range(len(top) - 1, 0, -1):  # 剔除上市不足50个交易日的股票
-                    for j in range(top.shape[1]):
-                        if i <= 50:
-                            if np.isnan(data_dic['close'][0, j]) or data_dic['close'][0, j] == 0:
-                                top[i, j] = False
-                        else:
-                            if np.isnan(data_dic['close'][i - 50, j]) or data_dic['close'][i - 50, j] == 0:
-                                top[i, j] = False
-
-                if top_constraint == 'volume':  # 按照成交量筛选前1000的股票
-                    for i in range(len(top)):
-                        tmp = data_dic['volume'][i][top[i]].argsort()[-1000:]  # 成交量最大的1000只
-                        tmp_value = np.zeros(np.sum(top[i]))
-                        tmp_value[tmp] = True
-                        top[i][top[i]] = tmp_value
-
-                # 写入数据
-                with open('{}/{}/raw_data_dic.pkl'.format(self.back_test_data_path, back_test_name), 'wb') as f:
-                    pickle.dump(data_dic, f)
-                with open('{}/{}/return.pkl'.format(self.back_test_data_path, back_test_name), 'wb') as f:
-                    pickle.dump(ret, f)
-                with open('{}/{}/top.pkl'.format(self.back_test_data_path, back_test_name), 'wb') as f:
-                    pickle.dump(top, f)
+                k = 0
+                rows = 0  # 统计写入的行数
+                t0 = time.time()
+                for date, frames in self.read_daily_frames(fill_dates, num_workers=num_workers):
+                    stock_data, fundamental, money_flow = frames
+                    if len(stock_data) == 0:
+                        continue
+                    # 处理基本数据，基本面和资金流，不在code_index中的股票（科创版和创业板）会被剔除
+                    rows += self.scatter_frame(data_dic, k, stock_data, 'code', self.stock_names, code_index)
+                    rows += self.scatter_frame(data_dic, k, fundamental, 'code', self.fundamental_names, code_index)
+                    rows += self.scatter_frame(data_dic, k, money_flow, 'sec_code', self.money_flow_names,
+                                               code_index)
+
+                    # 处理行业
+                    if need_industry:
+                        self.scatter_industry(industry, k, date, industry_order_dic, code_index)
+
+                    print('{} done.'.format(date))
+                    k += 1
+                print('{} rows ingested, {:.0f} rows/sec'.format(rows, rows / max(time.time() - t0, 1e-6)))
+                ret = self.cal_ret(data_dic, return_type)
+                top = self.cal_top(data_dic, top_constraint=top_constraint)
+                data_dic = {name: value.astype(dtype, copy=False) for name, value in data_dic.items()}
+
+                # 写入数据，每个字段单独一个文件
+                store.set_axis([position_date_dic[i] for i in range(len(ret))],
+                               [order_code_dic[i] for i in range(len(order_code_dic))])
+                store.write_dic(data_dic, prefix='data_')
+                store.write('return', ret, dump_manifest=False)
+                store.write('top', top)
                 if need_industry:
-                    with open('{}/{}/industry.pkl'.format(self.back_test_data_path, back_test_name), 'wb') as f:
-                        pickle.dump(industry, f)
+                    store.write_dic(industry, prefix='industry_')
                     data = Data(code_order_dic, order_code_dic, date_position_dic, position_date_dic,
-                                data_dic, ret, industry, start_date, end_date, top)
+                                data_dic, ret, industry, start_date, end_date, top, dtype=dtype)
                 else:
                     data = Data(code_order_dic, order_code_dic, date_position_dic, position_date_dic,
-                                data_dic, ret, industry=None, start_date=start_date, end_date=end_date, top=top)
+                                data_dic, ret, industry=None, start_date=start_date, end_date=end_date, top=top,
+                                dtype=dtype)
             else:
                 # 直接读入数据
                 print('using cache')
-                with open('{}/{}/raw_data_dic.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
-                    data_dic = pickle.load(f)
-                with open('{}/{}/return.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
-                    ret = pickle.load(f)
+                data_dic = store.data_dic(prefix='data_', dtype=dtype)  # 懒加载，第一次访问某个字段时才映射，精度不一致时转换
+                ret = store.load('return')
                 with open('{}/{}/code_order_dic.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
                     code_order_dic = pickle.load(f)
                 with open('{}/{}/order_code_dic.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
@@ -515,16 +842,15 @@ class DataLoader:
                     date_position_dic = pickle.load(f)
                 with open('{}/{}/position_date_dic.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
                     position_date_dic = pickle.load(f)
-                with open('{}/{}/top.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
-                    top = pickle.load(f)
+                top = store.load('top')
                 if need_industry:
-                    with open('{}/{}/industry.pkl'.format(self.back_test_data_path, back_test_name), 'rb') as f:
-                        industry = pickle.load(f)
+                    industry = store.data_dic(prefix='industry_')
                     data = Data(code_order_dic, order_code_dic, date_position_dic, position_date_dic,
-                                data_dic, ret, industry, start_date, end_date, top)
+                                data_dic, ret, industry, start_date, end_date, top, dtype=dtype)
                 else:
                     data = Data(code_order_dic, order_code_dic, date_position_dic, position_date_dic,
-                                data_dic, ret, industry=None, start_date=start_date, end_date=end_date, top=top)
+                                data_dic, ret, industry=None, start_date=start_date, end_date=end_date, top=top,
+                                dtype=dtype)
 
             if '10m' in frequency:  # 读取10min数据
                 if 'daily' not in frequency or data is None:
@@ -533,63 +859,36 @@ class DataLoader:
                 lst = os.listdir('{}'.format(self.back_test_data_path))
                 if back_test_name not in lst:
                     os.makedirs('{}/{}'.format(self.back_test_data_path, back_test_name))
-                lst = os.listdir('{}/{}'.format(self.back_test_data_path, back_test_name))
-                names_to_check = ['intra_open.pkl', 'intra_high.pkl', 'intra_low.pkl', 'intra_close.pkl',
-                                  'intra_volume.pkl', 'intra_money.pkl', 'intra_avg.pkl']
-                # 判断是否要重写
-                for name in names_to_check:
-                    if name not in lst:
-                        print('{} not found'.format(name))
-                        rewrite = True
-                        break
-                names = ['intra_open', 'intra_high', 'intra_low', 'intra_close', 'intra_volume',
-                         'intra_money', 'intra_avg']
-                # 判断是否要重写
-                if rewrite:  # 需要重写数据
-                    data.data_dic['intra_close'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                             data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_open'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                            data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_high'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                            data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_low'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                           data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_volume'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                              data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_money'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                             data.data_dic['close'].shape[1]))
-                    data.data_dic['intra_avg'] = np.zeros((data.data_dic['close'].shape[0], 24,
-                                                           data.data_dic['close'].shape[1]))
-                    dates = os.listdir('{}/StockDailyData'.format(self.data_path))
-                    length = int(return_type.split('_')[-1])
-                    k = 0
+                if intra_fields is None:
+                    intra_fields = IntradayLoader.fields
+                if intra_bars is None:
+                    intra_bars = slice(0, 24)
+                names = ['intra_{}'.format(name) for name in intra_fields]
+                shape = [len(data.ret), len(range(24)[intra_bars]), data.ret.shape[1]]
+                # 判断是否要重写，日频缓存这次重写过时日内数据也要重写
+                axis = store.axis_key()
+                if not store.exists(['data_{}'.format(name) for name in names]):
+                    print('intra panel not found')
+                    rewrite = True
+                elif not rewrite:
+                    for name in names:  # 日频缓存的日期或股票变了，或者bar的范围和精度变了，日内数据都需要重新生成
+                        field = store.manifest['fields']['data_{}'.format(name)]
+                        if field['shape'] != shape or np.dtype(field['dtype']) != np.dtype(intra_dtype) or \
+                                field.get('axis') != axis:
+                            rewrite = True
+                            break
+                if rewrite:  # 逐天直接写入磁盘上的张量，内存中只保留一天的数据
                     print('getting 10m data...')
-                    for i in range(-back_windows, (end_date - start_date).days + 1 + length + 1):
-                        date = start_date + datetime.timedelta(days=i)
-                        if date.weekday() in [5, 6]:
-                            continue
-                        if str(date) in dates:
-                            stocks = os.listdir('{}/StockIntraDayData/10m/{}'.format(self.data_path, date))
-                            for stock in stocks:  # 依次读入每一只股票
-                                with open('{}/StockIntraDayData/10m/{}/{}'.format(self.data_path,
-                                                                                  date, stock), 'rb') as file:
-                                    intra_data = pickle.load(file)
-                                    try:
-                                        for name in names:
-                                            data.data_dic[name][k, :, code_order_dic[stock[:-4]]] = \
-                                                intra_data[name[6:]].values
-                                        data.data_dic['intra_avg'][k, :, code_order_dic[stock[:-4]]] = \
-                                            intra_data['money'].values / intra_data['volume'].values
-                                    except KeyError:
-                                        pass
-                            k += 1
-                            print('{} done.'.format(date))
-                    for name in names:
-                        with open('{}/{}/{}.pkl'.format(self.back_test_data_path, back_test_name, name), 'wb') as f:
-                            pickle.dump(data.data_dic[name], f)
+                    loader = IntradayLoader(self.data_path, frequency='10m', bars=24, dtype=intra_dtype,
+                                            num_workers=num_workers)
+                    position_date_dic = {k: data.position_date_dic[k] for k in range(len(data.ret))}
+                    data.data_dic.update(loader.load(store, position_date_dic, code_order_dic,
+                                                     fields=intra_fields, bar_slice=intra_bars))
+                    for name in names:  # 记录生成时日频面板的日期和股票
+                        store.manifest['fields']['data_{}'.format(name)]['axis'] = axis
+                    store.dump_manifest()
                 else:
                     print('using cache')
-                    for name in names:
-                        with open('{}/{}/{}.pkl'.format(self.back_test_data_path, back_test_name, name), 'rb') as f:
-                            data.data_dic[name] = pickle.load(f)
+                    for name in names:  # 三维张量只做映射，不读入内存
+                        data.data_dic[name] = store.load('data_{}'.format(name))
         return data
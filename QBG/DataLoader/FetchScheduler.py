@@ -0,0 +1,169 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的FetchScheduler类用于并发地调用聚宽接口，同时遵守查询频率限制
+This code defines the FetchScheduler class, which runs data API requests concurrently under a rate limit
+
+-- TokenBucket：令牌桶限流，每次调用接口前需要拿到一个令牌
+-- FetchJournal：记录已经完成的任务，程序中断后重新运行时跳过这些任务
+-- FetchScheduler：有界的线程池，每次接口调用失败后按指数退避重试，遇到每日查询上限时停止提交新的任务
+
+开发日志：
+2026-10-18
+-- 新增：FetchScheduler，TokenBucket，FetchJournal
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: 每秒补充的令牌数，也就是平均每秒最多调用多少次接口
+        :param capacity: 桶的容量，决定最多可以连续突发多少次调用，默认等于rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """
+        :param n: 需要的令牌数
+        :return: 拿到令牌后返回，否则阻塞等待
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchJournal:
+    def __init__(self, path):
+        """
+        :param path: 日志文件路径，每一行是一个已经完成的任务
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.done = set(line.strip() for line in f if line.strip())
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def mark(self, key):
+        with self.lock:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(key + '\n')
+            self.done.add(key)
+
+    def remove(self):  # 全部任务完成后删除日志
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = set()
+
+
+class QuotaExceeded(Exception):  # 达到每日查询上限，重试也没有用
+    pass
+
+
+class FetchScheduler:
+    def __init__(self, num_workers=1, rate=None, capacity=None, max_retries=3, backoff=1.0, journal=None,
+                 quota_keywords=('最大查询限制', '查询条数', 'exceeded')):
+        """
+        :param num_workers: 并发的线程数
+        :param rate: 每秒最多调用多少次接口，None表示不限流
+        :param capacity: 令牌桶容量
+        :param max_retries: 每次接口调用最多重试多少次
+        :param backoff: 第一次重试前等待的秒数，之后每次翻倍
+        :param journal: FetchJournal实例，None表示不记录
+        :param quota_keywords: 异常信息中包含这些关键字时认为是达到了每日查询上限
+        """
+        self.num_workers = num_workers
+        self.bucket = TokenBucket(rate, capacity) if rate is not None else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.journal = journal
+        self.quota_keywords = quota_keywords
+        self.stopped = False
+
+    def call(self, func, *args, **kwargs):
+        """
+        :param func: 需要调用的接口
+        :return: 接口的返回值，重试max_retries次后仍然失败则抛出异常
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.stopped:
+                raise QuotaExceeded('fetch stopped')
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if any(k in str(e) for k in self.quota_keywords):
+                    self.stopped = True
+                    raise QuotaExceeded(str(e))
+                if attempt == self.max_retries:
+                    raise
+                print('{} failed: {}, retrying...'.format(getattr(func, '__name__', func), e))
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def run(self, tasks):
+        """
+        :param tasks: (key, func)的列表，func不需要参数，内部通过call调用接口
+        :return: 没有完成的任务的key列表，完成的任务会写入journal
+        """
+        if self.journal is not None:
+            tasks = [(key, func) for key, func in tasks if key not in self.journal]
+        failed = []
+
+        def work(key, func):
+            func()
+            if self.journal is not None:
+                self.journal.mark(key)
+
+        if self.num_workers <= 1:
+            for key, func in tasks:
+                if self.stopped:
+                    failed.append(key)
+                    continue
+                try:
+                    work(key, func)
+                except Exception as e:
+                    if not isinstance(e, QuotaExceeded):
+                        print('{} failed: {}'.format(key, e))
+                    failed.append(key)
+        else:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = {}
+                for key, func in tasks:
+                    futures[executor.submit(self._guarded, work, key, func)] = key
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if not isinstance(e, QuotaExceeded):
+                            print('{} failed: {}'.format(futures[future], e))
+                        failed.append(futures[future])
+        if self.stopped:
+            print('quota exceeded, {} tasks left, run again to resume'.format(len(failed)))
+        return failed
+
+    def _guarded(self, work, key, func):  # 已经达到查询上限时，排队中的任务直接放弃
+        if self.stopped:
+            raise QuotaExceeded('fetch stopped')
+        work(key, func)
@@ -0,0 +1,122 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的IntradayLoader类用于把日内分钟数据逐天写入三维张量
+This code defines the IntradayLoader class, which streams intraday bars into (days, bars, stocks) tensors day by day
+
+张量直接在PanelStore中以memmap的形式创建，每天读完就写入对应的行，内存占用只和一天的数据量有关，
+不随回测区间的长度增长；可以只读取部分字段或者部分bar，例如开盘第一个小时，也可以用float32存储
+
+开发日志：
+2026-10-18
+-- 新增：IntradayLoader类，支持并行读取每天的股票文件，字段和bar的子集，float32存储
+-- 更新：优先读取IntradayStore打包的每日文件，没有打包的日期仍然逐只股票读取
+-- 修复：日期文件夹为空或者所有股票的数据都不完整时跳过这一天，不再在reshape时报错
+"""
+
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from IntradayStore import IntradayStore
+
+
+class IntradayLoader:
+    fields = ['open', 'high', 'low', 'close', 'volume', 'money', 'avg']  # avg由money除以volume得到
+
+    def __init__(self, data_path, frequency='10m', bars=24, dtype='float64', num_workers=1):
+        """
+        :param data_path: 存放数据的路径
+        :param frequency: 日内数据频率
+        :param bars: 每天的bar数，10m数据是24
+        :param dtype: 张量的数据类型，可以用float32节省一半的内存和磁盘
+        :param num_workers: 并行读取每天股票文件的线程数
+        """
+        self.data_path = data_path
+        self.frequency = frequency
+        self.bars = bars
+        self.dtype = np.dtype(dtype)
+        self.num_workers = num_workers
+        self.store = IntradayStore(data_path, frequency=frequency, bars=bars)
+
+    def read_day(self, date, code_order_dic, fields, bar_slice):
+        """
+        :param date: 日期
+        :param code_order_dic: 股票代码到矩阵位置的字典
+        :param fields: 需要的字段
+        :param bar_slice: 需要的bar
+        :return: 股票位置数组，以及每个字段形状为(bar数, 股票数)的矩阵
+        """
+        if self.store.exists(date):  # 打包文件一次读入当天所有股票
+            codes, counts, arrays = self.store.read(date, fields=[f for f in fields if f != 'avg'] +
+                                                    (['money', 'volume'] if 'avg' in fields else []))
+            keep = np.array([code in code_order_dic for code in codes], dtype=bool) & (counts == self.bars)
+            pos = np.array([code_order_dic[code] for code in codes[keep]], dtype=int)
+            day = {}
+            for name in fields:
+                if name == 'avg':
+                    value = arrays['money'][keep][:, bar_slice] / arrays['volume'][keep][:, bar_slice]
+                else:
+                    value = arrays[name][keep][:, bar_slice]
+                day[name] = value.T.astype(self.dtype)
+            return pos, day
+        path = '{}/StockIntraDayData/{}/{}'.format(self.data_path, self.frequency, date)
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=int), {}
+        stocks = [s for s in os.listdir(path) if os.path.splitext(s)[0] in code_order_dic]
+
+        def read(stock):
+            intra_data = self.store.read_stock('{}/{}'.format(path, stock))
+            if len(intra_data) != self.bars:  # 停牌或者数据不完整
+                return None
+            values = {}
+            for name in fields:
+                if name == 'avg':
+                    values[name] = intra_data['money'].values[bar_slice] / intra_data['volume'].values[bar_slice]
+                else:
+                    values[name] = intra_data[name].values[bar_slice]
+            return code_order_dic[os.path.splitext(stock)[0]], values
+
+        if self.num_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                results = [r for r in executor.map(read, stocks) if r is not None]
+        else:
+            results = [r for r in map(read, stocks) if r is not None]
+        if len(results) == 0:  # 空的日期文件夹，或者所有股票的数据都不完整
+            return np.zeros(0, dtype=int), {}
+        pos = np.array([r[0] for r in results], dtype=int)
+        day = {name: np.array([r[1][name] for r in results], dtype=self.dtype).reshape(len(results), -1).T
+               for name in fields}
+        return pos, day
+
+    def load(self, store, position_date_dic, code_order_dic, fields=None, bar_slice=None, prefix='data_intra_'):
+        """
+        :param store: PanelStore实例，张量直接在其中创建
+        :param position_date_dic: 矩阵行号到日期的字典
+        :param code_order_dic: 股票代码到矩阵位置的字典
+        :param fields: 需要的字段，默认全部
+        :param bar_slice: 需要的bar，例如slice(0, 6)表示开盘第一个小时，默认全部
+        :param prefix: 字段名前缀
+        :return: 字段名到memmap张量的字典，键不含前缀data_
+        """
+        if fields is None:
+            fields = self.fields
+        if bar_slice is None:
+            bar_slice = slice(0, self.bars)
+        n_bars = len(range(self.bars)[bar_slice])
+        shape = (len(position_date_dic), n_bars, len(code_order_dic))
+        tensors = {name: store.create(prefix + name, shape, dtype=self.dtype, dump_manifest=False) for name in fields}
+        store.dump_manifest()
+        for k in range(len(position_date_dic)):
+            pos, day = self.read_day(position_date_dic[k], code_order_dic, fields, bar_slice)
+            if len(pos) == 0:
+                continue
+            for name in fields:
+                tensors[name][k][:, pos] = day[name]
+            print('{} done.'.format(position_date_dic[k]))
+        result = {}
+        for name in fields:
+            tensors[name].flush()
+            result[prefix[len('data_'):] + name] = store.load(prefix + name)
+        del tensors
+        return result
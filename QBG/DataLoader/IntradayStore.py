@@ -0,0 +1,125 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的IntradayStore类用于把每天所有股票的日内数据打包成一个文件
+This code defines the IntradayStore class, which packs all stocks' intraday bars of a day into a single file
+
+原先每只股票每天一个文件，一天就有几千个小文件；打包后每天一个StockIntraDayData/<frequency>/<date>.npz，
+其中codes是股票代码，counts是每只股票实际的bar数，每个字段是形状为(股票数, bar数)的矩阵，bar数不足的部分为nan，
+读取时一次顺序读入整个文件
+
+开发日志：
+2026-10-18
+-- 新增：IntradayStore类，支持按天打包和读取，以及把已有的按股票存放的文件夹转换为打包文件
+-- 修复：打包文件中没有的字段读取时返回全为nan的矩阵，空的日期不再报KeyError；convert跳过空的文件夹
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IntradayStore:
+    def __init__(self, data_path, frequency='10m', bars=24):
+        """
+        :param data_path: 存放数据的路径
+        :param frequency: 日内数据频率
+        :param bars: 每天的bar数，10m数据是24
+        """
+        self.data_path = data_path
+        self.frequency = frequency
+        self.bars = bars
+        self.path = '{}/StockIntraDayData/{}'.format(data_path, frequency)
+
+    def file(self, date):
+        return '{}/{}.npz'.format(self.path, date)
+
+    def exists(self, date):
+        return os.path.exists(self.file(date))
+
+    def write(self, date, frames):
+        """
+        :param date: 日期
+        :param frames: 股票代码到当天日内DataFrame的字典
+        """
+        codes = sorted(frames.keys())
+        fields = []
+        for code in codes:
+            fields += [c for c in frames[code].columns if c not in fields and frames[code][c].dtype.kind in 'biuf']
+        counts = np.array([min(len(frames[code]), self.bars) for code in codes], dtype=np.int32)
+        arrays = {}
+        for name in fields:
+            array = np.full((len(codes), self.bars), np.nan)
+            for i, code in enumerate(codes):
+                if name in frames[code].columns:
+                    array[i, :counts[i]] = frames[code][name].values[:counts[i]]
+            arrays[name] = array
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.file(date) + '.tmp', 'wb') as f:  # 先写临时文件，避免中断后留下不完整的打包文件
+            np.savez(f, codes=np.array(codes, dtype=str), counts=counts, **arrays)
+        os.replace(self.file(date) + '.tmp', self.file(date))
+
+    def read(self, date, fields=None):
+        """
+        :param date: 日期
+        :param fields: 需要的字段，默认全部
+        :return: 股票代码数组，每只股票的bar数，以及字段名到(股票数, bar数)矩阵的字典；
+                 文件中没有的字段全为nan，例如没有股票的日期只写入了codes和counts
+        """
+        with np.load(self.file(date)) as f:
+            if fields is None:
+                fields = [name for name in f.files if name not in ['codes', 'counts']]
+            codes = f['codes']
+            return codes, f['counts'], {name: f[name] if name in f.files else np.full((len(codes), self.bars), np.nan)
+                                        for name in fields}
+
+    @staticmethod
+    def read_stock(path):
+        """
+        :param path: 某只股票某一天的日内数据文件
+        :return: DataFrame
+        """
+        if path.endswith('.csv'):
+            return pd.read_csv(path)
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def pack(self, date, remove=False, num_workers=1):
+        """
+        :param date: 日期，对应的按股票存放的文件夹会被打包
+        :param remove: 打包后是否删除原文件夹
+        :param num_workers: 读取原文件的线程数
+        :return: 打包的股票数
+        """
+        path = '{}/{}'.format(self.path, date)
+        stocks = sorted(os.listdir(path))
+        files = ['{}/{}'.format(path, stock) for stock in stocks]
+        if num_workers > 1:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                frames = list(executor.map(self.read_stock, files))
+        else:
+            frames = [self.read_stock(file) for file in files]
+        self.write(date, {os.path.splitext(stock)[0]: frame for stock, frame in zip(stocks, frames)})
+        if remove:
+            shutil.rmtree(path)
+        return len(stocks)
+
+    def convert(self, dates=None, remove=False, num_workers=1):
+        """
+        :param dates: 需要转换的日期，默认是所有按股票存放的文件夹
+        :param remove: 打包后是否删除原文件夹
+        :param num_workers: 读取原文件的线程数
+        :return: 无返回值，把已有的按股票存放的文件夹转换为每天一个打包文件，空的文件夹不打包
+        """
+        if dates is None:
+            dates = sorted(d for d in os.listdir(self.path) if os.path.isdir('{}/{}'.format(self.path, d)))
+        for date in dates:
+            if not os.listdir('{}/{}'.format(self.path, date)):  # get_pv_data预先创建但没有获取到数据
+                print('{} is empty, skipped.'.format(date))
+                continue
+            n = self.pack(date, remove=remove, num_workers=num_workers)
+            print('{} packed, {} stocks.'.format(date, n))
+
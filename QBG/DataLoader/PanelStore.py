@@ -0,0 +1,254 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的PanelStore类用于按列存储回测所需的矩阵数据
+This code defines a columnar on-disk panel store for the matrices used in back test
+
+每一个字段单独存成一个.npy文件，另有一个manifest.json记录日期轴、股票代码轴以及每个字段的dtype和形状，
+读取时通过memmap按需映射，不需要把所有字段一次性读入内存
+
+开发日志：
+2026-10-18
+-- 新增：PanelStore类替代原先的raw_data_dic.pkl，return.pkl和top.pkl缓存
+-- 新增：LazyDataDic类，第一次访问某个字段时才映射对应的文件
+-- 新增：append方法，增量更新时只在文件尾部追加新的交易日
+-- 新增：create方法，直接在磁盘上创建可写的memmap，用于逐天写入日内数据
+-- 新增：LazyDataDic支持dtype，精度与文件不一致的二维矩阵在第一次访问时转换
+-- 新增：LazyDataDic.source，区分仍然来自文件的字段和手动赋值过的字段，PopulationEvaluator据此直接映射回测缓存
+-- 新增：axis_key，日期轴和股票代码轴的校验值，日内张量据此判断是否与日频面板对齐
+"""
+
+import numpy as np
+import os
+import json
+import io
+import zlib
+from collections.abc import MutableMapping
+
+
+class LazyDataDic(MutableMapping):
+    def __init__(self, store, names, mmap_mode='c', dtype=None):
+        """
+        :param store: PanelStore实例
+        :param names: 可以懒加载的字段名
+        :param mmap_mode: 映射模式，默认copy-on-write，修改不会写回磁盘
+        :param dtype: 二维浮点矩阵映射后转换为该精度，None或者与文件一致时不转换
+        """
+        self.store = store
+        self.names = list(names)
+        self.mmap_mode = mmap_mode
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.loaded = {}  # 已经映射或者手动赋值的字段
+        self.assigned = set()  # 手动赋值过的字段，与文件中的数据不再一致
+
+    def __getitem__(self, key):
+        try:
+            return self.loaded[key]
+        except KeyError:
+            if key not in self.names:
+                raise
+            value = self.store.load(key, mmap_mode=self.mmap_mode)
+            if self.dtype is not None and value.ndim == 2 and value.dtype.kind == 'f' and value.dtype != self.dtype:
+                value = value.astype(self.dtype)
+            self.loaded[key] = value
+            return self.loaded[key]
+
+    def __setitem__(self, key, value):
+        self.loaded[key] = value
+        self.assigned.add(key)
+        if key not in self.names:
+            self.names.append(key)
+
+    def __delitem__(self, key):
+        if key not in self.names:
+            raise KeyError(key)
+        self.names.remove(key)
+        self.loaded.pop(key, None)
+        self.assigned.discard(key)
+
+    def source(self, key):
+        """
+        :param key: 字段名
+        :return: 该字段仍然是文件中的数据时返回(PanelStore实例, 文件中的字段名)，手动赋值过的字段返回None
+        """
+        if key not in self.names or key in self.assigned:
+            return None
+        if isinstance(self.store, _PrefixedStore):
+            return self.store.store, self.store.prefix + key
+        return self.store, key
+
+    def __iter__(self):
+        return iter(list(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, key):
+        return key in self.names
+
+
+class PanelStore:
+    def __init__(self, path):
+        """
+        :param path: 存放该面板数据的文件夹
+        """
+        self.path = path
+        self.manifest = {'dates': [], 'codes': [], 'fields': {}}
+        if os.path.exists('{}/manifest.json'.format(self.path)):
+            with open('{}/manifest.json'.format(self.path), 'r') as f:
+                self.manifest = json.load(f)
+
+    def exists(self, names=None):
+        """
+        :param names: 需要检查的字段，None表示只检查manifest
+        :return: manifest和对应的字段文件是否都存在
+        """
+        if not os.path.exists('{}/manifest.json'.format(self.path)):
+            return False
+        if names is None:
+            return True
+        for name in names:
+            if name not in self.manifest['fields'] or not os.path.exists('{}/{}.npy'.format(self.path, name)):
+                return False
+        return True
+
+    def set_axis(self, dates, codes):
+        """
+        :param dates: 按顺序排列的交易日，可以是datetime.date或字符串
+        :param codes: 按矩阵列顺序排列的股票代码
+        :return: 无返回值，写入manifest
+        """
+        self.manifest['dates'] = [str(d) for d in dates]
+        self.manifest['codes'] = list(codes)
+        self.dump_manifest()
+
+    def axis_key(self):
+        """
+        :return: 日期轴和股票代码轴的crc32，用来判断依赖这两条轴的字段是否过期
+        """
+        return zlib.crc32(json.dumps([self.manifest['dates'], self.manifest['codes']]).encode())
+
+    def write(self, name, array, dump_manifest=True):
+        """
+        :param name: 字段名
+        :param array: 矩阵，第一维是日期
+        :param dump_manifest: 是否立即写入manifest，批量写入时可以最后统一写
+        """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        array = np.ascontiguousarray(array)
+        np.save('{}/{}.npy'.format(self.path, name), array)
+        self.manifest['fields'][name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+        if dump_manifest:
+            self.dump_manifest()
+
+    def create(self, name, shape, dtype='float64', fill_value=0, dump_manifest=True):
+        """
+        :param name: 字段名
+        :param shape: 矩阵形状，第一维是日期
+        :param dtype: 数据类型
+        :param fill_value: 初始值
+        :param dump_manifest: 是否立即写入manifest
+        :return: 可写的memmap，逐行写入后需要flush
+        """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        array = np.lib.format.open_memmap('{}/{}.npy'.format(self.path, name), mode='w+', dtype=dtype,
+                                          shape=tuple(shape))
+        if fill_value != 0:
+            array[:] = fill_value
+        self.manifest['fields'][name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+        if dump_manifest:
+            self.dump_manifest()
+        return array
+
+    def write_dic(self, data_dic, prefix=''):
+        """
+        :param data_dic: 字段名到矩阵的字典
+        :param prefix: 字段名前缀，例如行业字典用industry_
+        """
+        for name, array in data_dic.items():
+            self.write(prefix + name, array, dump_manifest=False)
+        self.dump_manifest()
+
+    def append(self, name, rows, start=None, fill_value=0, dump_manifest=True):
+        """
+        :param name: 字段名
+        :param rows: 需要追加的行，除第一维外其余维度不能比原数据小
+        :param start: 从第几行开始写入，之后的旧数据被覆盖，默认接在末尾
+        :param fill_value: 股票数增加时，旧数据中新增列的填充值
+        :param dump_manifest: 是否立即写入manifest
+        注意调用前需要释放该字段的memmap，否则截断或替换文件可能失败
+        """
+        file = '{}/{}.npy'.format(self.path, name)
+        old_shape = tuple(self.manifest['fields'][name]['shape'])
+        dtype = np.dtype(self.manifest['fields'][name]['dtype'])
+        if start is None:
+            start = old_shape[0]
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        new_shape = (start + len(rows),) + rows.shape[1:]
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': new_shape}
+
+        done = False
+        if rows.shape[1:] == old_shape[1:] and start <= old_shape[0]:  # 列数不变，改写头部并在尾部写入即可
+            with open(file, 'r+b') as f:
+                if np.lib.format.read_magic(f) == (1, 0):
+                    np.lib.format.read_array_header_1_0(f)
+                    offset = f.tell()
+                    buffer = io.BytesIO()
+                    np.lib.format.write_array_header_1_0(buffer, header)
+                    if buffer.tell() == offset:  # 新头部长度一致才能原地改写
+                        f.seek(0)
+                        f.write(buffer.getvalue())
+                        f.seek(offset + start * int(np.prod(old_shape[1:])) * dtype.itemsize)
+                        f.write(rows.tobytes())
+                        f.truncate()
+                        done = True
+        if not done:  # 股票数增加，需要整体重写，旧数据通过memmap拷贝
+            old = np.load(file, mmap_mode='r')
+            new = np.lib.format.open_memmap(file + '.tmp', mode='w+', dtype=dtype, shape=new_shape)
+            new[:] = fill_value
+            n = min(start, old_shape[0])
+            new[(slice(0, n),) + tuple(slice(0, s) for s in old_shape[1:])] = old[:n]
+            new[start:] = rows
+            new.flush()
+            del old, new
+            os.replace(file + '.tmp', file)
+        self.manifest['fields'][name] = {'dtype': str(dtype), 'shape': list(new_shape)}
+        if dump_manifest:
+            self.dump_manifest()
+
+    def load(self, name, mmap_mode='c'):
+        """
+        :param name: 字段名
+        :param mmap_mode: None表示直接读入内存，否则按照np.load的模式映射
+        :return: 矩阵
+        """
+        return np.load('{}/{}.npy'.format(self.path, name), mmap_mode=mmap_mode)
+
+    def data_dic(self, names=None, prefix='', mmap_mode='c', dtype=None):
+        """
+        :param names: 需要的字段，默认是manifest中所有带prefix的字段
+        :param prefix: 字段名前缀，返回的字典中会去掉前缀
+        :param mmap_mode: 映射模式
+        :param dtype: 二维浮点矩阵的精度，与文件不一致时在第一次访问时转换
+        :return: 懒加载的字典
+        """
+        if names is None:
+            names = [name[len(prefix):] for name in self.manifest['fields'] if name.startswith(prefix)]
+        return LazyDataDic(_PrefixedStore(self, prefix), names, mmap_mode=mmap_mode, dtype=dtype)
+
+    def dump_manifest(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        with open('{}/manifest.json'.format(self.path), 'w') as f:
+            json.dump(self.manifest, f)
+
+
+class _PrefixedStore:  # 给LazyDataDic使用，字段名统一加上前缀
+    def __init__(self, store, prefix):
+        self.store = store
+        self.prefix = prefix
+
+    def load(self, name, mmap_mode='c'):
+        return self.store.load(self.prefix + name, mmap_mode=mmap_mode)
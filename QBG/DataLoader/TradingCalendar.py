@@ -0,0 +1,116 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的TradingCalendar类存储排好序的交易日
+This code defines the TradingCalendar class, which stores the sorted trading days
+
+交易日从聚宽的get_all_trade_days获取一次后缓存在本地，之后查询时直接读取缓存，不需要再通过空的查询结果判断是否是交易日
+Data类也持有一个TradingCalendar，其交易日就是矩阵的每一行，因此查到的下标就是矩阵的行号
+
+开发日志：
+2026-10-18
+-- 新增：TradingCalendar类，支持本地缓存，按区间获取交易日
+-- 新增：next_index和prev_index方法，用searchsorted查找某个日期之后或之前最近的交易日，支持一次查询多个日期
+-- 修复：next_date和prev_date超出交易日范围时报ValueError，prev_date不再返回最后一个交易日
+"""
+
+import numpy as np
+import os
+import pickle
+import datetime
+
+
+class TradingCalendar:
+    def __init__(self, dates):
+        """
+        :param dates: 交易日列表，可以是datetime.date，np.datetime64或者形如2021-01-01的字符串
+        """
+        self.dates = np.unique(self.to_datetime64(dates))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @staticmethod
+    def to_datetime64(dates):
+        """
+        :param dates: 一个日期或者日期列表，可以是datetime.date，np.datetime64或者形如2021-01-01的字符串
+        :return: datetime64[D]类型的标量或数组
+        """
+        def parse(d):
+            if isinstance(d, str):  # 兼容2021-1-4这种不补零的写法
+                tmp = d.split(' ')[0].split('-')
+                d = datetime.date(int(tmp[0]), int(tmp[1]), int(tmp[2]))
+            return np.datetime64(d, 'D')
+
+        if isinstance(dates, (str, datetime.date, np.datetime64)):
+            return parse(dates)
+        dates = np.asarray(dates)
+        if dates.dtype.kind == 'M':
+            return dates.astype('datetime64[D]')
+        return np.array([parse(d) for d in dates.ravel()], dtype='datetime64[D]').reshape(dates.shape)
+
+    def next_index(self, dates):
+        """
+        :param dates: 一个日期或者日期数组
+        :return: 当天或之后最近的交易日的下标，超出最后一个交易日时等于len(self)
+        """
+        return np.searchsorted(self.dates, self.to_datetime64(dates), side='left')
+
+    def prev_index(self, dates):
+        """
+        :param dates: 一个日期或者日期数组
+        :return: 当天或之前最近的交易日的下标，早于第一个交易日时等于-1
+        """
+        return np.searchsorted(self.dates, self.to_datetime64(dates), side='right') - 1
+
+    def next_date(self, date):
+        """
+        :param date: 任意日期
+        :return: 当天或之后最近的交易日，datetime.date；晚于最后一个交易日时报错
+        """
+        index = int(self.next_index(date))
+        if index >= len(self.dates):
+            raise ValueError('{} is after the last trading day {}'.format(date, self.last_date()))
+        return self.dates[index].astype(datetime.date)
+
+    def prev_date(self, date):
+        """
+        :param date: 任意日期
+        :return: 当天或之前最近的交易日，datetime.date；早于第一个交易日时报错
+        """
+        index = int(self.prev_index(date))
+        if index < 0:
+            raise ValueError('{} is before the first trading day {}'.format(
+                date, self.dates[0].astype(datetime.date) if len(self.dates) > 0 else None))
+        return self.dates[index].astype(datetime.date)
+
+    def between(self, start_date, end_date):
+        """
+        :param start_date: 开始日期，包含
+        :param end_date: 结束日期，包含
+        :return: 区间内的交易日，datetime.date的列表
+        """
+        s = self.next_index(start_date)
+        e = self.prev_index(end_date) + 1
+        return [d.astype(datetime.date) for d in self.dates[s:e]]
+
+    def last_date(self):
+        return self.dates[-1].astype(datetime.date) if len(self.dates) > 0 else None
+
+    def dump(self, path):
+        """
+        :param path: 缓存文件路径
+        """
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump([d.astype(datetime.date) for d in self.dates], f)
+
+    @staticmethod
+    def load(path):
+        """
+        :param path: 缓存文件路径
+        :return: TradingCalendar实例
+        """
+        with open(path, 'rb') as f:
+            return TradingCalendar(pickle.load(f))
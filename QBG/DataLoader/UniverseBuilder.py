@@ -0,0 +1,120 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义的UniverseBuilder类用于生成top矩阵，也就是每个交易日可以进入截面的股票
+This code defines the UniverseBuilder class, which builds the top matrix of tradable stocks on each day
+
+所有约束都是对整个矩阵做的向量化运算，约束按加入的顺序依次作用在上一步的top上，例如先做价格和上市时间的筛选，
+再在剩下的股票中选出成交量最大的1000只
+
+开发日志：
+2026-10-18
+-- 新增：UniverseBuilder类以及PriceBand，ListingAge，Liquidity，IndexMembership四种约束
+"""
+
+import numpy as np
+
+
+class PriceBand:
+    def __init__(self, low=10, high=100, field='close'):
+        """
+        :param low: 价格下限，不含
+        :param high: 价格上限，不含
+        :param field: 使用的价格字段
+        """
+        self.low = low
+        self.high = high
+        self.field = field
+
+    def __call__(self, data_dic, top, start=0):
+        price = data_dic[self.field][start:]
+        return top & (price > self.low) & (price < self.high)
+
+
+class ListingAge:
+    def __init__(self, days=50, field='close'):
+        """
+        :param days: 至少上市多少个交易日
+        :param field: 用于判断是否已上市的字段，取值为nan或0表示尚未上市
+        """
+        self.days = days
+        self.field = field
+
+    def __call__(self, data_dic, top, start=0):
+        value = data_dic[self.field]
+        ref = np.maximum(np.arange(start, len(value)) - self.days, 0)  # days天之前的行，不足days天的用第0行
+        ref_value = value[ref]
+        return top & ~(np.isnan(ref_value) | (ref_value == 0))
+
+
+class Liquidity:
+    def __init__(self, n=1000, field='volume'):
+        """
+        :param n: 每天保留多少只股票
+        :param field: 排序使用的字段，默认成交量
+        """
+        self.n = n
+        self.field = field
+
+    def __call__(self, data_dic, top, start=0):
+        if self.n >= top.shape[1]:
+            return top
+        value = np.where(top, data_dic[self.field][start:], -np.inf)
+        a = np.argpartition(value, top.shape[1] - self.n, axis=1)[:, -self.n:]  # 每一行最大的n个
+        mask = np.zeros(top.shape, dtype=bool)
+        mask[np.arange(len(top))[:, None], a] = True
+        return top & mask
+
+
+class IndexMembership:
+    def __init__(self, members):
+        """
+        :param members: 成分股矩阵，形状和top一致，或者是长度为股票数的布尔向量
+        """
+        self.members = np.asarray(members, dtype=bool)
+
+    def __call__(self, data_dic, top, start=0):
+        if self.members.ndim == 1:
+            return top & self.members
+        return top & self.members[start:start + len(top)]
+
+
+class UniverseBuilder:
+    def __init__(self, constraints=None):
+        """
+        :param constraints: 约束列表，每个约束接收(data_dic, top, start)并返回新的top
+        """
+        if constraints is None:
+            constraints = []
+        self.constraints = list(constraints)
+
+    @staticmethod
+    def default(top_constraint='volume'):
+        """
+        :param top_constraint: 流动性筛选方式，volume表示成交量前1000
+        :return: 和原先get_matrix_data一致的UniverseBuilder
+        """
+        builder = UniverseBuilder([PriceBand(10, 100), ListingAge(50)])
+        if top_constraint == 'volume':
+            builder.add(Liquidity(1000, 'volume'))
+        return builder
+
+    def add(self, constraint):
+        """
+        :param constraint: 新增的约束
+        :return: 返回自身，方便链式调用
+        """
+        self.constraints.append(constraint)
+        return self
+
+    def build(self, data_dic, start=0):
+        """
+        :param data_dic: 数据字典，至少包含约束用到的字段
+        :param start: 从第几行开始计算，增量更新时只需要计算尾部
+        :return: 第start行之后的top矩阵
+        """
+        shape = data_dic['close'].shape
+        top = np.ones((shape[0] - start, shape[1]), dtype=bool)
+        for constraint in self.constraints:
+            top = constraint(data_dic, top, start)
+        return top
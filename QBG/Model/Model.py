@@ -8,6 +8,8 @@ Model是若干个定义了多种标准化以及结构化的模型框架，可以
 -- 新增：使用网格搜索方法对因子搜索系数，以优化指定区间内得分最高的n个股票的平均收益
 2021-09-11
 -- 新增：lightgbm方法，以及Lasso和lightgbm做boosting
+2026-10-18
+-- 更新：MyLinearModel.fit每次用AutoTester.test_many统计一批系数组合的信号
 """
 import sys
 from sklearn import linear_model
@@ -41,12 +43,13 @@ class MyLinearModel:
                     r.append(k)
             return r
 
-    def fit(self, signals_dic, ret, top, n=5):
+    def fit(self, signals_dic, ret, top, n=5, batch_size=16):
         """
         :param signals_dic: 信号字典
         :param ret: 收益率矩阵
         :param top: 股票池
         :param n: 优化的平均收益
+        :param batch_size: 每次一起统计的系数组合个数
         :return: 直接优化系数
         """
         num = len(signals_dic)
@@ -54,16 +57,17 @@ class MyLinearModel:
         opt_coef = np.zeros(num)
         coefs = self.gen_all_coef(num)
         count = 0
-        for coef in coefs:
-            count += 1
-            if count % 100 == 0:
-                print('{} epochs done'.format(count))
-            signal = np.sum([coef[i] * signals_dic[i] for i in range(num)], axis=0)
-            stats = self.tester.test(signal, ret, top)
-            if np.mean(stats.top_n_ret[5]) > opt_ret:
-                print('now the opt_ret is {:.4f}'.format(np.mean(stats.top_n_ret[5])*100))
-                opt_ret = np.mean(stats.top_n_ret[5])
-                opt_coef = np.array(coef)
+        for b in range(0, len(coefs), batch_size):
+            batch = coefs[b:b + batch_size]
+            signals = np.array([np.sum([coef[i] * signals_dic[i] for i in range(num)], axis=0) for coef in batch])
+            for coef, stats in zip(batch, self.tester.test_many(signals, ret, top)):
+                count += 1
+                if count % 100 == 0:
+                    print('{} epochs done'.format(count))
+                if np.mean(stats.top_n_ret[5]) > opt_ret:
+                    print('now the opt_ret is {:.4f}'.format(np.mean(stats.top_n_ret[5])*100))
+                    opt_ret = np.mean(stats.top_n_ret[5])
+                    opt_coef = np.array(coef)
         self.coef_ = opt_coef
 
 
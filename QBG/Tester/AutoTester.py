@@ -10,10 +10,21 @@ This code is used for calculating the average IC and other statistical values of
 
 2021-09-08
 -- 新增：统计信号排名最高的1个，5个，10个股票的平均收益，以评估信号的纯多头表现
+
+2026-10-18
+-- 更新：test改用StatsKernels.signal_stats，所有交易日并行计算，不再逐日调用np.corrcoef和argsort
+-- 新增：Rank IC，Stats新增rank_ICs和mean_rank_IC
+-- 新增：test_many，一次统计K个信号
+-- 说明：top_n_ret在信号值并列时按列序号靠后的股票排在前面，原先argsort的顺序不确定
+-- 新增：forward_returns和test_decay，从close，open等矩阵一次生成多个持有期的收益率，一次计算IC和Rank IC的衰减
+-- 更新：cal_bin_ret改为每一行lexsort之后按位置直接得到组号，不再逐日构造元组列表排序；新增bin_ret，用bincount返回每天每组的均值矩阵
+-- 更新：sort_bins的组边界用整数n * pos // cell计算，用searchsorted得到组号
 """
 
 import numpy as np
 
+from StatsKernels import signal_stats, horizon_ics
+
 
 class Stats:
     def __init__(self):
@@ -23,6 +34,18 @@ class Stats:
         self.IC_IR = 0
         self.positive_IC_rate = 0
         self.top_n_ret = {1: [], 5: [], 10: []}  # 存储多头平均收益
+        self.rank_ICs = []
+        self.mean_rank_IC = 0
+
+
+class DecayStats:
+    def __init__(self):
+        self.horizons = []
+        self.ICs = []  # 形状为(H, T)，收益率超出数据范围的交易日为nan
+        self.rank_ICs = []
+        self.mean_IC = []  # 每个持有期的平均IC，即IC衰减曲线
+        self.mean_rank_IC = []
+        self.IC_IR = []
 
 
 class AutoTester:
@@ -40,72 +63,175 @@ class AutoTester:
         signal[np.isnan(signal)] = 0
         if top is None:
             top = signal != 0
-        ics = []
-        auto_corr = []
-        top_1 = []
-        top_5 = []
-        top_10 = []
         assert len(signal) == len(ret)
         assert len(signal) == len(top)
-        for i in range(len(signal)):
-            ics.append(np.corrcoef(signal[i, top[i]], ret[i, top[i]])[0, 1])
-            arg = signal[i, top[i]].argsort()
-            top_1.append(np.mean(ret[i, top[i]][arg[-1:]]))
-            top_5.append(np.mean(ret[i, top[i]][arg[-5:]]))
-            top_10.append(np.mean(ret[i, top[i]][arg[-10:]]))
-            if i >= 1:
-                auto_corr.append(
-                    np.corrcoef(signal[i, top[i] & top[i - 1]], signal[i - 1, top[i] & top[i - 1]])[0, 1])
-
-        ics = np.array(ics)
+        return AutoTester.test_many(signal[None], ret, top)[0]
+
+    @staticmethod
+    def test_many(signals, ret, top=None, ks=(1, 5, 10)):
+        """
+        :param signals: 形状为(K, T, N)的信号，或者K个信号矩阵的列表
+        :param ret: 和每个信号矩阵形状一致的收益率矩阵
+        :param top: 所有信号共用的股票池，None表示每个信号各自取非0的位置
+        :param ks: 需要统计平均收益的排名最高的股票个数
+        :return: 与signals顺序一致的Stats实例列表，信号中的nan按0处理，不修改传入的信号；
+                 top_n_ret按稳定排序取排名最高的股票，信号值相同时列序号靠后的股票排在前面，
+                 原先argsort对并列值（例如top内多个nan替换为0）的顺序不确定，第k名有并列时平均收益可能与原先不同
+        """
+        signals = np.asarray(signals)
+        assert signals.shape[1:] == ret.shape
+        if top is None:
+            top = (signals != 0) & ~np.isnan(signals)
+        else:
+            assert top.shape == ret.shape
+            top = np.broadcast_to(top, signals.shape)
+        ks = np.asarray(ks, dtype=np.int64)
+        ics, rank_ics, auto, top_ret = signal_stats(signals, ret, top, ks)
         ics[np.isnan(ics)] = 0
-        auto_corr = np.array(auto_corr)
-        auto_corr[np.isnan(auto_corr)] = 0
+        rank_ics[np.isnan(rank_ics)] = 0
+        auto[np.isnan(auto)] = 0
 
-        stats = Stats()
+        results = []
+        for k in range(len(signals)):
+            stats = Stats()
+            stats.ICs = ics[k]
+            stats.mean_IC = np.mean(ics[k])
+            stats.auto_corr = np.mean(auto[k])
+            stats.rank_ICs = rank_ics[k]
+            stats.mean_rank_IC = np.mean(rank_ics[k])
+            stats.top_n_ret = {int(n): top_ret[k, t] for t, n in enumerate(ks)}
+
+            if len(ics[k]) > 1:
+                stats.IC_IR = np.mean(ics[k]) / np.std(ics[k])
+            stats.positive_IC_rate = np.sum(ics[k] > 0) / len(ics[k])
+            results.append(stats)
+        return results
+
+    @staticmethod
+    def forward_returns(data_dic, horizons=(1, 2, 5, 10), return_type='close_close'):
+        """
+        :param data_dic: 原始数据的字典，需要包含return_type中的两个字段
+        :param horizons: 持有期列表
+        :param return_type: 买入和卖出使用的价格，例如close_close，open_close，与DataLoader.cal_ret的前两段一致
+        :return: 形状为(H, T, N)的收益率，第h个持有期与return_type_h的ret一致，缺失的价格对应的收益率为0，
+                 最后h行超出数据范围，为nan
+        """
+        start_name, end_name = return_type.split('_')[:2]
+        buy = data_dic[start_name]
+        sell = data_dic[end_name]
+        days = len(buy)
+        rets = np.full((len(horizons),) + buy.shape, np.nan)
+        for k, h in enumerate(horizons):
+            if h >= days:
+                continue
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.divide(sell[h:], buy[:days - h], out=rets[k, :days - h])
+            rets[k, :days - h] -= 1
+            rets[k, :days - h][np.isnan(rets[k, :days - h])] = 0
+        return rets
+
+    @staticmethod
+    def test_decay(signal, rets, top=None, horizons=None):
+        """
+        :param signal: 信号矩阵
+        :param rets: 形状为(H, T, N)的收益率，例如forward_returns的结果，同一个时间维度已经做了delay
+        :param top: 每个时间截面上进入截面的股票位置
+        :param horizons: rets对应的持有期，只用于记录
+        :return: 返回DecayStats类的实例，每个持有期只统计收益率在数据范围内的交易日
+        """
+        assert rets.shape[1:] == signal.shape
+        if top is None:
+            top = (signal != 0) & ~np.isnan(signal)
+        assert top.shape == signal.shape
+        ics, rank_ics = horizon_ics(signal, rets, top)
+        valid = ~np.all(np.isnan(rets), axis=2)
+        for a in (ics, rank_ics):
+            a[np.isnan(a) & valid] = 0
+
+        stats = DecayStats()
+        stats.horizons = list(horizons) if horizons is not None else list(range(1, len(rets) + 1))
         stats.ICs = ics
-        stats.mean_IC = np.mean(ics)
-        stats.auto_corr = np.mean(auto_corr)
-        stats.top_n_ret[1] = top_1
-        stats.top_n_ret[5] = top_5
-        stats.top_n_ret[10] = top_10
-
-        if len(ics) > 1:
-            stats.IC_IR = np.mean(ics) / np.std(ics)
-        stats.positive_IC_rate = np.sum(ics > 0) / len(ics)
+        stats.rank_ICs = rank_ics
+        stats.mean_IC = np.zeros(len(rets))
+        stats.mean_rank_IC = np.zeros(len(rets))
+        stats.IC_IR = np.zeros(len(rets))
+        for k in range(len(rets)):
+            if np.sum(valid[k]) == 0:
+                continue
+            stats.mean_IC[k] = np.mean(ics[k, valid[k]])
+            stats.mean_rank_IC[k] = np.mean(rank_ics[k, valid[k]])
+            if np.sum(valid[k]) > 1:
+                stats.IC_IR[k] = stats.mean_IC[k] / np.std(ics[k, valid[k]])
         return stats
 
+    @staticmethod
+    def sort_bins(signal, ret, top=None, cell=20):
+        """
+        :param signal: 信号矩阵，nan按0处理，不修改传入的信号
+        :param ret: 和信号矩阵形状一致的收益率矩阵
+        :param top: 每个时间截面上进入截面的股票位置
+        :param cell: 分组数
+        :return: 每一行按(标准化信号, 收益率)排序之后的标准化信号，去均值的收益率和组号，形状都是(T, N)，
+                 每一行排在top内股票个数之后的位置组号为-1
+        """
+        signal = np.where(np.isnan(signal), 0, signal)
+        if top is None:
+            top = signal != 0
+        n = np.sum(top, axis=1)
+        cnt = np.maximum(n, 1)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = signal - np.sum(np.where(top, signal, 0), axis=1, keepdims=True) / cnt
+            r = np.where(np.isnan(ret), 0, ret)
+            r = r - np.sum(np.where(top, r, 0), axis=1, keepdims=True) / cnt
+            d = z - np.sum(np.where(top, z, 0), axis=1, keepdims=True) / cnt
+            z = z / np.sqrt(np.sum(np.where(top, d * d, 0), axis=1, keepdims=True) / cnt)
+        z[np.isnan(z)] = 0
+        z[~top] = np.inf  # 排在每一行的最后
+        order = np.lexsort((r, z), axis=1)
+        z = np.take_along_axis(z, order, axis=1)
+        r = np.take_along_axis(r, order, axis=1)
+
+        # 第pos组是每一行排序后[n * pos // cell, n * (pos + 1) // cell)的位置，用整数计算，没有浮点误差
+        days, width = signal.shape
+        offset = np.arange(days)[:, None] * (width + 1)  # 每一行的边界都在[0, width]内，加上偏移后整体有序
+        bounds = (np.arange(cell + 1)[None, :] * n[:, None]) // cell + offset
+        j = np.arange(width)[None, :]
+        labels = np.searchsorted(bounds.ravel(), (j + offset).ravel(), side='right').reshape(days, width) - 1
+        labels -= np.arange(days)[:, None] * (cell + 1)
+        labels[j >= n[:, None]] = -1
+        return z, r, labels
+
+    @staticmethod
+    def bin_ret(signal, ret, top=None, cell=20):
+        """
+        :param signal: 信号矩阵，nan按0处理，不修改传入的信号
+        :param ret: 和信号矩阵形状一致的收益率矩阵
+        :param top: 每个时间截面上进入截面的股票位置
+        :param cell: 分组数，按标准化之后的信号从小到大分组
+        :return: 形状都是(T, cell)的每组平均标准化信号，平均去均值收益率和股票个数，没有股票的组为nan
+        """
+        z, r, labels = AutoTester.sort_bins(signal, ret, top, cell)
+        valid = labels >= 0
+        days = len(labels)
+        idx = (np.arange(days)[:, None] * cell + labels)[valid]
+        count = np.bincount(idx, minlength=days * cell).reshape(days, cell)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_z = np.bincount(idx, weights=z[valid], minlength=days * cell).reshape(days, cell) / count
+            mean_r = np.bincount(idx, weights=r[valid], minlength=days * cell).reshape(days, cell) / count
+        return mean_z, mean_r, count
+
     @staticmethod
     def cal_bin_ret(signal, ret, top=None, cell=20):
+        """
+        :param signal: 信号矩阵，nan会被原地替换为0
+        :param ret: 和信号矩阵形状一致的收益率矩阵
+        :param top: 每个时间截面上进入截面的股票位置
+        :param cell: 分组数
+        :return: 每组所有交易日的标准化信号列表和去均值收益率列表，按交易日和组内排序的顺序排列；
+                 只需要每天每组的均值时用bin_ret，返回矩阵
+        """
         signal[np.isnan(signal)] = 0
         if top is None:
             top = signal != 0
-        z = [[] for i in range(cell)]
-        r = [[] for i in range(cell)]
-
-        for i in range(len(signal)):
-            tmp = signal[i].copy()
-            tmp[top[i]] -= np.mean(tmp[top[i]])
-            tmp_ret = ret[i].copy()
-            tmp_ret[np.isnan(tmp_ret)] = 0
-            tmp_ret[top[i]] -= np.mean(tmp_ret[top[i]])
-            tmp[top[i]] /= np.std(tmp[top[i]])
-            tmp[np.isnan(tmp)] = 0
-            # 放入分组
-            signal_ret = []
-            for j in range(len(tmp[top[i]])):
-                signal_ret.append((tmp[top[i]][j], tmp_ret[top[i]][j]))
-            signal_ret = sorted(signal_ret)
-            pos = 0
-
-            while pos < cell:
-                if pos < cell - 1:
-                    for j in range(int(len(signal_ret) / cell * pos), int(len(signal_ret) / cell * (pos + 1))):
-                        z[pos].append(signal_ret[j][0])
-                        r[pos].append(signal_ret[j][1])
-                else:
-                    for j in range(int(len(signal_ret) / cell * pos), len(signal_ret)):
-                        z[pos].append(signal_ret[j][0])
-                        r[pos].append(signal_ret[j][1])
-                pos += 1
-        return z, r
+        z, r, labels = AutoTester.sort_bins(signal, ret, top, cell)
+        return [z[labels == pos].tolist() for pos in range(cell)], [r[labels == pos].tolist() for pos in range(cell)]
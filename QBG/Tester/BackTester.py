@@ -12,10 +12,20 @@ BackTester类根据传入信号以及交易逻辑进行交易
 
 2021-09-21
 -- 修复：回测是要根据上一期的持仓确定涨停板是否剔除，有可能涨停的股票是有持仓的
+
+2026-10-18
+-- 更新：long_short，long，long_top_n改为调用PortfolioSimulator，整个回测区间一次生成权重矩阵，每天的pnl是权重和收益率逐行的内积
+-- 修复：long_top_n在n为0时使用传入的signal，不再总是使用self.signal
+-- 修复：long_top_n第一天剔除涨停时记录的是剔除前的权重；统计上一期已持有的涨停股票数时使用排名最高的n只股票
+-- 更新：涨停过滤改用布尔矩阵记录上一期的持仓，整个回测区间的涨停和停牌位置一次算出，不再对每只股票判断是否在上一期的持仓中
+-- 更新：涨停过滤时上一期的持仓遇到跌停或停牌不能卖出，保持上一期的权重；新增dt_filter参数；dt_filter和suspend_filter默认关闭，默认结果与原先一致
 """
 import numpy as np
 import datetime
 
+from PortfolioSimulator import long_short_weights, long_weights, top_n_mask, normalize, portfolio_ret, market_ret, \
+    buy_blocked, sell_blocked, hold_filter
+
 
 class BackTester:
     def __init__(self, data, signal=None):
@@ -60,231 +70,161 @@ class BackTester:
         self.max_dd = max_dd
         self.max_loss_time = max_loss_time
 
-    def long_short(self, start_date=None, end_date=None, signal=None, n=0):  # 多空策略
-        """
-        :param signal: 可传入自定义信号
-        :param start_date: 开始日期
-        :param end_date: 结束日期
-        :param n: 进入股票数量，0表示使用top
-        :return:
-        """
+    def reset_pnl(self):
         self.pnl = []
         self.cumulated_pnl = []
         self.market_pnl = []
         self.market_cumulated_pnl = []
 
+    def get_panels(self, start_date, end_date, signal):
+        """
+        :param start_date: 开始日期，默认是Data的开始日期
+        :param end_date: 结束日期，默认是Data的结束日期
+        :param signal: 信号矩阵
+        :return: 回测区间开始的位置，以及回测区间内的信号，top和delay之后的收益率
+        """
         if start_date is None:
             start_date = str(self.data.start_date)
         if end_date is None:
             end_date = str(self.data.end_date)
-
         start, end = self.data.get_real_date(start_date, end_date)
+        return start, signal[start:end + 1], self.data.top[start:end + 1], self.data.ret[start + 1:end + 2]
+
+    def set_pnl(self, pnl, market=None):
+        """
+        :param pnl: 每天的pnl
+        :param market: 每天的市场收益，需要记录市场的累计pnl时传入
+        """
+        self.pnl = pnl.tolist()
+        self.cumulated_pnl = np.cumsum(pnl).tolist()
+        if market is not None:
+            self.market_cumulated_pnl = np.cumsum(market).tolist()
+
+    def filter_zt(self, weights, rows, suspend_filter=False, dt_filter=False):
+        """
+        :param weights: 每天的目标权重，直接在这个矩阵上修改
+        :param rows: weights每一行对应的交易日位置，用当天的收益率判断涨停和跌停
+        :param suspend_filter: 是否考虑停牌，停牌的股票不能买入也不能卖出，data_dic中没有volume时不考虑
+        :param dt_filter: 是否考虑跌停，上一期的持仓跌停时不能卖出
+        :return: hold_filter的结果，即被剔除的位置，当天涨停但上一期已经持有的位置，以及不能卖出而保持上一期权重的位置
+        """
+        if len(rows) == 0:
+            return hold_filter(weights, np.zeros(weights.shape, dtype=bool))
+        first, last = rows[0], rows[-1] + 1  # 用切片而不是下标取出矩阵，避免复制整个回测区间的收益率
+        ret = self.data.ret[first:last]
+        volume = None
+        if suspend_filter and 'volume' in self.data.data_dic:
+            volume = self.data.data_dic['volume'][first + 1:last + 1]
+        buy = buy_blocked(ret, volume)[rows - first]  # 整个回测区间的掩码在进入逐日循环之前一次算出
+        sell = None
+        if dt_filter or volume is not None:
+            sell = sell_blocked(ret if dt_filter else np.zeros(ret.shape), volume)[rows - first]
+        return hold_filter(weights, buy, sell)
+
+    def long_short(self, start_date=None, end_date=None, signal=None, n=0):  # 多空策略
+        """
+        :param signal: 可传入自定义信号
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param n: 进入股票数量，0表示使用top
+        :return:
+        """
+        self.reset_pnl()
         if signal is None:
             signal = self.signal
+        start, signal, top, ret = self.get_panels(start_date, end_date, signal)
 
         if n != 0:  # 暂时不管
             return
-        else:
-            for i in range(start, end + 1):
-                tmp = signal[i].copy()
-                tmp[self.data.top[i]] -= np.mean(tmp[self.data.top[i]])
-                tmp[self.data.top[i] & (tmp > 0)] /= np.sum(tmp[self.data.top[i] & (tmp > 0)])
-                tmp[self.data.top[i] & (tmp < 0)] /= -np.sum(tmp[self.data.top[i] & (tmp < 0)])
-                self.pnl.append(np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1, self.data.top[i]]) / 2)
-                if not self.cumulated_pnl:
-                    self.cumulated_pnl.append(np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1,
-                                                                                           self.data.top[i]]) / 2)
-                else:
-                    self.cumulated_pnl.append(
-                        self.cumulated_pnl[-1] + np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1,
-                                                                                              self.data.top[i]]) / 2)
+        self.set_pnl(portfolio_ret(long_short_weights(signal, top), ret) / 2)
         self.cal_stats()
 
     def long(self, start_date=None, end_date=None, n=0, signal=None, zt_filter=False,
-             position_mode='weighted'):  # 多头策略
+             position_mode='weighted', suspend_filter=False, dt_filter=False):  # 多头策略
         """
         :param start_date: 开始日期
         :param end_date: 结束日期
         :param n: 进入股票数量，0表示使用top
         :param signal: 可以传入一个自定义的signal，默认使用自身的signal
-        :param zt_filter: 是否过滤涨停
+        :param zt_filter: 是否过滤涨停，剔除的股票的权重不再分配给其他股票
         :param position_mode: 仓位配置模式
+        :param suspend_filter: 过滤涨停时是否同时考虑停牌，停牌的股票不能买入，已经持有的不能卖出，默认不考虑
+        :param dt_filter: 过滤涨停时是否同时考虑跌停，已经持有的跌停股票不能卖出，默认不考虑
         :return:
         """
-        self.pnl = []
-        self.cumulated_pnl = []
-        self.market_pnl = []
-        self.market_cumulated_pnl = []
-
-        if start_date is None:
-            start_date = str(self.data.start_date)
-        if end_date is None:
-            end_date = str(self.data.end_date)
-
-        start, end = self.data.get_real_date(start_date, end_date)
-
+        self.reset_pnl()
         if signal is None:
-            signal = self.signal.copy()
+            signal = self.signal
+        start, signal, top, ret = self.get_panels(start_date, end_date, signal)
 
-        pos = np.array([i for i in range(len(self.data.top[0]))])  # 记录位置
-        last_pos = None  # 记录上一次持仓的股票
         if n != 0:  # 暂时不管
             return
-        else:
-            for i in range(start, end + 1):
-                tmp = signal[i].copy()
-                tmp[self.data.top[i]] -= np.mean(tmp[self.data.top[i]])
-                tmp[self.data.top[i] & (tmp < 0)] = 0
-                tmp_ret = self.data.ret[i + 1, self.data.top[i] & (tmp > 0)].copy()
-                # tmp[self.data.top[i] & (self.data.ret[i] >= 0.099)] = 0  # 剔除涨停板
-                tmp[self.data.top[i] & (tmp > 0)] /= np.sum(tmp[self.data.top[i] & (tmp > 0)])
-                sig_tmp = tmp[self.data.top[i] & (tmp > 0)].copy()
-                this_pos = pos[self.data.top[i] & (tmp > 0)].copy()
-                if zt_filter:
-                    if last_pos is not None:
-                        for j in range(len(this_pos)):
-                            if (self.data.ret[i, self.data.top[i] & (tmp > 0)][j] > 0.099) and (this_pos[j]
-                                                                                                not in last_pos):
-                                sig_tmp[j] = 0
-                                this_pos[j] = -1
-
-
-                    else:
-                        for j in range(len(this_pos)):
-                            if self.data.ret[i, self.data.top[i] & (tmp > 0)][j] > 0.099:
-                                sig_tmp[j] = 0
-                                this_pos[j] = -1
-                last_pos = this_pos.copy()
-                self.pnl.append(np.sum(sig_tmp * tmp_ret) -
-                                np.mean(self.data.ret[i + 1, self.data.top[i]]))
-                if not self.cumulated_pnl:
-                    self.cumulated_pnl.append(np.sum(sig_tmp * tmp_ret) -
-                                              np.mean(self.data.ret[i + 1, self.data.top[i]]))
-                else:
-                    self.cumulated_pnl.append(
-                        self.cumulated_pnl[-1] + np.sum(sig_tmp * tmp_ret) -
-                        np.mean(self.data.ret[i + 1, self.data.top[i]]))
+        weights = long_weights(signal, top)
+        weights[~(weights > 0)] = 0  # 信号为nan的交易日不持仓
+        if zt_filter:
+            self.filter_zt(weights, start + np.arange(len(weights)), suspend_filter, dt_filter)
+        self.set_pnl(portfolio_ret(weights, ret) - market_ret(ret, top))
         self.cal_stats()
 
     def long_top_n(self, start_date=None, end_date=None, n=0, signal=None, zt_filter=True,
-                   position_mode='weighted'):  # 做多预测得分最高的n只股票
+                   position_mode='weighted', suspend_filter=False, dt_filter=False):  # 做多预测得分最高的n只股票
         """
         :param start_date: 开始日期
         :param end_date: 结束日期
         :param n: 做多多少只股票，默认按照top做多
         :param signal: 可以传入一个自定义的signal，默认使用自身的signal
         :param zt_filter: 是否过滤涨停
-        :param position_mode: 仓位配置模式
-        :return:
+        :param position_mode: 仓位配置模式，weighted按权重，mean等权
+        :param suspend_filter: 过滤涨停时是否同时考虑停牌，停牌的股票不能买入，已经持有的不能卖出，默认不考虑
+        :param dt_filter: 过滤涨停时是否同时考虑跌停，已经持有的跌停股票不能卖出，默认不考虑
+        :return: n不为0时返回每天涨停股票的收益和个数，否则返回记录
         """
-        self.pnl = []
-        self.cumulated_pnl = []
-        self.market_pnl = []
-        self.market_cumulated_pnl = []
+        self.reset_pnl()
 
         # 验证用功能：记录每一天具体的给出的股票代码和实际的收益率
         self.log = []
 
-        if start_date is None:
-            start_date = str(self.data.start_date)
-        if end_date is None:
-            end_date = str(self.data.end_date)
-
-        start, end = self.data.get_real_date(start_date, end_date)
         if signal is None:
-            signal = self.signal.copy()
+            signal = self.signal
+        start, signal, top, ret = self.get_panels(start_date, end_date, signal)
+        weights = long_weights(signal, top)
 
-        pos = np.array([i for i in range(len(self.data.top[0]))])  # 记录位置
-        last_pos = None  # 记录上一次持仓的股票
         if n != 0:
-            zt = []
-            in_zt = []
-            zt_ret = []
-            zt_w = []
-            for i in range(start, end + 1):
-                tmp = signal[i].copy()
-                tmp[self.data.top[i]] -= np.mean(tmp[self.data.top[i]])
-                tmp[self.data.top[i] & (tmp > 0)] /= np.sum(tmp[self.data.top[i] & (tmp > 0)])
-                tmp[self.data.top[i] & (tmp < 0)] = 0
-                if np.sum(tmp != 0) == 0:
-                    continue
-                a = tmp[self.data.top[i] & (tmp > 0)].argsort()[-n:]
-                this_pos = pos[self.data.top[i] & (tmp > 0)][a].copy()  # 本次持仓的股票
-                '''
-                try:
-                    print(len(list(set(this_pos) & set(last_pos))))
-                except TypeError:
-                    pass
-                '''
-                self.log.append((self.data.position_date_dic[i],
-                                 self.data.order_code_dic[pos[self.data.top[i] & (tmp > 0)][a][0]]))
-                ret_tmp = self.data.ret[i + 1, self.data.top[i] & (tmp > 0)][a].copy()
-                sig_tmp = tmp[self.data.top[i] & (tmp > 0)][a].copy()
-                sig_tmp /= np.sum(sig_tmp)
-                zt_weight = []
-                if zt_filter:
-                    in_z = 0
-                    if last_pos is not None:
-                        for j in range(n):
-                            if (self.data.ret[i, self.data.top[i] & (tmp > 0)][a][j] > 0.099) and (this_pos[j]
-                                                                                                   not in last_pos):
-                                zt_weight.append(sig_tmp[j])
-                                sig_tmp[j] = 0
-                                this_pos[j] = -1
-                            elif self.data.ret[i, self.data.top[i] & (tmp > 0)][j] > 0.099:
-                                in_z += 1
-
-                    else:
-                        for j in range(n):
-                            if self.data.ret[i, self.data.top[i] & (tmp > 0)][a][j] > 0.099:
-                                sig_tmp[j] = 0
-                                zt_weight.append(sig_tmp[j])
-                                this_pos[j] = -1
-
-                # sig_tmp /= np.sum(sig_tmp)
-                # print(np.sum(sig_tmp == 0))
-                    in_zt.append(in_z)
-                zt.append(np.sum(sig_tmp == 0))  # 统计涨停总数
-                if zt[-1] > 0:
-                    if position_mode == 'weighted':
-                        zt_ret.append(np.sum(np.array(zt_weight) * ret_tmp[sig_tmp == 0]))  # 统计涨停收益
-                    else:
-                        zt_ret.append(np.mean(ret_tmp[sig_tmp == 0]))  # * zt[-1] / n)
-                    zt_w.append(np.sum(zt_weight))  # 涨停权重占比
+            # top内的权重和top之外的原始信号全为0的交易日不交易
+            rows = np.nonzero(np.any(np.where(top, weights != 0, signal != 0), axis=1))[0]
+            weights, top, ret = weights[rows], top[rows], ret[rows]
+            selected = top_n_mask(weights, n)  # 本次持仓的股票
+            sig = normalize(weights, selected)
+            lowest = np.argmin(np.where(selected, weights, np.inf), axis=1)  # 得分最高的n只股票中得分最低的一只
+            for k in np.nonzero(np.any(selected, axis=1))[0]:
+                self.log.append((self.data.position_date_dic[start + rows[k]], self.data.order_code_dic[lowest[k]]))
+
+            target = sig.copy()
+            if zt_filter:  # 跌停或停牌不能卖出的上一期持仓保持原来的权重，即使不在本次选出的n只股票中
+                dropped, held_zt, _ = self.filter_zt(sig, start + rows, suspend_filter, dt_filter)
+                in_zt = np.sum(held_zt, axis=1)  # 上一期已经持有的涨停股票数
+            else:
+                dropped = np.zeros(selected.shape, dtype=bool)
+                in_zt = []
+            zt_weight = np.where(dropped, target, 0)
+            zt = np.sum(dropped, axis=1)  # 统计涨停总数
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if position_mode == 'weighted':
+                    zt_ret = portfolio_ret(zt_weight, ret)  # 统计涨停收益
                 else:
-                    zt_ret.append(0)
-                    zt_w.append(0)
-                last_pos = this_pos.copy()
+                    zt_ret = np.sum(np.where(dropped, ret, 0), axis=1) / zt
+                zt_ret[zt == 0] = 0
+                zt_w = np.sum(zt_weight, axis=1)  # 涨停权重占比
+
+                market = market_ret(ret, top)
                 if position_mode == 'mean':
-                    self.pnl.append(np.mean(ret_tmp[sig_tmp != 0]) -
-                                    np.mean(self.data.ret[i + 1, self.data.top[i]]))
+                    held = sig != 0
+                    pnl = np.sum(np.where(held, ret, 0), axis=1) / np.sum(held, axis=1) - market
                 else:
-                    self.pnl.append(np.sum(sig_tmp * ret_tmp) -
-                                    np.mean(self.data.ret[i + 1, self.data.top[i]]))  # 这是按照比例投资，只看纯超额
-                if not self.cumulated_pnl:
-                    """
-                    self.cumulated_pnl.append(np.sum(tmp[self.data.top[i] & (tmp > 0)][a] *
-                                                     self.data.ret[i + 1, self.data.top[i] & (tmp > 0)][a]) /
-                                              np.sum(tmp[self.data.top[i] & (tmp > 0)][a]))
-                                              """
-                    # self.cumulated_pnl.append(np.mean(ret_tmp[ret_tmp != 0]))
-                    self.cumulated_pnl.append(self.pnl[-1])  # 按照比例投资
-                    self.market_cumulated_pnl.append(np.mean(self.data.ret[i + 1, self.data.top[i]]))
-                else:
-                    """
-                    self.cumulated_pnl.append(np.sum(tmp[self.data.top[i] & (tmp > 0)][a] *
-                                                     self.data.ret[i + 1, self.data.top[i] & (tmp > 0)][a]) /
-                                              np.sum(tmp[self.data.top[i] & (tmp > 0)][a]))
-                                              """
-                    # self.cumulated_pnl.append(self.cumulated_pnl[-1] +
-                    # np.mean(ret_tmp[ret_tmp != 0]))
-                    self.cumulated_pnl.append(self.cumulated_pnl[-1] + self.pnl[-1])
-
-                    self.market_cumulated_pnl.append(self.market_cumulated_pnl[-1] +
-                                                     np.mean(self.data.ret[i + 1, self.data.top[i]]))
+                    pnl = portfolio_ret(sig, ret) - market  # 这是按照比例投资，只看纯超额
+            self.set_pnl(pnl, market)
+
             print(np.mean(zt))
-            zt_ret = np.array(zt_ret)
-            zt = np.array(zt)
             print(np.mean(zt_ret) * 100)
             print(np.mean(zt_w))
             print(np.mean(in_zt))
@@ -293,23 +233,9 @@ class BackTester:
             self.cal_stats()
             return zt_ret, zt
         else:
-            for i in range(start, end + 1):
-                tmp = self.signal[i].copy()
-                tmp[self.data.top[i]] -= np.mean(tmp[self.data.top[i]])
-                tmp[self.data.top[i] & (tmp > 0)] /= np.sum(tmp[self.data.top[i] & (tmp > 0)])
-                tmp[self.data.top[i] & (tmp < 0)] = 0
-                self.pnl.append(np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1, self.data.top[i]]))
-                self.market_pnl.append(np.mean(self.data.ret[i + 1, self.data.top[i]]))
-                if not self.cumulated_pnl:
-                    self.cumulated_pnl.append(np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1,
-                                                                                           self.data.top[i]]))
-                    self.market_cumulated_pnl.append(np.mean(self.data.ret[i + 1, self.data.top[i]]))
-                else:
-                    self.cumulated_pnl.append(
-                        self.cumulated_pnl[-1] + np.sum(tmp[self.data.top[i]] * self.data.ret[i + 1,
-                                                                                              self.data.top[i]]))
-                    self.market_cumulated_pnl.append(self.market_cumulated_pnl[-1] +
-                                                     np.mean(self.data.ret[i + 1, self.data.top[i]]))
+            market = market_ret(ret, top)
+            self.set_pnl(portfolio_ret(weights, ret), market)
+            self.market_pnl = market.tolist()
         self.cal_stats()
         return self.log
 
@@ -0,0 +1,166 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义BackTester使用的向量化模拟交易内核
+This code defines the vectorized simulation core used by BackTester
+
+原先BackTester的各个策略逐日复制信号，在循环中多次计算self.data.top[i] & (tmp > 0)这样的掩码再求和；
+这里把整个回测区间的信号一次转换为权重矩阵：top内去均值，截断负值，按行归一化，用argpartition选出得分最高的n只股票，
+每天的收益是权重矩阵和收益率矩阵逐行的内积
+-- 所有函数的输入都是(T, N)的矩阵，收益率已经按信号的行做了delay
+-- top之外的权重为0，信号中有nan的交易日权重为nan，与原先的逐日计算一致
+
+开发日志：
+2026-10-18
+-- 新增：demean，long_short_weights，long_weights，top_n_mask，normalize，portfolio_ret，market_ret
+-- 新增：buy_blocked，一次得到整个回测区间涨停或停牌不能买入的位置；hold_filter用布尔矩阵记录上一期的持仓
+-- 新增：sell_blocked，跌停或停牌不能卖出的位置；hold_filter直接修改权重矩阵，上一期的持仓当天不能卖出时保持上一期的权重
+"""
+
+import numpy as np
+
+
+def demean(signal, top):
+    """
+    :param signal: 信号矩阵
+    :param top: 与信号形状相同的布尔矩阵
+    :return: top内减去当天top内的均值，top之外为0
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.sum(signal, axis=1, where=top, keepdims=True) / np.sum(top, axis=1, keepdims=True)
+    return np.subtract(signal, mean, out=np.zeros_like(signal, dtype=np.result_type(signal, 0.0)), where=top)
+
+
+def normalize(weights, mask):
+    """
+    :param weights: 权重矩阵
+    :param mask: 需要归一化的位置
+    :return: mask内的权重除以当天mask内权重之和，mask之外为0
+    """
+    out = np.where(mask, weights, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.divide(out, np.sum(out, axis=1, keepdims=True), out=out, where=mask)
+
+
+def long_short_weights(signal, top):
+    """
+    :param signal: 信号矩阵
+    :param top: 与信号形状相同的布尔矩阵
+    :return: 去均值后多头和空头分别归一化，多头权重之和为1，空头权重之和为-1
+    """
+    w = demean(signal, top)
+    pos = w > 0
+    neg = w < 0
+    long_sum = np.sum(w, axis=1, where=pos, keepdims=True)
+    short_sum = -np.sum(w, axis=1, where=neg, keepdims=True)
+    np.divide(w, long_sum, out=w, where=pos)
+    np.divide(w, short_sum, out=w, where=neg)
+    return w
+
+
+def long_weights(signal, top):
+    """
+    :param signal: 信号矩阵
+    :param top: 与信号形状相同的布尔矩阵
+    :return: 去均值后只保留正值并归一化，负值的权重为0
+    """
+    w = demean(signal, top)
+    w[w < 0] = 0
+    pos = w > 0
+    np.divide(w, np.sum(w, axis=1, where=pos, keepdims=True), out=w, where=pos)
+    return w
+
+
+def top_n_mask(weights, n):
+    """
+    :param weights: 权重矩阵
+    :param n: 每天选出的股票数
+    :return: 每天权重为正的股票中权重最大的n只的位置，权重为正的股票不足n只时全部选出
+    """
+    n = min(n, weights.shape[1])
+    pos = weights > 0
+    key = np.where(pos, weights, -np.inf)
+    idx = np.argpartition(key, weights.shape[1] - n, axis=1)[:, weights.shape[1] - n:]
+    mask = np.zeros(weights.shape, dtype=bool)
+    np.put_along_axis(mask, idx, True, axis=1)
+    return mask & pos
+
+
+def portfolio_ret(weights, ret):
+    """
+    :param weights: 权重矩阵
+    :param ret: 与权重形状相同的收益率矩阵
+    :return: 每天的组合收益，即逐行的内积，权重为0的位置不使用收益率
+    """
+    pnl = np.einsum('ij,ij->i', weights, ret)
+    bad = ~np.isfinite(pnl)  # 只对权重为0的位置收益率为inf或nan的交易日重新计算
+    if np.any(bad):
+        pnl[bad] = np.einsum('ij,ij->i', weights[bad], np.where(weights[bad] != 0, ret[bad], 0))
+    return pnl
+
+
+def market_ret(ret, top):
+    """
+    :param ret: 收益率矩阵
+    :param top: 与收益率形状相同的布尔矩阵
+    :return: 每天top内股票的平均收益，top为空的交易日为nan
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(ret, axis=1, where=top) / np.sum(top, axis=1)
+
+
+def buy_blocked(ret, volume=None, limit=0.099):
+    """
+    :param ret: 与信号同一行的收益率矩阵，即买入当天的涨跌幅
+    :param volume: 买入当天的成交量矩阵，传入时成交量为0或者nan的停牌股票也不能买入
+    :param limit: 涨停的涨跌幅阈值
+    :return: 整个回测区间不能买入的位置
+    """
+    blocked = ret > limit
+    if volume is not None:
+        blocked |= ~(volume > 0)
+    return blocked
+
+
+def sell_blocked(ret, volume=None, limit=0.099):
+    """
+    :param ret: 与信号同一行的收益率矩阵，即调仓当天的涨跌幅
+    :param volume: 调仓当天的成交量矩阵，传入时成交量为0或者nan的停牌股票也不能卖出
+    :param limit: 跌停的涨跌幅阈值
+    :return: 整个回测区间不能卖出的位置
+    """
+    blocked = ret < -limit
+    if volume is not None:
+        blocked |= ~(volume > 0)
+    return blocked
+
+
+def hold_filter(weights, buy_blocked, sell_blocked=None):
+    """
+    :param weights: 每天的目标权重，直接在这个矩阵上修改
+    :param buy_blocked: 每天不能买入的位置，例如buy_blocked的结果
+    :param sell_blocked: 每天不能卖出的位置，例如sell_blocked的结果，默认都可以卖出
+    :return: 被剔除的位置，即不能买入且上一期没有持仓的股票；不能买入但上一期已经持有的位置；
+             以及上一期持有但当天不能卖出的位置，这些股票保持上一期的权重，其余股票的权重之和不超过剩下的仓位；
+             第一天没有上一期的持仓，不能买入的股票全部剔除
+    """
+    dropped = (weights > 0) & buy_blocked
+    held_blocked = np.zeros(weights.shape, dtype=bool)
+    frozen = np.zeros(weights.shape, dtype=bool)
+    weights[0, dropped[0]] = 0
+    for k in range(1, len(weights)):
+        held = weights[k - 1] > 0  # 上一期实际的持仓，包括被冻结的股票
+        held_blocked[k] = dropped[k] & held
+        dropped[k] &= ~held
+        weights[k, dropped[k]] = 0
+        if sell_blocked is None:
+            continue
+        frozen[k] = held & sell_blocked[k]
+        if not frozen[k].any():
+            continue
+        weights[k, frozen[k]] = weights[k - 1, frozen[k]]
+        free = np.sum(weights[k], where=~frozen[k] & (weights[k] > 0))
+        room = max(1 - np.sum(weights[k, frozen[k]]), 0)
+        if free > room:  # 冻结的股票占用了仓位，其余股票按比例缩小
+            weights[k, ~frozen[k]] *= room / free
+    return dropped, held_blocked, frozen
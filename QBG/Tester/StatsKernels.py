@@ -0,0 +1,157 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义信号统计量的numba内核，供AutoTester使用
+This code defines the numba kernels that compute the per-day statistics of signals for AutoTester
+
+原先的AutoTester.test逐日调用np.corrcoef计算IC和自相关系数，再逐日argsort计算排名最高的股票的平均收益；
+这里把K个信号的所有交易日展平后用prange并行，每一行只取一次top内的股票，在同一次循环中算出
+Pearson IC，Rank IC，与前一天信号的自相关系数以及排名最高的k只股票的平均收益，内部都用float64累加
+-- 信号中的nan按0处理，收益率中有nan时当天的IC为nan，与原先的np.corrcoef一致
+-- 方差为0或者股票数少于2时相关系数为nan，由调用方替换为0
+-- 排名最高的k只股票由稳定排序确定，信号值相同时列序号靠后的股票排在前面
+
+开发日志：
+2026-10-18
+-- 新增：signal_stats，一次计算K个信号的IC，Rank IC，自相关系数和top-k平均收益
+-- 新增：horizon_ics，一个信号对多个持有期收益率的IC和Rank IC
+"""
+
+import numba as nb
+import numpy as np
+
+
+@nb.jit(nopython=True)
+def _pearson(x, y):
+    """
+    :param x: 一维数组
+    :param y: 与x等长的一维数组
+    :return: 相关系数，先减去均值再求和
+    """
+    m = len(x)
+    if m < 2:
+        return np.nan
+    mx = 0.0
+    my = 0.0
+    for q in range(m):
+        mx += x[q]
+        my += y[q]
+    mx /= m
+    my /= m
+    sxy = 0.0
+    sxx = 0.0
+    syy = 0.0
+    for q in range(m):
+        dx = x[q] - mx
+        dy = y[q] - my
+        sxy += dx * dy
+        sxx += dx * dx
+        syy += dy * dy
+    if not (sxx > 0 and syy > 0):
+        return np.nan
+    r = sxy / np.sqrt(sxx * syy)
+    return min(max(r, -1.0), 1.0)
+
+
+@nb.jit(nopython=True)
+def _average_rank(x, order):
+    """
+    :param x: 一维数组
+    :param order: x的稳定排序下标
+    :return: 从0开始的排名，并列的值取平均排名
+    """
+    m = len(x)
+    r = np.empty(m)
+    k = 0
+    while k < m:
+        e = k
+        while e + 1 < m and x[order[e + 1]] == x[order[k]]:
+            e += 1
+        for q in range(k, e + 1):
+            r[order[q]] = (k + e) / 2
+        k = e + 1
+    return r
+
+
+@nb.jit(nopython=True, parallel=True, error_model='numpy')
+def signal_stats(signals, ret, top, ks):
+    """
+    :param signals: 形状为(K, T, N)的信号
+    :param ret: 形状为(T, N)的收益率，同一行已经做了delay
+    :param top: 形状为(K, T, N)的布尔矩阵，可以是广播得到的视图
+    :param ks: 需要统计的排名最高的股票个数，例如[1, 5, 10]
+    :return: 形状为(K, T)的IC和Rank IC，(K, T - 1)的自相关系数，(K, len(ks), T)的top-k平均收益
+    """
+    n_sig, n_day = signals.shape[0], signals.shape[1]
+    ics = np.full((n_sig, n_day), np.nan)
+    rank_ics = np.full((n_sig, n_day), np.nan)
+    auto = np.full((n_sig, max(n_day - 1, 0)), np.nan)
+    top_ret = np.full((n_sig, len(ks), n_day), np.nan)
+    for p in nb.prange(n_sig * n_day):
+        k = p // n_day
+        i = p % n_day
+        idx = np.nonzero(top[k, i])[0]
+        m = len(idx)
+        x = np.empty(m)
+        y = np.empty(m)
+        has_nan = False
+        for q in range(m):
+            v = signals[k, i, idx[q]]
+            x[q] = 0.0 if np.isnan(v) else v
+            y[q] = ret[i, idx[q]]
+            if np.isnan(y[q]):
+                has_nan = True
+        ics[k, i] = _pearson(x, y)
+        order = np.argsort(x, kind='mergesort')
+        for t in range(len(ks)):
+            c = min(ks[t], m)
+            if c > 0:
+                s = 0.0
+                for q in range(m - c, m):
+                    s += y[order[q]]
+                top_ret[k, t, i] = s / c
+        if not has_nan and m > 1:
+            rank_ics[k, i] = _pearson(_average_rank(x, order), _average_rank(y, np.argsort(y, kind='mergesort')))
+        if i >= 1:
+            both = np.nonzero(top[k, i] & top[k, i - 1])[0]
+            a = np.empty(len(both))
+            b = np.empty(len(both))
+            for q in range(len(both)):
+                v = signals[k, i, both[q]]
+                a[q] = 0.0 if np.isnan(v) else v
+                v = signals[k, i - 1, both[q]]
+                b[q] = 0.0 if np.isnan(v) else v
+            auto[k, i - 1] = _pearson(a, b)
+    return ics, rank_ics, auto, top_ret
+
+
+@nb.jit(nopython=True, parallel=True, error_model='numpy')
+def horizon_ics(signal, rets, top):
+    """
+    :param signal: 形状为(T, N)的信号
+    :param rets: 形状为(H, T, N)的多个持有期的收益率，同一行已经做了delay
+    :param top: 形状为(T, N)的布尔矩阵
+    :return: 形状为(H, T)的IC和Rank IC，每一行信号的排名只计算一次
+    """
+    n_hor, n_day = rets.shape[0], rets.shape[1]
+    ics = np.full((n_hor, n_day), np.nan)
+    rank_ics = np.full((n_hor, n_day), np.nan)
+    for i in nb.prange(n_day):
+        idx = np.nonzero(top[i])[0]
+        m = len(idx)
+        x = np.empty(m)
+        for q in range(m):
+            v = signal[i, idx[q]]
+            x[q] = 0.0 if np.isnan(v) else v
+        rx = _average_rank(x, np.argsort(x, kind='mergesort'))
+        y = np.empty(m)
+        for h in range(n_hor):
+            has_nan = False
+            for q in range(m):
+                y[q] = rets[h, i, idx[q]]
+                if np.isnan(y[q]):
+                    has_nan = True
+            ics[h, i] = _pearson(x, y)
+            if not has_nan and m > 1:
+                rank_ics[h, i] = _pearson(rx, _average_rank(y, np.argsort(y, kind='mergesort')))
+    return ics, rank_ics
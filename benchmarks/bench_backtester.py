@@ -0,0 +1,86 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+多年回测区间上BackTester与原先逐日循环的实现的耗时对照，同时检查两者的pnl一致
+每种策略先各运行一次预热，再分别计时；默认1250个交易日（约五年） * 3000只股票，3%的位置涨停
+
+用法：python benchmarks/bench_backtester.py --length 1250 --width 3000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'QBG', 'Tester')]
+
+import numpy as np
+
+from BackTester import BackTester
+from tests.legacy_backtester import LegacyBackTester
+
+CASES = [('long_short', {}),
+         ('long', {'zt_filter': True}),
+         ('long_top_n', {'zt_filter': False}),
+         ('long_top_n', {'n': 50, 'zt_filter': True}),
+         ('long_top_n', {'n': 50, 'zt_filter': True, 'position_mode': 'mean'})]
+
+
+class Panel:  # 回测需要的Data属性，不需要jqdatasdk和回测缓存
+    def __init__(self, length, width, limit_ratio):
+        """
+        :param length: 交易日数
+        :param width: 股票数
+        :param limit_ratio: 涨停的比例，这些位置的收益率设为0.1
+        """
+        rng = np.random.default_rng(0)
+        self.top = rng.random((length, width)) < 0.8
+        self.ret = rng.normal(0, 0.02, (length, width))
+        self.ret[rng.random(self.ret.shape) < limit_ratio] = 0.1
+        self.data_dic = {'volume': np.exp(rng.normal(12, 1, (length, width)))}
+        self.start_date = self.end_date = None
+        self.position_date_dic = dict(enumerate(range(length)))
+        self.order_code_dic = {i: '{:06d}.XSHE'.format(i) for i in range(width)}
+
+    def get_real_date(self, start_date, end_date):
+        return 0, len(self.ret) - 2
+
+
+def run(cls, data, signal, name, kwargs):
+    """
+    :return: 运行后的回测实例以及耗时（秒），策略打印的统计量不输出
+    """
+    tester = cls(data, signal)
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        getattr(cls(data, signal), name)(**kwargs)  # 预热
+        start = time.perf_counter()
+        getattr(tester, name)(**kwargs)
+        return tester, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=1250, help='交易日数')
+    parser.add_argument('--width', type=int, default=3000, help='股票数')
+    parser.add_argument('--limit-ratio', type=float, default=0.03, help='涨停的比例')
+    args = parser.parse_args()
+
+    data = Panel(args.length, args.width, args.limit_ratio)
+    signal = np.random.default_rng(1).normal(size=data.ret.shape)
+    print('panel: {} x {}'.format(args.length, args.width))
+    for name, kwargs in CASES:
+        legacy, legacy_time = run(LegacyBackTester, data, signal, name, kwargs)
+        tester, new_time = run(BackTester, data, signal, name, kwargs)
+        error = np.max(np.abs(np.array(tester.pnl) - np.array(legacy.pnl)))
+        assert error < 1e-10, (name, kwargs, error)
+        print('{} {}: loop {:.2f} s, vectorized {:.3f} s, {:.0f}x, max pnl diff {:.1e}'.format(
+            name, kwargs, legacy_time, new_time, legacy_time / new_time, error))
+
+
+if __name__ == '__main__':
+    main()
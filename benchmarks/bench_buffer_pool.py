@@ -0,0 +1,89 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+深度为4的公式在有无BufferPool时的耗时和tracemalloc峰值
+不使用子树缓存，每种设置先算一次预热（numba编译，填满BufferPool），再计时repeat次，最后用tracemalloc记录一次计算的内存峰值
+峰值同时换算成面板矩阵的个数，BufferPool中已经回收的矩阵不计入峰值
+
+用法：python benchmarks/bench_buffer_pool.py --length 1250 --width 3000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'QBG', name) for name in ['AutoFormula', 'Tester']]
+
+import numpy as np
+
+from AutoFormula import AutoFormula
+
+FORMULA = 'add{div{minus{tsdelta{close,3},tsdelay{open,2}},add{high,low}},' \
+          'prod{neg{minus{vwap,close}},div{tsmean{volume,5},add{open,close}}}}'
+
+
+def make_data(length, width, dtype):
+    """
+    :return: 只包含公式计算需要的属性的随机游走面板，不需要jqdatasdk和回测缓存
+    """
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (length, width)), axis=0))
+    data_dic = {'close': close, 'open': close * np.exp(rng.normal(0, 0.005, close.shape)),
+                'volume': np.exp(rng.normal(12, 1, close.shape))}
+    data_dic['high'] = np.maximum(close, data_dic['open']) * 1.01
+    data_dic['low'] = np.minimum(close, data_dic['open']) * 0.99
+    data_dic['vwap'] = (data_dic['high'] + data_dic['low'] + close) / 3
+    return SimpleNamespace(data_dic={name: value.astype(dtype) for name, value in data_dic.items()},
+                           top=rng.random(close.shape) < 0.8, industry=None, dtype=np.dtype(dtype))
+
+
+def bench(data, formula, pool_buffers, repeat):
+    """
+    :param data: make_data的结果，也可以是Data类的实例
+    :param formula: 公式的字符串形式
+    :param pool_buffers: AutoFormula的pool_buffers参数，0表示不回收中间结果
+    :param repeat: 计时次数
+    :return: 每次耗时的列表（秒），以及一次计算的tracemalloc峰值（字节）
+    """
+    auto = AutoFormula(None, None, data, cache_bytes=0, pool_buffers=pool_buffers)
+    tree = auto.formula_parser.parse(formula)
+    auto.cal_formula(tree, data.data_dic)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        signal = auto.cal_formula(tree, data.data_dic)
+        times.append(time.perf_counter() - start)
+        del signal
+    tracemalloc.start()
+    signal = auto.cal_formula(tree, data.data_dic)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del signal
+    return times, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=1250, help='交易日数')
+    parser.add_argument('--width', type=int, default=3000, help='股票数')
+    parser.add_argument('--repeat', type=int, default=10, help='计时次数')
+    parser.add_argument('--dtype', default='float64', help='计算精度')
+    parser.add_argument('--formula', default=FORMULA, help='测试的公式')
+    args = parser.parse_args()
+
+    data = make_data(length=args.length, width=args.width, dtype=args.dtype)
+    panel = args.length * args.width * np.dtype(args.dtype).itemsize
+    print('formula: {}'.format(args.formula))
+    print('panel: {} x {} {}, {:.1f} MB'.format(args.length, args.width, args.dtype, panel / 2 ** 20))
+    for pool_buffers in [0, 8]:
+        times, peak = bench(data, args.formula, pool_buffers, args.repeat)
+        print('pool_buffers={}: min {:.1f} ms, median {:.1f} ms, tracemalloc peak {:.1f} MB ({:.1f} panels)'.format(
+            pool_buffers, min(times) * 1e3, np.median(times) * 1e3, peak / 2 ** 20, peak / panel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+pytest的公共配置
+QBG下的各个模块通过同级导入互相引用，这里把各个文件夹加入sys.path；
+没有安装jqdatasdk时用tests/fake_jqdatasdk.py代替，DataLoader的测试通过api参数传入FakeJQData实例
+
+开发日志：
+2026-10-18
+-- 新增：测试的公共配置
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ['DataLoader', 'AutoFormula', 'Tester', 'Model', 'AutoFactory']:
+    path = os.path.join(ROOT, 'QBG', folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    import jqdatasdk
+except ImportError:  # 离线环境没有聚宽的sdk
+    from tests import fake_jqdatasdk
+    sys.modules['jqdatasdk'] = fake_jqdatasdk
@@ -0,0 +1,145 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+该代码定义离线测试使用的聚宽接口替代品
+This code defines an offline stand-in for the jqdatasdk API used by the tests
+
+FakeJQData实现了DataLoader用到的接口，返回固定的DataFrame，同一个(日期, 股票, 字段)总是得到同样的值，
+因此按天查询和按区间批量查询写出的文件应当完全一致
+-- calls按接口名统计调用次数，log按顺序记录每次调用的接口名和日期参数
+-- quota：总调用次数超过该值后抛出和聚宽一致的超出查询限制的异常
+-- transient：接口名到剩余失败次数的字典，用于模拟网络超时等可以重试的异常
+
+开发日志：
+2026-10-18
+-- 新增：FakeJQData，模块级的同名函数转发到一个默认实例，conftest在没有安装jqdatasdk时用本模块代替
+"""
+
+import datetime
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+QUOTA_MESSAGE = '您当天的查询条数超过了每日最大查询限制'
+HOLIDAYS = (datetime.date(2021, 2, 11), datetime.date(2021, 2, 12), datetime.date(2021, 2, 15),
+            datetime.date(2021, 4, 5), datetime.date(2021, 5, 3))
+CODES = ('000001.XSHE', '000002.XSHE', '600000.XSHG', '300001.XSHE')
+
+
+class _Table:  # query的参数，只需要能传递
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeJQData:
+    valuation = _Table('valuation')
+    indicator = _Table('indicator')
+
+    def __init__(self, codes=CODES, holidays=HOLIDAYS, first_date=datetime.date(2021, 1, 1),
+                 last_date=datetime.date(2021, 12, 31), quota=None, transient=None):
+        """
+        :param codes: 所有股票代码
+        :param holidays: 工作日中的节假日，没有交易
+        :param first_date: 交易日历的第一天
+        :param last_date: 交易日历的最后一天
+        :param quota: 总共允许调用多少次接口，None表示不限制
+        :param transient: 接口名到失败次数的字典，前若干次调用抛出可以重试的异常
+        """
+        self.codes = list(codes)
+        self.holidays = set(holidays)
+        self.trade_days = [d for d in pd.date_range(first_date, last_date).date
+                           if d.weekday() < 5 and d not in self.holidays]
+        self.quota = quota
+        self.transient = dict(transient or {})
+        self.calls = Counter()
+        self.log = []
+        self.lock = threading.Lock()
+
+    def _call(self, name, *dates):
+        with self.lock:
+            self.calls[name] += 1
+            self.log.append((name,) + dates)
+            if self.quota is not None and sum(self.calls.values()) > self.quota:
+                raise Exception(QUOTA_MESSAGE)
+            if self.transient.get(name, 0) > 0:
+                self.transient[name] -= 1
+                raise Exception('{} timeout'.format(name))
+
+    def _days(self, start_date, end_date):
+        return [d for d in self.trade_days if start_date <= d <= end_date]
+
+    def _value(self, date, code, field):  # 同一个(日期, 股票, 字段)总是同一个值
+        return float((date.toordinal() * 7 + self.codes.index(code) * 13 + len(field) * 3) % 101) + 1
+
+    def auth(self, user_id, password):
+        pass
+
+    def query(self, *tables):
+        return tables
+
+    def get_all_trade_days(self):
+        self._call('get_all_trade_days')
+        return np.array(self.trade_days)
+
+    def get_all_securities(self, types=None, date=None):
+        self._call('get_all_securities', date)
+        if types == ['index']:
+            return pd.DataFrame({'display_name': ['沪深300']}, index=['000300.XSHG'])
+        return pd.DataFrame({'display_name': self.codes}, index=self.codes)
+
+    def get_price(self, security, frequency='daily', fields=None, start_date=None, end_date=None):
+        self._call('get_price', start_date, end_date)
+        if isinstance(security, str):
+            security = [security]
+        rows = [dict(time=pd.Timestamp(d), code=c, **{f: self._value(d, c, f) for f in fields})
+                for d in self._days(start_date, end_date) for c in security]
+        return pd.DataFrame(rows, columns=['time', 'code'] + list(fields))
+
+    def get_money_flow(self, security_list, start_date=None, end_date=None):
+        self._call('get_money_flow', start_date, end_date)
+        fields = ['net_pct_main', 'net_pct_xl', 'net_pct_l', 'net_pct_m', 'net_pct_s']
+        rows = [dict(date=pd.Timestamp(d), sec_code=c, **{f: self._value(d, c, f) for f in fields})
+                for d in self._days(start_date, end_date) for c in security_list]
+        return pd.DataFrame(rows, columns=['date', 'sec_code'] + fields)
+
+    def _fundamentals(self, days):
+        rows = [dict(code=c, day=str(d), turnover_ratio=self._value(d, c, 'turnover_ratio'))
+                for d in days for c in self.codes]
+        return pd.DataFrame(rows, columns=['code', 'day', 'turnover_ratio'])
+
+    def get_fundamentals(self, query_object, date=None):
+        self._call('get_fundamentals', date)
+        return self._fundamentals(self._days(date, date))
+
+    def get_fundamentals_continuously(self, query_object, end_date=None, count=1, panel=True):
+        self._call('get_fundamentals_continuously', end_date)
+        return self._fundamentals(self._days(self.trade_days[0], end_date)[-count:])
+
+    def get_concepts(self):
+        self._call('get_concepts')
+        return pd.DataFrame({'name': ['概念1']}, index=['GN001'])
+
+    def get_industries(self, name='sw_l1'):
+        self._call('get_industries')
+        return pd.DataFrame({'name': [name]}, index=['{}_1'.format(name)])
+
+    def get_industry_stocks(self, industry_code, date=None):
+        self._call('get_industry_stocks', date)
+        return self.codes[:2]
+
+    def get_concept_stocks(self, concept_code, date=None):
+        self._call('get_concept_stocks', date)
+        return self.codes[:1]
+
+
+_default = FakeJQData()
+valuation = FakeJQData.valuation
+indicator = FakeJQData.indicator
+
+
+def __getattr__(name):  # 模块级的接口转发到默认实例，和import jqdatasdk的用法一致
+    if name.startswith('_'):
+        raise AttributeError(name)
+    return getattr(_default, name)
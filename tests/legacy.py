@@ -0,0 +1,175 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+原先SignalGenerator中逐个位置循环计算的时序算子，作为RollingKernels的参照；以及逐行循环的截面算子，作为CrossSection的参照
+除去掉了@nb.jit外与原先的实现一致：原先的tscorr和tsautocorr需要numba编译np.corrcoef，依赖scipy；
+纯python运行时方差为0的窗口得到nan或者inf并给出警告，而不是numba下的ZeroDivisionError
+截面算子原先是SignalGenerator的方法，这里把self.data.top改为参数top；行业算子原先固定使用self.data.industry['sws']，这里改为参数ind
+
+开发日志：
+2026-10-18
+-- 新增：tsstd，tsmean，tskurtosis，tsskew，wdirect，tscorr，tsautocorr的原始实现
+-- 新增：tsrank的原始实现
+-- 新增：csrank，zscore的原始实现
+-- 新增：csindneutral，csind的原始实现
+"""
+
+import numpy as np
+
+
+def tsstd(a, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            s[i, j] = np.std(a[i - num + 1:i + 1, j])
+    return s
+
+
+def tsmean(a, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            s[i, j] = np.mean(a[i - num + 1:i + 1, j])
+    return s
+
+
+def tskurtosis(a, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            if np.std(a[i - num + 1:i + 1, j]) == 0:
+                continue
+            s[i, j] = np.mean((a[i - num + 1:i + 1,
+                               j] - np.mean(a[i - num + 1:i + 1,
+                                            j])) ** 4) / (np.std(a[i - num + 1:i + 1, j]) ** 4) - 3
+    return s
+
+
+def tsskew(a, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            s[i, j] = np.mean((a[i - num + 1:i + 1, j] - np.mean(a[i - num + 1:i + 1, j])) ** 3) / \
+                      (np.std(a[i - num + 1:i + 1, j])) ** 3
+    return s
+
+
+def wdirect(a, num):  # 过去一段时间中心化之后时序加权
+    s = np.zeros(a.shape)
+    w = np.array([i for i in range(1, num + 1)])
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            if np.std(a[i - num + 1:i + 1, j]) == 0:
+                continue
+            s[i, j] = np.sum(w * (a[i - num + 1:i + 1, j] - np.mean(a[i - num + 1:i + 1, j]))) / \
+                      np.std(a[i - num + 1:i + 1, j])
+    return s
+
+
+def tsrank(a, num):
+    s = np.zeros(a.shape)
+
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            k = 0
+            tar = a[i, j]
+            if np.isnan(tar):
+                tar = 0
+            for c in a[i - num + 1:i + 1, j]:
+                if np.isnan(c):
+                    continue
+                if c < tar:
+                    k += 1
+            s[i, j] = k / (num - 1)
+    return s
+
+
+def tscorr(a, b, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < num - 1:
+            continue
+        for j in range(a.shape[1]):
+            s[i, j] = np.corrcoef(a[i - num + 1:i + 1, j], b[i - num + 1:i + 1, j])[0, 1]
+    return s
+
+
+def tsautocorr(a, delta, num):
+    s = np.zeros(a.shape)
+    for i in range(len(a)):
+        if i < delta + num - 1:
+            continue
+        for j in range(a.shape[1]):
+            s[i, j] = np.corrcoef(a[i - num + 1:i + 1, j], a[i - num + 1 - delta:i + 1 - delta, j])[0, 1]
+    return s
+
+
+def csrank(a, top):
+    b = a.copy()  # 测试用，可以不用复制
+    b[np.isnan(b)] = 0
+    for i in range(len(a)):
+        n = np.sum(b[i, top[i]] != 0)
+        if n == 0:
+            continue
+        tmp = b[i, top[i]].copy()
+        pos = tmp.argsort()
+        for j in range(len(tmp)):
+            tmp[pos[j]] = j
+        tmp /= (len(tmp) - 1)
+        b[i, top[i]] = tmp
+    return b
+
+
+def zscore(a, top):
+    b = a.copy()
+    b[np.isnan(b)] = 0
+    for i in range(len(a)):
+        if np.sum(b[i][top[i]] != 0) <= 1:
+            continue
+        b[i][top[i]] -= np.mean(b[i][top[i]])
+        b[i][top[i]] /= np.std(b[i][top[i]])
+        b[i][(top[i]) & (b[i] > 3)] = 3
+        b[i][(top[i]) & (b[i] < -3)] = -3
+    return b
+
+
+def csindneutral(a, ind):  # 截面中性化，暂时先使用申万二级行业，之后需要加入可选行业中性化
+    s = a.copy()
+    for i in range(len(s)):
+        ind_num_dic = {}  # 存放行业总数
+        ind_sum_dic = {}  # 存放行业总值
+        for j in list(set(ind[i])):
+            ind_num_dic[j] = np.sum(ind[i] == j)
+            ind_sum_dic[j] = np.sum(a[i, ind[i] == j])
+        for key in ind_sum_dic.keys():
+            ind_sum_dic[key] /= ind_num_dic[key]
+        for j in range(s.shape[1]):
+            s[i, j] = a[i, j] - ind_sum_dic[ind[i, j]]  # 减去行业平均，如果是没有出现过的行业，那么就是0
+    return s
+
+
+def csind(a, ind):  # 截面替换成所处行业的均值
+    s = a.copy()
+    for i in range(len(s)):
+        ind_num_dic = {}  # 存放行业总数
+        ind_sum_dic = {}  # 存放行业总值
+        for j in list(set(ind[i])):
+            ind_num_dic[j] = np.sum(ind[i] == j)
+            ind_sum_dic[j] = np.sum(a[i, ind[i] == j])
+        for key in ind_sum_dic.keys():
+            ind_sum_dic[key] /= ind_num_dic[key]
+        for j in range(s.shape[1]):
+            s[i, j] = ind_sum_dic[ind[i, j]]  # 减去行业平均，如果是没有出现过的行业，那么就是0
+    return s
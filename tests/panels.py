@@ -0,0 +1,50 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+测试用的随机游走面板，直接构造DataLoader中的Data实例，不需要回测缓存
+
+开发日志：
+2026-10-18
+-- 新增：make_data
+"""
+
+import numpy as np
+import pandas as pd
+
+from DataLoader import Data, DataLoader
+
+
+def make_data(length=250, width=60, seed=0, dtype='float64', limit_ratio=0.0, suspend_ratio=0.0):
+    """
+    :param length: 交易日数
+    :param width: 股票数
+    :param seed: 随机种子
+    :param dtype: data_dic中矩阵的精度
+    :param limit_ratio: 涨停的比例，这些位置的收益率设为0.1
+    :param suspend_ratio: 停牌的比例，这些位置的成交量设为0
+    :return: Data实例，ret是close_close_1收益率，top是随机的股票池；
+             与get_matrix_data一致，结束日期之后还有两个交易日，用于delay一天的收益率
+    """
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (length, width)), axis=0))
+    data_dic = {'close': close,
+                'open': close * np.exp(rng.normal(0, 0.005, close.shape)),
+                'volume': np.exp(rng.normal(12, 1, close.shape)),
+                'tvr_ratio': rng.uniform(0.1, 5, close.shape),
+                'turnover_ratio': rng.uniform(0.1, 5, close.shape)}
+    data_dic['high'] = np.maximum(close, data_dic['open']) * np.exp(np.abs(rng.normal(0, 0.005, close.shape)))
+    data_dic['low'] = np.minimum(close, data_dic['open']) * np.exp(-np.abs(rng.normal(0, 0.005, close.shape)))
+    data_dic['vwap'] = (data_dic['high'] + data_dic['low'] + close) / 3
+    data_dic['avg'] = data_dic['vwap']
+    data_dic['volume'][rng.random(close.shape) < suspend_ratio] = 0
+    ret = DataLoader.cal_ret(data_dic, 'close_close_1')
+    ret[rng.random(close.shape) < limit_ratio] = 0.1
+    top = rng.random(close.shape) < 0.8
+
+    dates = list(pd.bdate_range('2021-01-04', periods=length).date)
+    codes = ['{:06d}.XSHE'.format(i) for i in range(width)]
+    data = Data({code: i for i, code in enumerate(codes)}, dict(enumerate(codes)),
+                {date: i for i, date in enumerate(dates)}, dict(enumerate(dates)),
+                {name: value.astype(dtype) for name, value in data_dic.items()}, ret, industry=None,
+                start_date=dates[0], end_date=dates[-3], top=top, dtype=dtype)
+    return data
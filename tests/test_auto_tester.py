@@ -0,0 +1,142 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+AutoTester.test和test_many（StatsKernels.signal_stats）与原先逐日调用np.corrcoef和argsort的test的对照
+覆盖nan信号，nan收益率，top为空的行和top内只有一只股票的行；test_many按Model.fit的方式一次统计16个信号
+排名最高的k只股票在第k名有并列值时（例如top内多个nan替换为0）原先argsort的顺序不确定，
+这里按稳定排序，列序号靠后的股票排在前面，只比较第k名没有并列的交易日，其余交易日按这一顺序检查
+forward_returns与DataLoader.cal_ret的对照，以及test_decay在持有期1上与test的对照
+"""
+
+import numpy as np
+import pytest
+
+from AutoTester import AutoTester
+from DataLoader import DataLoader
+from tests.legacy_tester import LegacyAutoTester
+from tests.panels import make_data
+
+ATOL = 1e-12
+KS = (1, 5, 10)
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')  # 原先的实现在top为空或者只有一只股票的行0 / 0
+
+
+def make_panel(seed=0, length=60, width=40):
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(size=(length, width))
+    signal[rng.random(signal.shape) < 0.05] = np.nan
+    ret = rng.normal(0, 0.02, size=(length, width))
+    ret[rng.random(ret.shape) < 0.01] = np.nan
+    top = rng.random(signal.shape) < 0.7
+    top[3] = False  # top为空
+    top[4] = False
+    top[4, 6] = True  # top内只有一只股票
+    top[5, :12] = True
+    signal[5, :12] = np.nan  # top内有多个nan，替换为0后并列
+    return signal, ret, top
+
+
+def tie_free(signal, top, i, k):
+    """
+    :return: 第i行top内排名最高的k只股票是否不受并列值的影响
+    """
+    x = np.sort(np.nan_to_num(signal[i, top[i]]))[::-1]
+    return len(x) <= k or x[k - 1] > x[k]
+
+
+def stable_top_ret(signal, ret, top, i, k):
+    """
+    :return: 按稳定排序，信号值相同时列序号靠后的股票排在前面时，排名最高的k只股票的平均收益
+    """
+    x = np.nan_to_num(signal[i, top[i]])
+    if len(x) == 0:
+        return np.nan
+    return np.mean(ret[i, top[i]][np.argsort(x, kind='mergesort')[-k:]])
+
+
+def assert_same_stats(stats, legacy, signal, ret, top):
+    np.testing.assert_allclose(stats.ICs, legacy.ICs, rtol=0, atol=ATOL)
+    for name in ['mean_IC', 'auto_corr', 'IC_IR', 'positive_IC_rate']:
+        assert getattr(stats, name) == pytest.approx(getattr(legacy, name), abs=ATOL)
+    for k in KS:
+        expected = np.array(legacy.top_n_ret[k], dtype=float)
+        for i in range(len(signal)):
+            if not tie_free(signal, top, i, k):
+                expected[i] = stable_top_ret(signal, ret, top, i, k)
+        np.testing.assert_allclose(stats.top_n_ret[k], expected, rtol=0, atol=ATOL, equal_nan=True)
+
+
+def test_matches_legacy():
+    signal, ret, top = make_panel()
+    stats = AutoTester.test(signal.copy(), ret, top)
+    legacy = LegacyAutoTester.test(signal.copy(), ret, top)
+    assert_same_stats(stats, legacy, signal, ret, top)
+    assert stats.ICs[3] == stats.ICs[4] == 0  # 相关系数为nan的交易日记为0
+    assert np.isnan(stats.top_n_ret[1][3]) and stats.top_n_ret[10][4] == ret[4, 6]
+    assert not all(tie_free(signal, top, 5, k) for k in KS)
+    nan_ret = np.any(np.isnan(ret) & top, axis=1)
+    assert nan_ret.any() and np.all(stats.ICs[nan_ret] == 0)
+
+
+def test_matches_legacy_without_top():
+    signal, ret, _ = make_panel(seed=1)
+    signal[3] = 0  # 信号全为0，top为空
+    signal[4] = 0
+    signal[4, 6] = 1.0  # 只有一只股票
+    a, b = signal.copy(), signal.copy()
+    stats = AutoTester.test(a, ret)
+    legacy = LegacyAutoTester.test(b, ret)
+    np.testing.assert_array_equal(a, b)  # 同样原地把nan替换为0
+    assert_same_stats(stats, legacy, signal, ret, (signal != 0) & ~np.isnan(signal))
+
+
+@pytest.mark.parametrize('shared_top', [True, False])
+def test_many_matches_legacy(shared_top):
+    _, ret, top = make_panel(seed=2)
+    signals = []
+    for k in range(16):  # Model.fit默认一批统计16个系数组合
+        signal, _, _ = make_panel(seed=10 + k)
+        signal[np.random.default_rng(k).random(signal.shape) < 0.2] = 0
+        signals.append(signal)
+    signals = np.array(signals)
+    copy = signals.copy()
+    results = AutoTester.test_many(signals, ret, top if shared_top else None)
+    np.testing.assert_array_equal(signals, copy)  # 不修改传入的信号
+    assert len(results) == len(signals)
+    for signal, stats in zip(signals, results):
+        mask = top if shared_top else (signal != 0) & ~np.isnan(signal)
+        legacy = LegacyAutoTester.test(signal.copy(), ret, mask)
+        assert_same_stats(stats, legacy, signal, ret, mask)
+
+
+@pytest.mark.parametrize('return_type', ['close_close', 'open_close'])
+def test_forward_returns_match_cal_ret(return_type):
+    data = make_data(length=80, width=30)
+    data_dic = {name: data.data_dic[name].copy() for name in ['open', 'close']}
+    data_dic['close'][10:15, 3] = np.nan  # 停牌缺失的价格
+    data_dic['open'][40, 5] = np.nan
+    horizons = (1, 2, 5, 10)
+    rets = AutoTester.forward_returns(data_dic, horizons, return_type)
+    assert rets.shape == (len(horizons),) + data_dic['close'].shape
+    for k, h in enumerate(horizons):
+        ret = DataLoader.cal_ret(data_dic, '{}_{}'.format(return_type, h))
+        np.testing.assert_array_equal(rets[k, :-h], ret[:-h])
+        assert np.all(np.isnan(rets[k, -h:]))  # cal_ret在这里是0
+        assert np.all(ret[-h:] == 0)
+    assert np.all(np.isnan(AutoTester.forward_returns(data_dic, (80,), return_type)))
+
+
+def test_decay_matches_test_at_horizon_one():
+    data = make_data(length=80, width=30, seed=3)
+    signal, _, top = make_panel(seed=4, length=80, width=30)
+    rets = AutoTester.forward_returns(data.data_dic, (1, 5))
+    decay = AutoTester.test_decay(signal.copy(), rets, top, horizons=(1, 5))
+    stats = AutoTester.test(signal.copy(), DataLoader.cal_ret(data.data_dic, 'close_close_1'), top)
+    np.testing.assert_allclose(decay.ICs[0, :-1], stats.ICs[:-1], rtol=0, atol=ATOL)
+    np.testing.assert_allclose(decay.rank_ICs[0, :-1], stats.rank_ICs[:-1], rtol=0, atol=ATOL)
+    assert np.isnan(decay.ICs[0, -1]) and np.all(np.isnan(decay.ICs[1, -5:]))  # 超出数据范围的交易日不统计
+    assert decay.mean_IC[0] == pytest.approx(np.mean(stats.ICs[:-1]), abs=ATOL)
+    assert decay.mean_rank_IC[0] == pytest.approx(np.mean(stats.rank_ICs[:-1]), abs=ATOL)
+    assert decay.horizons == [1, 5]
+    stats = AutoTester.test(signal.copy(), DataLoader.cal_ret(data.data_dic, 'close_close_5'), top)
+    np.testing.assert_allclose(decay.ICs[1, :-5], stats.ICs[:-5], rtol=0, atol=ATOL)
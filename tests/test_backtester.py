@@ -0,0 +1,160 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+BackTester调用PortfolioSimulator的向量化实现与原先逐日循环的对照
+pnl，累计pnl，市场累计pnl，涨停个数和记录的股票逐日一致；原先有问题的统计量（第一天的涨停收益，上一期已持有的涨停股票数）不比较
+原先不考虑跌停和停牌，dt_filter和suspend_filter默认关闭，默认参数与原先一致；两者打开时上一期的持仓不能卖出则保持原来的权重
+"""
+
+import numpy as np
+import pytest
+
+from BackTester import BackTester
+from PortfolioSimulator import long_weights, portfolio_ret, market_ret, buy_blocked, sell_blocked, hold_filter
+from tests.legacy_backtester import LegacyBackTester
+from tests.panels import make_data
+
+ATOL = 1e-12
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')  # 两种实现打印的统计量在没有涨停的设置下是空数组的均值
+
+
+@pytest.fixture(scope='module')
+def data():
+    return make_data(length=120, width=80, limit_ratio=0.03)
+
+
+@pytest.fixture(scope='module')
+def signal(data):
+    signal = np.random.default_rng(1).normal(size=data.ret.shape)
+    signal[~data.top & (np.random.default_rng(2).random(signal.shape) < 0.5)] = 0
+    return signal
+
+
+def run(cls, data, signal, name, **kwargs):
+    tester = cls(data, signal.copy())
+    result = getattr(tester, name)(**kwargs)
+    return tester, result
+
+
+def assert_same_pnl(legacy, tester):
+    np.testing.assert_allclose(tester.pnl, legacy.pnl, rtol=0, atol=ATOL)
+    np.testing.assert_allclose(tester.cumulated_pnl, legacy.cumulated_pnl, rtol=0, atol=ATOL)
+    np.testing.assert_allclose(tester.market_cumulated_pnl, legacy.market_cumulated_pnl, rtol=0, atol=ATOL)
+    assert tester.sharp_ratio == pytest.approx(legacy.sharp_ratio, abs=ATOL)
+    assert tester.max_dd == pytest.approx(legacy.max_dd, abs=ATOL)
+    assert tester.max_loss_time == legacy.max_loss_time
+
+
+@pytest.mark.parametrize('name, kwargs', [('long_short', {}),
+                                          ('long', {}),
+                                          ('long', {'zt_filter': True}),
+                                          ('long_top_n', {'zt_filter': False})])
+def test_matches_legacy(data, signal, name, kwargs):
+    legacy, _ = run(LegacyBackTester, data, signal, name, **kwargs)
+    tester, _ = run(BackTester, data, signal, name, **kwargs)
+    assert len(tester.pnl) == len(legacy.pnl) > 0
+    assert_same_pnl(legacy, tester)
+
+
+@pytest.mark.parametrize('zt_filter', [False, True])
+@pytest.mark.parametrize('position_mode', ['weighted', 'mean'])
+def test_long_top_n_matches_legacy(data, signal, zt_filter, position_mode):
+    kwargs = {'n': 10, 'zt_filter': zt_filter, 'position_mode': position_mode}
+    legacy, (legacy_zt_ret, legacy_zt) = run(LegacyBackTester, data, signal, 'long_top_n', **kwargs)
+    tester, (zt_ret, zt) = run(BackTester, data, signal, 'long_top_n', **kwargs)
+    assert_same_pnl(legacy, tester)
+    np.testing.assert_array_equal(zt, legacy_zt)
+    assert not zt_filter or np.sum(zt) > 0  # 面板中确实有被剔除的涨停股票
+    np.testing.assert_allclose(zt_ret[1:], legacy_zt_ret[1:], rtol=0, atol=ATOL)  # 原先第一天记录的是剔除后的权重
+    assert tester.log == legacy.log
+
+
+def test_nan_signal_day(data, signal):
+    signal = signal.copy()
+    signal[20] = np.nan  # 信号为nan的交易日不持仓
+    legacy, _ = run(LegacyBackTester, data, signal, 'long', zt_filter=True)
+    tester, _ = run(BackTester, data, signal, 'long', zt_filter=True)
+    assert_same_pnl(legacy, tester)
+
+
+def test_sell_blocked():
+    ret = np.array([[-0.1, -0.05, 0.1, 0.0]])
+    volume = np.array([[1.0, 0.0, np.nan, 2.0]])
+    np.testing.assert_array_equal(sell_blocked(ret), [[True, False, False, False]])
+    np.testing.assert_array_equal(sell_blocked(ret, volume), [[True, True, True, False]])
+    np.testing.assert_array_equal(buy_blocked(ret, volume), [[False, True, True, False]])
+
+
+def test_hold_filter_carries_unsellable_holdings():
+    weights = np.array([[0.5, 0.3, 0.2, 0.0],
+                        [0.0, 0.5, 0.0, 0.5],
+                        [0.0, 0.0, 0.5, 0.5],
+                        [0.0, 0.0, 0.0, 1.0]])
+    buy = np.zeros(weights.shape, dtype=bool)
+    sell = np.zeros(weights.shape, dtype=bool)
+    buy[0, 2] = True  # 第一天涨停，剔除
+    sell[1, 0] = True  # 第二天跌停，第一天的持仓保持0.5的权重，其余股票的权重减半
+    buy[2, 3] = True  # 第三天涨停但已经持有
+    sell[2, 2] = True  # 没有持仓，不受影响
+    sell[3, 2] = True
+    dropped, held_blocked, frozen = hold_filter(weights, buy, sell)
+    np.testing.assert_allclose(weights, [[0.5, 0.3, 0.0, 0.0],
+                                         [0.5, 0.25, 0.0, 0.25],
+                                         [0.0, 0.0, 0.5, 0.5],
+                                         [0.0, 0.0, 0.5, 0.5]])
+    assert np.argwhere(dropped).tolist() == [[0, 2]]
+    assert np.argwhere(held_blocked).tolist() == [[2, 3]]
+    assert np.argwhere(frozen).tolist() == [[1, 0], [3, 2]]
+
+
+def test_hold_filter_without_sell_blocked():
+    weights = long_weights(np.random.default_rng(3).normal(size=(30, 20)), np.ones((30, 20), dtype=bool))
+    buy = np.random.default_rng(4).random(weights.shape) < 0.1
+    expected = weights.copy()
+    result = hold_filter(expected, buy)
+    actual = weights.copy()
+    for a, b in zip(result, hold_filter(actual, buy, np.zeros(weights.shape, dtype=bool))):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(actual, expected)
+    assert not result[2].any()
+
+
+@pytest.fixture(scope='module')
+def blocked_data():
+    data = make_data(length=120, width=80, seed=5, limit_ratio=0.03, suspend_ratio=0.03)
+    data.ret[np.random.default_rng(6).random(data.ret.shape) < 0.03] = -0.1
+    return data
+
+
+def test_long_carries_unsellable_holdings(blocked_data, signal):
+    data = blocked_data
+    tester, _ = run(BackTester, data, signal, 'long', zt_filter=True, dt_filter=True, suspend_filter=True)
+    start, end = data.get_real_date(str(data.start_date), str(data.end_date))
+    top, ret = data.top[start:end + 1], data.ret[start + 1:end + 2]
+    weights = long_weights(signal[start:end + 1], top)
+    weights[~(weights > 0)] = 0
+    volume = data.data_dic['volume'][start + 1:end + 2]
+    _, _, frozen = hold_filter(weights, buy_blocked(data.ret[start:end + 1], volume),
+                               sell_blocked(data.ret[start:end + 1], volume))
+    assert frozen.any()
+    assert np.all(np.sum(weights, axis=1) <= 1 + 1e-12)
+    np.testing.assert_allclose(tester.pnl, portfolio_ret(weights, ret) - market_ret(ret, top), rtol=0, atol=ATOL)
+    unblocked, _ = run(BackTester, data, signal, 'long', zt_filter=True)
+    assert not np.allclose(tester.pnl, unblocked.pnl)
+
+
+@pytest.mark.parametrize('position_mode', ['weighted', 'mean'])
+def test_long_top_n_carries_unsellable_holdings(blocked_data, signal, position_mode):
+    kwargs = {'n': 10, 'zt_filter': True, 'position_mode': position_mode}
+    tester, _ = run(BackTester, blocked_data, signal, 'long_top_n', dt_filter=True, suspend_filter=True, **kwargs)
+    unblocked, _ = run(BackTester, blocked_data, signal, 'long_top_n', **kwargs)
+    assert np.all(np.isfinite(tester.pnl))
+    assert not np.allclose(tester.pnl, unblocked.pnl)
+
+
+@pytest.mark.parametrize('name, kwargs', [('long', {'zt_filter': True}),
+                                          ('long_top_n', {'n': 10, 'zt_filter': True})])
+def test_defaults_ignore_unsellable_holdings(blocked_data, signal, name, kwargs):
+    legacy, _ = run(LegacyBackTester, blocked_data, signal, name, **kwargs)  # 默认参数下有跌停和停牌也与原先一致
+    tester, _ = run(BackTester, blocked_data, signal, name, **kwargs)
+    assert_same_pnl(legacy, tester)
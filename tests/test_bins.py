@@ -0,0 +1,89 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+cal_bin_ret和bin_ret与原先逐日构造元组列表排序的cal_bin_ret的对照
+覆盖nan信号，nan收益率，top为空的行，top内股票个数少于组数的行以及只有一只股票的行；
+组边界改为整数n * pos // cell，原先int(n / cell * pos)在n较大时有浮点误差，例如n = 164，cell = 20
+"""
+
+import numpy as np
+import pytest
+
+from AutoTester import AutoTester
+from tests.legacy_tester import LegacyAutoTester
+
+ATOL = 1e-12
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')  # 原先的实现在top为空的行计算空数组的均值
+
+
+def make_panel(seed=0, length=40, width=80):
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(size=(length, width))
+    ret = rng.normal(0, 0.02, size=(length, width))
+    signal[rng.random(signal.shape) < 0.05] = np.nan
+    ret[rng.random(ret.shape) < 0.05] = np.nan
+    top = rng.random(signal.shape) < 0.7
+    top[3] = False  # top为空
+    top[4] = False
+    top[4, :5] = True  # 股票个数少于组数
+    top[5] = False
+    top[5, 7] = True  # 只有一只股票
+    top[6] = True  # 所有股票
+    return signal, ret, top
+
+
+@pytest.mark.parametrize('cell', [20, 7, 3])
+def test_cal_bin_ret_matches_legacy(cell):
+    signal, ret, top = make_panel()
+    z, r = AutoTester.cal_bin_ret(signal.copy(), ret, top, cell=cell)
+    legacy_z, legacy_r = LegacyAutoTester.cal_bin_ret(signal.copy(), ret, top, cell=cell)
+    for pos in range(cell):
+        assert len(z[pos]) == len(legacy_z[pos])
+        np.testing.assert_allclose(z[pos], legacy_z[pos], rtol=0, atol=ATOL)
+        np.testing.assert_allclose(r[pos], legacy_r[pos], rtol=0, atol=ATOL)
+
+
+def test_cal_bin_ret_without_top():
+    signal, ret, _ = make_panel(seed=1)
+    signal[3] = 0  # 信号全为0，top为空
+    a, b = signal.copy(), signal.copy()
+    z, r = AutoTester.cal_bin_ret(a, ret)
+    legacy_z, legacy_r = LegacyAutoTester.cal_bin_ret(b, ret)
+    np.testing.assert_array_equal(a, b)  # 同样原地把nan替换为0
+    for pos in range(20):
+        np.testing.assert_allclose(z[pos], legacy_z[pos], rtol=0, atol=ATOL)
+        np.testing.assert_allclose(r[pos], legacy_r[pos], rtol=0, atol=ATOL)
+
+
+@pytest.mark.parametrize('cell', [20, 7])
+def test_bin_ret_matches_legacy_by_day(cell):
+    signal, ret, top = make_panel(seed=2)
+    mean_z, mean_r, count = AutoTester.bin_ret(signal, ret, top, cell=cell)
+    assert mean_z.shape == mean_r.shape == count.shape == (len(signal), cell)
+    np.testing.assert_array_equal(np.sum(count, axis=1), np.sum(top, axis=1))
+    for i in range(len(signal)):
+        legacy_z, legacy_r = LegacyAutoTester.cal_bin_ret(signal[i:i + 1].copy(), ret[i:i + 1], top[i:i + 1], cell)
+        np.testing.assert_array_equal(count[i], [len(a) for a in legacy_z])
+        for pos in range(cell):
+            if count[i, pos] == 0:
+                assert np.isnan(mean_z[i, pos]) and np.isnan(mean_r[i, pos])
+                continue
+            assert mean_z[i, pos] == pytest.approx(np.mean(legacy_z[pos]), abs=ATOL)
+            assert mean_r[i, pos] == pytest.approx(np.mean(legacy_r[pos]), abs=ATOL)
+    assert np.all(count[3] == 0)
+    assert np.sum(count[4] > 0) == 5 and np.sum(count[5] > 0) == 1
+    assert mean_z[5, count[5] > 0] == 0 and mean_r[5, count[5] > 0] == 0  # 只有一只股票时标准化为0
+
+
+def test_exact_bounds():
+    rng = np.random.default_rng(3)
+    signal = rng.normal(size=(2, 200))
+    top = np.zeros(signal.shape, dtype=bool)
+    top[0, :164] = True
+    top[1, :61] = True
+    _, _, count = AutoTester.bin_ret(signal, np.zeros(signal.shape), top, cell=20)
+    np.testing.assert_array_equal(count[0], np.diff(np.arange(21) * 164 // 20))
+    np.testing.assert_array_equal(count[1], np.diff(np.arange(21) * 61 // 20))
+    legacy_z, _ = LegacyAutoTester.cal_bin_ret(signal[:1].copy(), np.zeros((1, 200)), top[:1])
+    assert [len(a) for a in legacy_z][14:16] == [8, 9]  # 164 / 20 * 15 = 122.99999999999999
+    assert count[0, 14:16].tolist() == [9, 8]
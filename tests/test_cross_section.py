@@ -0,0 +1,105 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+cs_rank和cs_zscore与原先逐行循环实现的对照
+ordinal在没有并列值时与原先的排名相同；average（默认）给每组并列值该组排名的平均值，原先按argsort的顺序依次排名，
+top内有多个nan（替换为0）的行因此与原先不同；top内只有一只股票的行排名为nan，与原先一致
+"""
+
+import numpy as np
+import pytest
+
+from CrossSection import cs_rank, cs_zscore
+from tests import legacy
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')  # 原先的实现在只有一只股票的行0 / 0
+
+
+def make_signal(seed=0, length=60, width=40):
+    rng = np.random.default_rng(seed)
+    a = rng.normal(size=(length, width))
+    top = rng.random(a.shape) < 0.7
+    top[5] = False  # top为空
+    top[6] = False
+    top[6, 3] = True  # top内只有一只股票
+    a[7] = 0  # top内全为0
+    a[8, top[8]] = np.where(np.arange(top[8].sum()) == 0, 1.5, 0)  # top内只有一个非0值
+    return a, top
+
+
+def average_ranks(values):
+    """
+    :return: 每个值在values中的平均排名，即并列的一组值排名的平均值
+    """
+    order = np.sort(values)
+    lower = np.searchsorted(order, values, side='left')
+    upper = np.searchsorted(order, values, side='right') - 1
+    return (lower + upper) / 2
+
+
+def test_ordinal_matches_legacy_on_distinct_values():
+    a, top = make_signal()
+    a[10, 0] = np.nan  # 每行最多一个nan，替换为0后仍然没有并列值
+    s = cs_rank(a, top, ties='ordinal')
+    ref = legacy.csrank(a, top)
+    distinct = np.arange(len(a)) != 8
+    np.testing.assert_array_equal(s[distinct], ref[distinct])
+    # 第8行top内有多个0，并列值之间mergesort按出现顺序排名，原先quicksort的顺序不确定，只有并列组内的排名集合相同
+    tied = top[8] & (a[8] == 0)
+    np.testing.assert_array_equal(s[8, ~tied], ref[8, ~tied])
+    np.testing.assert_array_equal(np.sort(s[8, tied]), np.sort(ref[8, tied]))
+    assert np.all(np.diff(s[8, tied]) > 0)
+
+
+def test_average_ranks_tied_groups():
+    a, top = make_signal(seed=1)
+    a = np.round(a * 2) / 2  # 大量并列值
+    a[np.random.default_rng(2).random(a.shape) < 0.1] = np.nan
+    s = cs_rank(a, top)
+    b = np.nan_to_num(a)
+    for i in range(len(a)):
+        m = top[i].sum()
+        if m == 0 or not np.any(b[i, top[i]] != 0):  # 保持原值
+            np.testing.assert_array_equal(s[i], b[i])
+            continue
+        with np.errstate(invalid='ignore'):
+            expected = average_ranks(b[i, top[i]]) / (m - 1)
+        np.testing.assert_allclose(s[i, top[i]], expected, rtol=0, atol=1e-15)
+        np.testing.assert_array_equal(s[i, ~top[i]], b[i, ~top[i]])
+    ordinal = cs_rank(a, top, ties='ordinal')
+    assert not np.allclose(ordinal, s)
+    np.testing.assert_allclose(np.sum(np.where(top, ordinal, 0), axis=1), np.sum(np.where(top, s, 0), axis=1))
+
+
+@pytest.mark.parametrize('ties', ['average', 'ordinal'])
+def test_special_rows(ties):
+    a, top = make_signal()
+    s = cs_rank(a, top, ties=ties)
+    ref = legacy.csrank(a, top)
+    for i in [5, 7]:  # top为空或者全为0时保持原值
+        np.testing.assert_array_equal(s[i], a[i])
+    assert np.isnan(s[6, 3]) and np.isnan(ref[6, 3])  # 原先0 / 0得到nan
+    np.testing.assert_array_equal(np.delete(s[6], 3), np.delete(ref[6], 3))
+    with pytest.raises(ValueError):
+        cs_rank(a, top, ties='dense')
+
+
+def test_zscore_matches_legacy():
+    a, top = make_signal(seed=3)
+    a[np.random.default_rng(4).random(a.shape) < 0.1] = np.nan
+    a[20, np.nonzero(top[20])[0][:2]] = [100, -100]  # 超出截断的上下界
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ref = legacy.zscore(a, top)
+    s = cs_zscore(a, top)
+    np.testing.assert_allclose(s, ref, rtol=0, atol=1e-12)
+    assert np.any(np.abs(s[20]) == 3)
+    for i in [5, 6, 7, 8]:  # 非0值不超过1个的行保持原值
+        np.testing.assert_array_equal(s[i], np.nan_to_num(a[i]))
+
+
+def test_float32_and_out():
+    a, top = make_signal(seed=5)
+    out = np.full(a.shape, -1.0, dtype=np.float32)
+    assert cs_rank(a.astype(np.float32), top, out=out) is out
+    np.testing.assert_allclose(out, cs_rank(a, top), rtol=1e-6, equal_nan=True)
+    assert cs_zscore(a.astype(np.float32), top).dtype == np.float32
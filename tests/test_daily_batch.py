@@ -0,0 +1,80 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+按区间批量获取日频数据的测试：接口调用次数，节假日不再逐个试探，拆分后每天的文件与逐天获取完全一致
+"""
+
+import datetime
+import filecmp
+import math
+import os
+
+import pytest
+
+from DataLoader import DataLoader
+from tests.fake_jqdatasdk import FakeJQData
+
+START, END = '2021-02-01', '2021-03-31'
+BEGIN, FINISH = datetime.date(2021, 2, 1), datetime.date(2021, 3, 31)
+
+
+def fetch(path, api, **kwargs):
+    loader = DataLoader('user', 'password', data_path=str(path), back_test_data_path=str(path), api=api)
+    assert loader.get_pv_data(START, END, data_type=['stock_daily'], **kwargs) == []
+    return loader
+
+
+def trade_days(api):
+    return [d for d in api.trade_days if BEGIN <= d <= FINISH]
+
+
+@pytest.mark.parametrize('batch_days', [5, 10, 60])
+def test_batch_call_count(tmp_path, batch_days):
+    api = FakeJQData()
+    fetch(tmp_path, api, batch_days=batch_days)
+    batches = math.ceil(len(trade_days(api)) / batch_days)
+    assert api.calls['get_price'] == batches
+    assert api.calls['get_money_flow'] == batches
+    assert api.calls['get_fundamentals_continuously'] == batches
+    assert api.calls['get_fundamentals'] == 0
+    assert api.calls['get_all_trade_days'] == 1
+
+
+def test_holidays_are_never_probed(tmp_path):
+    api = FakeJQData()
+    fetch(tmp_path, api, batch_days=1)
+    days = trade_days(api)
+    assert [entry[1] for entry in api.log if entry[0] == 'get_price'] == days  # 只查询日历中的交易日
+    assert api.calls['get_price'] == len(days)
+
+    api = FakeJQData()  # 第二次运行直接使用缓存的交易日历
+    fetch(tmp_path, api, batch_days=10)
+    assert os.path.exists('{}/trade_days.pkl'.format(tmp_path))
+    assert api.calls['get_all_trade_days'] == 0
+    for entry in api.log:
+        if entry[0] == 'get_price':
+            assert entry[1] in days and entry[2] in days  # 每个批次的首尾都是交易日
+    assert not any(d in api.holidays for entry in api.log for d in entry[1:])
+
+    api = FakeJQData()  # 不使用日历时每个工作日都要试探一次，包括节假日
+    fetch(tmp_path / 'probe', api, use_calendar=False)
+    probed = [entry[1] for entry in api.log if entry[0] == 'get_price']
+    assert set(api.holidays) & set(probed)
+    assert api.calls['get_price'] == len(days) + len([d for d in api.holidays if BEGIN <= d <= FINISH])
+
+
+def test_batch_files_identical(tmp_path):
+    fetch(tmp_path / 'daily', FakeJQData(), batch_days=1)
+    fetch(tmp_path / 'batch', FakeJQData(), batch_days=7)
+    daily = '{}/StockDailyData'.format(tmp_path / 'daily')
+    batch = '{}/StockDailyData'.format(tmp_path / 'batch')
+    dates = sorted(os.listdir(daily))
+    assert dates == sorted(os.listdir(batch))
+    assert dates == [str(d) for d in trade_days(FakeJQData())]  # 节假日没有文件夹
+    for date in dates:
+        files = sorted(os.listdir('{}/{}'.format(daily, date)))
+        assert files == sorted(os.listdir('{}/{}'.format(batch, date)))
+        assert len(files) == 3
+        match, mismatch, errors = filecmp.cmpfiles('{}/{}'.format(daily, date), '{}/{}'.format(batch, date), files,
+                                                   shallow=False)
+        assert mismatch == [] and errors == []
@@ -0,0 +1,158 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+FetchScheduler的测试：失败重试和指数退避，达到查询上限时停止并报告剩余任务，FetchJournal断点续传，TokenBucket限流
+"""
+
+import os
+
+import pytest
+
+import FetchScheduler as fetch_scheduler
+from FetchScheduler import FetchScheduler, FetchJournal, TokenBucket, QuotaExceeded
+from DataLoader import DataLoader
+from tests.fake_jqdatasdk import FakeJQData
+
+
+class FakeClock:  # 替换FetchScheduler模块中的time，sleep只推进虚拟时间，限流的测试用2的幂作为rate以免浮点误差
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fetch_scheduler, 'time', clock)
+    return clock
+
+
+def price_task(scheduler, api, day):
+    return str(day), lambda: scheduler.call(api.get_price, api.codes, fields=['close'], start_date=day, end_date=day)
+
+
+def test_call_retries_with_exponential_backoff(clock):
+    api = FakeJQData(transient={'get_price': 2})
+    scheduler = FetchScheduler(max_retries=3, backoff=0.5)
+    frame = scheduler.call(api.get_price, api.codes, fields=['close'],
+                           start_date=api.trade_days[0], end_date=api.trade_days[0])
+    assert len(frame) == len(api.codes)
+    assert api.calls['get_price'] == 3
+    assert clock.sleeps == [0.5, 1.0]
+    assert not scheduler.stopped
+
+
+def test_call_raises_after_max_retries(clock):
+    api = FakeJQData(transient={'get_price': 10})
+    scheduler = FetchScheduler(max_retries=2, backoff=0.1)
+    with pytest.raises(Exception, match='timeout'):
+        scheduler.call(api.get_price, api.codes, fields=['close'],
+                       start_date=api.trade_days[0], end_date=api.trade_days[0])
+    assert api.calls['get_price'] == 3
+    assert clock.sleeps == pytest.approx([0.1, 0.2])
+    assert not scheduler.stopped  # 普通异常不会停止后续任务
+
+
+def test_quota_is_not_retried(clock):
+    api = FakeJQData(quota=0)
+    scheduler = FetchScheduler(max_retries=3)
+    with pytest.raises(QuotaExceeded):
+        scheduler.call(api.get_all_trade_days)
+    assert api.calls['get_all_trade_days'] == 1
+    assert clock.sleeps == []
+    assert scheduler.stopped
+
+
+def test_run_stops_on_quota_and_reports_remaining(capsys):
+    api = FakeJQData(quota=3)
+    scheduler = FetchScheduler()
+    tasks = [price_task(scheduler, api, day) for day in api.trade_days[:8]]
+    failed = scheduler.run(tasks)
+    assert scheduler.stopped
+    assert failed == [key for key, _ in tasks[3:]]
+    assert api.calls['get_price'] == 4  # 第4次调用超出限制，之后不再调用接口
+    assert 'quota exceeded, 5 tasks left' in capsys.readouterr().out
+
+
+def test_run_stops_on_quota_with_workers(tmp_path):
+    api = FakeJQData(quota=5)
+    journal = FetchJournal(str(tmp_path / 'journal.log'))
+    scheduler = FetchScheduler(num_workers=3, journal=journal)
+    tasks = [price_task(scheduler, api, day) for day in api.trade_days[:20]]
+    failed = scheduler.run(tasks)
+    assert scheduler.stopped
+    keys = [key for key, _ in tasks]
+    assert sorted(failed) == sorted(key for key in keys if key not in journal)
+    assert len(failed) == len(keys) - 5
+    assert api.calls['get_price'] <= 5 + 3  # 停止后排队中的任务不再调用接口
+
+
+def test_journal_resume_skips_completed(tmp_path):
+    path = str(tmp_path / 'FetchJournal' / 'journal.log')
+    api = FakeJQData(quota=4)
+    scheduler = FetchScheduler(journal=FetchJournal(path))
+    keys = api.trade_days[:10]
+    failed = scheduler.run([price_task(scheduler, api, day) for day in keys])
+    assert failed == [str(day) for day in keys[4:]]
+
+    api = FakeJQData()  # 第二天额度恢复，用同一个日志文件继续
+    journal = FetchJournal(path)
+    assert all(str(day) in journal for day in keys[:4])
+    scheduler = FetchScheduler(journal=journal)
+    assert scheduler.run([price_task(scheduler, api, day) for day in keys]) == []
+    assert [entry[1] for entry in api.log] == keys[4:]
+    journal.remove()
+    assert not os.path.exists(path)
+
+
+def test_get_pv_data_resumes_after_quota(tmp_path):
+    data_path = str(tmp_path)
+    api = FakeJQData(quota=12)
+    loader = DataLoader('user', 'password', data_path=data_path, back_test_data_path=data_path, api=api)
+    failed = loader.get_pv_data('2021-03-01', '2021-03-12', data_type=['stock_daily'])
+    assert failed
+    written = sorted(os.listdir('{}/StockDailyData'.format(data_path)))
+    assert len(written) + len(failed) == 10
+    assert len(os.listdir('{}/FetchJournal'.format(data_path))) == 1
+
+    api = FakeJQData()
+    loader.api = api
+    assert loader.get_pv_data('2021-03-01', '2021-03-12', data_type=['stock_daily']) == []
+    assert api.calls['get_all_trade_days'] == 0  # 交易日历已经缓存
+    assert [entry[1] for entry in api.log if entry[0] == 'get_price'] == \
+        [d for d in api.trade_days if str(d) not in written and d.month == 3 and d.day <= 12]
+    assert len(os.listdir('{}/StockDailyData'.format(data_path))) == 10
+    assert os.listdir('{}/FetchJournal'.format(data_path)) == []  # 全部完成后删除日志
+
+
+def test_token_bucket_limits_rate(clock):
+    bucket = TokenBucket(rate=8, capacity=2)
+    for _ in range(12):
+        bucket.acquire()
+    assert clock.now == pytest.approx((12 - 2) / 8)  # 容量内的突发不等待，之后每1/8秒一个令牌
+
+
+def test_token_bucket_refills_while_idle(clock):
+    bucket = TokenBucket(rate=4, capacity=4)
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == 0
+    clock.now += 10  # 空闲期间最多补满capacity个令牌
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == pytest.approx(10 + 1 / 4)
+
+
+def test_scheduler_respects_rate(clock):
+    api = FakeJQData()
+    scheduler = FetchScheduler(rate=4, capacity=1)
+    assert scheduler.run([price_task(scheduler, api, day) for day in api.trade_days[:11]]) == []
+    assert api.calls['get_price'] == 11
+    assert clock.now == pytest.approx(10 / 4)
@@ -0,0 +1,53 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+AutoFormula的子树缓存在Data.astype之后失效，SignalGenerator的精度跟随Data
+"""
+
+import numpy as np
+import pytest
+
+from AutoFormula import AutoFormula
+from SignalGenerator import SignalGenerator
+from tests.panels import make_data
+
+FORMULAS = ['tsmean{minus{close,open},5}', 'csrank{tsstd{minus{close,open},5}}', 'div{tsdelta{close,3},vwap}']
+
+
+def evaluate(auto, data, batch):
+    if batch:
+        return auto.cal_formulas(FORMULAS, data.data_dic)
+    return [auto.cal_formula(auto.formula_parser.parse(f), data.data_dic) for f in FORMULAS]
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_astype_invalidates_cache(batch):
+    data = make_data(length=60, width=20)
+    auto = AutoFormula('2021-01-04', '2021-03-26', data)
+    before = evaluate(auto, data, batch)
+    assert all(s.dtype == np.float64 for s in before)
+    assert batch or len(auto.cache) > 0  # cal_formulas只读取缓存
+
+    data.astype('float32')
+    assert auto.operation.dtype == np.float32
+    after = evaluate(auto, data, batch)
+    assert all(s.dtype == np.float32 for s in after)
+    assert auto.cache_dtype == np.float32
+    fresh = evaluate(AutoFormula('2021-01-04', '2021-03-26', data), data, batch)
+    for s, f in zip(after, fresh):
+        np.testing.assert_array_equal(s, f)
+    for s, b in zip(after, before):
+        np.testing.assert_allclose(s, b, rtol=1e-3, atol=1e-3)
+
+    data.astype('float64')
+    assert all(s.dtype == np.float64 for s in evaluate(auto, data, batch))
+
+
+def test_explicit_dtype_is_kept():
+    data = make_data(length=20, width=5)
+    operation = SignalGenerator(data, dtype='float32')
+    data.astype('float64')
+    assert operation.dtype == np.float32
+    assert operation.operation_dic['tsmean'](data.data_dic['close'], 3).dtype == np.float32
+    operation.dtype = None  # 取消指定后跟随Data
+    assert operation.dtype == np.float64
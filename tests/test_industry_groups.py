@@ -0,0 +1,76 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+IndustryGroups与原先逐行按字典统计行业均值的csindneutral，csind的对照
+覆盖sws以外的分类准则，未分类的股票（-1），只在个别交易日出现的行业，以及行业内有nan的情况
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from IndustryGroups import IndustryGroups
+from SignalGenerator import SignalGenerator
+from tests import legacy
+
+ATOL = 1e-14
+
+
+def make_industry(seed=0, length=50, width=60):
+    rng = np.random.default_rng(seed)
+    industry = {'swf': rng.integers(-1, 5, size=(length, width)).astype(float),
+                'sws': rng.integers(-1, 20, size=(length, width)).astype(float),
+                'swt': rng.integers(-1, 40, size=(length, width)).astype(float),
+                'concept': rng.integers(-1, 3, size=(length, width)).astype(float)}
+    industry['sws'][10, :3] = 99  # 只在第10天出现的行业
+    industry['sws'][11, 5] = 98  # 只有一只股票的行业
+    return industry
+
+
+@pytest.fixture(scope='module')
+def panel():
+    rng = np.random.default_rng(1)
+    a = rng.normal(size=(50, 60)) * 10
+    a[:, :30] *= 1e4  # 行业内量级差别很大
+    a[rng.random(a.shape) < 0.01] = np.nan
+    return a
+
+
+@pytest.mark.parametrize('level', ['swf', 'sws', 'swt', 'concept'])
+def test_matches_legacy(panel, level):
+    industry = make_industry()
+    groups = IndustryGroups(industry)
+    scale = np.nanmax(np.abs(panel))
+    for new, ref in [(groups.neutralize(panel, level), legacy.csindneutral(panel, industry[level])),
+                     (groups.mean(panel, level), legacy.csind(panel, industry[level]))]:
+        np.testing.assert_array_equal(np.isnan(new), np.isnan(ref))  # 行业内有nan时整个行业为nan
+        np.testing.assert_allclose(new / scale, ref / scale, rtol=0, atol=ATOL, equal_nan=True)
+
+
+def test_special_groups(panel):
+    industry = make_industry()
+    groups = IndustryGroups(industry)
+    a = np.nan_to_num(panel)
+    mean = groups.mean(a, 'sws')
+    np.testing.assert_allclose(mean[10, :3], np.mean(a[10, :3]))
+    assert mean[11, 5] == a[11, 5]
+    assert groups.neutralize(a, 'sws')[11, 5] == 0
+    unclassified = industry['sws'][20] == -1  # 未分类的股票也作为一个行业
+    np.testing.assert_allclose(mean[20, unclassified], np.mean(a[20, unclassified]))
+    with pytest.raises(KeyError):
+        groups.mean(a, 'zjw')
+    with pytest.raises(KeyError):
+        IndustryGroups(None).mean(a)
+
+
+def test_signal_generator_level(panel):
+    industry = make_industry()
+    data = SimpleNamespace(industry=industry, top=np.ones(panel.shape, dtype=bool), dtype=np.dtype('float64'))
+    operation = SignalGenerator(data, industry_level='swt')
+    a = np.nan_to_num(panel)
+    np.testing.assert_allclose(operation.operation_dic['csindneutral'](a), legacy.csindneutral(a, industry['swt']),
+                               rtol=0, atol=ATOL * np.max(np.abs(a)))
+    out = np.full(a.shape, -1.0)
+    assert operation.operation_dic['csind'](a, out=out) is out
+    np.testing.assert_allclose(out, legacy.csind(a, industry['swt']), rtol=0, atol=ATOL * np.max(np.abs(a)))
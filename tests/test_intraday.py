@@ -0,0 +1,162 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+日内数据的读取：空的日期文件夹和数据不完整的股票被跳过，日频面板重新生成后日内张量随之重写，与新的日期和股票对齐
+IntradayStore打包和读取的往返，包括没有股票的日期
+"""
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import IntradayLoader as intraday_loader
+from DataLoader import DataLoader
+from IntradayLoader import IntradayLoader
+from IntradayStore import IntradayStore
+from tests.fake_jqdatasdk import FakeJQData
+
+BARS = 24
+EMPTY = datetime.date(2021, 3, 10)  # get_pv_data预先创建但没有数据的文件夹
+PARTIAL = datetime.date(2021, 3, 11)  # 000002.XSHE只有20个bar
+FIELDS = ['open', 'high', 'low', 'close', 'volume', 'money']
+
+
+def value(date, code, bar):
+    return date.toordinal() % 1000 * 100 + int(code[:6]) % 100 + bar / 100
+
+
+def write_intraday(path, date, codes):
+    folder = '{}/StockIntraDayData/10m/{}'.format(path, date)
+    os.makedirs(folder, exist_ok=True)
+    if date == EMPTY:
+        return
+    for code in codes:
+        bars = 20 if date == PARTIAL and code == '000002.XSHE' else BARS
+        close = np.array([value(date, code, bar) for bar in range(bars)])
+        frame = pd.DataFrame({name: close for name in FIELDS})
+        frame['money'] = close * 2
+        frame.to_csv('{}/{}.csv'.format(folder, code), index=False)
+
+
+@pytest.fixture(scope='module')
+def data_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('data')
+    api = FakeJQData()
+    loader = DataLoader('user', 'password', data_path=str(path), back_test_data_path=str(path), api=api)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.get_pv_data('2021-02-01', '2021-03-31', data_type=['stock_daily'])
+    codes = [code for code in api.codes if not code.startswith('300')]
+    for date in api.trade_days:
+        if datetime.date(2021, 2, 1) <= date <= datetime.date(2021, 3, 31):
+            write_intraday(path, date, codes)
+    return path
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    load = intraday_loader.IntradayLoader.load
+
+    def counted(self, *args, **kwargs):
+        calls.append(args)
+        return load(self, *args, **kwargs)
+
+    monkeypatch.setattr(intraday_loader.IntradayLoader, 'load', counted)
+    return calls
+
+
+def matrix_data(path, frequency, start_date, end_date):
+    loader = DataLoader('user', 'password', data_path=str(path), back_test_data_path=str(path), api=FakeJQData())
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(divide='ignore', invalid='ignore'):
+        return loader.get_matrix_data('intra', frequency=frequency, start_date=start_date, end_date=end_date,
+                                      back_windows=2)
+
+
+def assert_aligned(data):
+    close = data.data_dic['intra_close']
+    assert close.shape == (len(data.ret), BARS, data.ret.shape[1])
+    for k in range(len(data.ret)):
+        date = data.position_date_dic[k]
+        for j in range(data.ret.shape[1]):
+            code = data.order_code_dic[j]
+            if date == EMPTY or (date == PARTIAL and code == '000002.XSHE'):
+                assert np.all(close[k, :, j] == 0)
+            else:
+                np.testing.assert_allclose(close[k, :, j], [value(date, code, bar) for bar in range(BARS)])
+                np.testing.assert_allclose(data.data_dic['intra_avg'][k, :, j], 2)
+
+
+def test_read_day_skips_empty_and_incomplete(data_path):
+    loader = IntradayLoader(str(data_path))
+    codes = {'000001.XSHE': 0, '000002.XSHE': 1, '600000.XSHG': 2}
+    pos, day = loader.read_day(EMPTY, codes, ['close', 'avg'], slice(0, BARS))
+    assert len(pos) == 0 and day == {}
+    pos, day = loader.read_day(PARTIAL, codes, ['close', 'avg'], slice(0, 6))
+    assert sorted(pos.tolist()) == [0, 2]
+    for i, p in enumerate(pos):
+        code = ['000001.XSHE', '000002.XSHE', '600000.XSHG'][p]
+        np.testing.assert_allclose(day['close'][:, i], [value(PARTIAL, code, bar) for bar in range(6)])
+    assert day['close'].shape == day['avg'].shape == (6, 2)
+
+
+def test_intraday_follows_daily_panel(data_path, loads):
+    shutil.rmtree('{}/intra'.format(data_path), ignore_errors=True)
+    data = matrix_data(data_path, ['daily', '10m'], '2021-03-08', '2021-03-22')
+    assert data.position_date_dic[0] == datetime.date(2021, 3, 8)
+    assert_aligned(data)
+    assert len(loads) == 1
+
+    data = matrix_data(data_path, ['daily', '10m'], '2021-03-08', '2021-03-22')  # 直接使用缓存
+    assert len(loads) == 1
+    assert_aligned(data)
+
+    shape = data.ret.shape
+    data = matrix_data(data_path, ['daily'], '2021-03-01', '2021-03-15')  # 日频面板重写，形状不变但日期平移
+    assert data.ret.shape == shape and data.position_date_dic[0] == datetime.date(2021, 3, 1)
+    data = matrix_data(data_path, ['daily', '10m'], '2021-03-01', '2021-03-15')
+    assert len(loads) == 2
+    assert_aligned(data)
+
+    os.remove('{}/intra/code_order_dic.pkl'.format(data_path))  # 日频缓存在同一次调用中重写
+    data = matrix_data(data_path, ['daily', '10m'], '2021-03-01', '2021-03-15')
+    assert len(loads) == 3
+    assert_aligned(data)
+
+
+def test_store_round_trip(data_path, tmp_path):
+    shutil.copytree('{}/StockIntraDayData/10m/{}'.format(data_path, PARTIAL),
+                    '{}/StockIntraDayData/10m/{}'.format(tmp_path, PARTIAL))
+    codes = {'000001.XSHE': 0, '000002.XSHE': 1, '600000.XSHG': 2}
+    loader = IntradayLoader(str(tmp_path))
+    expected = loader.read_day(PARTIAL, codes, ['close', 'avg'], slice(2, 10))
+    loader.store.convert(remove=True)
+    assert loader.store.exists(PARTIAL)
+    store_codes, counts, arrays = loader.store.read(PARTIAL, fields=['close', 'money'])
+    assert store_codes.tolist() == sorted(codes) and counts.tolist() == [BARS, 20, BARS]
+    assert np.all(np.isnan(arrays['close'][1, 20:]))
+    actual = loader.read_day(PARTIAL, codes, ['close', 'avg'], slice(2, 10))
+    np.testing.assert_array_equal(actual[0], expected[0])
+    for name in ['close', 'avg']:
+        np.testing.assert_array_equal(actual[1][name], expected[1][name])
+
+
+def test_store_empty_day(tmp_path):
+    store = IntradayStore(str(tmp_path))
+    os.makedirs('{}/{}'.format(store.path, EMPTY))
+    store.convert()  # 空的文件夹不打包
+    assert not store.exists(EMPTY)
+
+    store.pack(EMPTY)  # 直接打包时只写入codes和counts
+    codes, counts, arrays = store.read(EMPTY, fields=['close', 'volume'])
+    assert len(codes) == len(counts) == 0
+    assert arrays['close'].shape == arrays['volume'].shape == (0, BARS)
+    assert store.read(EMPTY)[2] == {}
+    pos, day = IntradayLoader(str(tmp_path)).read_day(EMPTY, {'000001.XSHE': 0}, ['close', 'avg'], slice(0, 6))
+    assert len(pos) == 0
+    assert day['close'].shape == day['avg'].shape == (6, 0)
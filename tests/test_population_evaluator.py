@@ -0,0 +1,124 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+PopulationEvaluator.share的测试：回测缓存中的字段只记录位置，只共享二维矩阵，内容没有变化时不重复写入
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import PanelStore as panel_store
+from PanelStore import PanelStore
+from PopulationEvaluator import PopulationEvaluator, SharedData
+from AutoFormula import AutoFormula
+from tests.panels import make_data
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    names = []
+    write = panel_store.PanelStore.write
+
+    def counted(self, name, array, dump_manifest=True):
+        names.append(name)
+        return write(self, name, array, dump_manifest=dump_manifest)
+
+    monkeypatch.setattr(panel_store.PanelStore, 'write', counted)
+    return names
+
+
+def cached_data(path):
+    """
+    :return: 与get_matrix_data读缓存时一样，data_dic懒加载，ret和top是copy-on-write的memmap
+    """
+    data = make_data(length=40, width=12)
+    store = PanelStore(path)
+    store.set_axis([data.position_date_dic[i] for i in range(40)], [data.order_code_dic[i] for i in range(12)])
+    store.write_dic(data.data_dic, prefix='data_')
+    store.write('return', data.ret, dump_manifest=False)
+    store.write('top', data.top)
+    data.data_dic = store.data_dic(prefix='data_')
+    data.ret = store.load('return')
+    data.top = store.load('top')
+    return data
+
+
+def assert_shared(data, path, names):
+    shared = SharedData(path, dtype=data.dtype)
+    assert sorted(shared.data_dic) == sorted(names)
+    for name in names:
+        np.testing.assert_array_equal(shared.data_dic[name].astype(data.dtype), data.data_dic[name])
+    np.testing.assert_array_equal(shared.ret, data.ret)
+    np.testing.assert_array_equal(shared.top, data.top)
+
+
+def test_share_writes_only_2d_fields_once(tmp_path, writes):
+    data = make_data(length=40, width=12)
+    names = list(data.data_dic)
+    data.data_dic['intra_close'] = np.zeros((40, 24, 12))  # 日内张量不共享
+    path = str(tmp_path / 'shared')
+    evaluator = PopulationEvaluator(data, path, num_workers=1)
+    assert sorted(writes) == sorted(['data_' + name for name in names] + ['return', 'top'])
+    assert not os.path.exists('{}/data_intra_close.npy'.format(path))
+    assert_shared(data, path, names)
+
+    writes.clear()
+    evaluator.share(data)  # 内容没有变化
+    assert writes == []
+    PopulationEvaluator(data, path, num_workers=1)  # 重新建立时也不重复写入
+    assert writes == []
+
+    data.data_dic['close'] = data.data_dic['close'] * 2
+    data.top = ~data.top
+    evaluator.share(data)
+    assert sorted(writes) == ['data_close', 'top']
+    assert_shared(data, path, names)
+
+
+def test_share_fields(tmp_path, writes):
+    data = make_data(length=40, width=12)
+    path = str(tmp_path / 'shared')
+    evaluator = PopulationEvaluator(data, path, num_workers=1)
+    writes.clear()
+    evaluator.fields = ['close', 'open']
+    evaluator.share(data)
+    assert writes == []
+    assert sorted(os.listdir(path)) == ['data_close.npy', 'data_open.npy', 'manifest.json', 'return.npy', 'top.npy']
+    assert_shared(data, path, ['close', 'open'])
+
+
+def test_share_links_back_test_cache(tmp_path, writes):
+    cache = str(tmp_path / 'panel')
+    data = cached_data(cache)
+    names = list(data.data_dic)
+    path = str(tmp_path / 'shared')
+    writes.clear()
+    PopulationEvaluator(data, path, num_workers=1)
+    assert sorted(writes) == ['return', 'top']  # 数据字段直接映射缓存
+    manifest = PanelStore(path).manifest
+    assert manifest['links'] == {'data_' + name: cache for name in names}
+    assert_shared(data, path, names)
+
+    writes.clear()
+    data.astype('float32')  # 转换精度不算修改，仍然映射缓存
+    data.data_dic['vwap'] = data.data_dic['close'] * 1.5  # 手动赋值的字段需要写入
+    PopulationEvaluator(data, path, num_workers=1)
+    assert writes == ['data_vwap']
+    assert 'data_vwap' not in PanelStore(path).manifest['links']
+    assert_shared(data, path, names)
+
+
+def test_evaluate_matches_test_formula(tmp_path):
+    data = cached_data(str(tmp_path / 'panel'))
+    formulas = ['minus{close,open}', 'div{minus{close,open},add{high,low}}', 'prod{close,vol}']
+    evaluator = PopulationEvaluator(data, str(tmp_path / 'shared'), num_workers=1, timeout=60)
+    results = {formula: (stats, error) for formula, stats, error in evaluator.evaluate(formulas)}
+    auto = AutoFormula(str(data.start_date), str(data.end_date), data)
+    for formula in formulas[:2]:
+        stats, error = results[formula]
+        assert error is None
+        expected, _ = auto.test_formula(formula, data)
+        assert stats.mean_IC == pytest.approx(expected.mean_IC)
+    assert results[formulas[2]][0] is None and 'KeyError' in results[formulas[2]][1]
@@ -0,0 +1,114 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+rolling_corr和tsautocorr与原先逐个位置调用np.corrcoef的实现的对照
+两种更新方式都要与参照一致；任一序列在窗口内方差为0时结果为0，原先是nan；窗口中有nan时为nan
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from RollingKernels import rolling_corr
+from SignalGenerator import SignalGenerator
+from tests import legacy
+from tests.test_rolling_moments import make_panel
+
+WINDOWS = range(2, 32)
+ATOL = {False: 1e-9, True: 1e-5}  # 带平移量的幂和误差在1e-12左右，Welford式更新在放大1e6倍的列上约1e-6
+
+
+def reference(func, *args):
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)  # 方差为0时np.corrcoef给出警告并返回nan
+        return func(*args)
+
+
+def window_flags(a, num):
+    """
+    :return: 窗口内有nan的位置，以及窗口内所有值都相同的位置，前num - 1行都为False
+    """
+    has_nan = np.zeros(a.shape, dtype=bool)
+    flat = np.zeros(a.shape, dtype=bool)
+    windows = sliding_window_view(a, num, axis=0)
+    has_nan[num - 1:] = np.any(np.isnan(windows), axis=-1)
+    flat[num - 1:] = np.ptp(windows, axis=-1) == 0
+    return has_nan, flat
+
+
+@pytest.fixture(scope='module')
+def panels():
+    a = make_panel(seed=1)
+    b = make_panel(seed=2)
+    b[:, 12] = np.linspace(0, 1, len(b))  # a中整列不变的位置b不是常数
+    b[50:80, 14:16] = -2.0
+    return a, b
+
+
+@pytest.fixture(scope='module')
+def references(panels):
+    a, b = panels
+    return {num: reference(legacy.tscorr, a, b, num) for num in WINDOWS}
+
+
+def check_corr(new, ref, flags, num, atol):
+    has_nan, flat = flags
+    assert np.all(new[:num - 1] == 0)
+    assert np.all(np.isnan(new[has_nan]))
+    zero = flat & ~has_nan
+    assert np.all(new[zero] == 0)  # 原先np.corrcoef在这些位置是nan
+    assert np.all(np.isnan(ref[zero]))
+    check = ~(has_nan | zero)
+    check[:num - 1] = False
+    assert not np.any(np.isnan(new[check]))
+    np.testing.assert_allclose(new[check], ref[check], rtol=0, atol=atol)
+    assert np.all(np.abs(new[check]) <= 1)
+
+
+@pytest.mark.parametrize('stable', [False, True])
+@pytest.mark.parametrize('num', WINDOWS)
+def test_rolling_corr_matches_legacy(panels, references, num, stable):
+    a, b = panels
+    new = rolling_corr(a, b, num, stable=stable)
+    nan_a, flat_a = window_flags(a, num)
+    nan_b, flat_b = window_flags(b, num)
+    check_corr(new, references[num], (nan_a | nan_b, flat_a | flat_b), num, ATOL[stable])
+
+
+@pytest.mark.parametrize('stable', [False, True])
+def test_zero_variance_is_zero(stable):
+    a = np.cumsum(np.random.default_rng(3).normal(size=(40, 4)), axis=0)
+    b = a.copy()
+    a[10:30, 0] = 5.0  # a在窗口内不变
+    b[10:30, 1] = 5.0  # b在窗口内不变
+    a[:, 2] = 1e6  # 量级很大的常数，幂和相减也不能得到非0的方差
+    b[:, 3] = 0
+    s = rolling_corr(a, b, 10, stable=stable)
+    assert np.all(s[19:30, 0] == 0) and np.all(s[19:30, 1] == 0)
+    assert np.all(s[:, 2] == 0) and np.all(s[:, 3] == 0)
+    assert np.all(s[30:, :2] != 0)
+
+
+@pytest.mark.parametrize('delta, num', [(1, 2), (1, 10), (3, 5), (5, 20), (2, 31)])
+def test_tsautocorr_matches_legacy(panels, delta, num):
+    a = panels[0]
+    new = SignalGenerator(data=None).operation_dic['tsautocorr'](a, delta, num)
+    ref = reference(legacy.tsautocorr, a, delta, num)
+    assert np.all(new[:delta + num - 1] == 0)
+    has_nan, flat = window_flags(a, num)
+    lag_nan = np.zeros(a.shape, dtype=bool)
+    lag_flat = np.zeros(a.shape, dtype=bool)
+    lag_nan[delta:], lag_flat[delta:] = has_nan[:-delta], flat[:-delta]  # 滞后delta天的窗口
+    flags = (has_nan | lag_nan, flat | lag_flat)
+    for flag in flags:
+        flag[:delta + num - 1] = False
+    check_corr(new, ref, flags, delta + num, ATOL[False])
+
+
+def test_tscorr_writes_out(panels):
+    a, b = panels
+    out = np.full(a.shape, -1.0)
+    assert SignalGenerator(data=None).operation_dic['tscorr'](a, b, 7, out=out) is out
+    np.testing.assert_array_equal(out, rolling_corr(a, b, 7))
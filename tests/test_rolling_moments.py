@@ -0,0 +1,107 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+rolling_moment和rolling_mean与原先逐窗口np.mean，np.std实现的对照
+覆盖2到31的窗口，nan，价格不变的平坦窗口，放大1e6倍的列，以及前num - 1行
+rolling_rank与原先逐个位置计数的tsrank逐位相同，包括并列值和nan
+"""
+
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from RollingKernels import rolling_moment, rolling_mean, rolling_rank
+from SignalGenerator import SignalGenerator
+from tests import legacy
+
+KERNELS = {
+    'tsmean': lambda a, num: rolling_mean(a, num),
+    'tsstd': lambda a, num: rolling_moment(a, num, 1),
+    'tsskew': lambda a, num: rolling_moment(a, num, 2),
+    'tskurtosis': lambda a, num: rolling_moment(a, num, 3),
+    'wdirect': lambda a, num: rolling_moment(a, num, 4),
+}
+# (rtol, atol)，均值和标准差除以每列的量级后比较，其余三个与量级无关
+TOLERANCE = {
+    'tsmean': (1e-12, 1e-12),
+    'tsstd': (1e-9, 1e-10),
+    'tsskew': (1e-7, 1e-8),
+    'tskurtosis': (1e-6, 1e-6),
+    'wdirect': (1e-8, 1e-8),
+}
+
+
+def make_panel(seed=0, length=90, width=20):
+    rng = np.random.default_rng(seed)
+    a = np.cumsum(rng.normal(size=(length, width)), axis=0) + 50
+    a[:, :4] *= 1e6  # 成交额一类量级很大的字段
+    a[rng.random(a.shape) < 0.01] = np.nan
+    a[30:70, 6:9] = 7.0  # 停牌期间价格不变
+    a[:25, 9:12] = 0  # 上市之前为0
+    a[:, 12] = 3.0
+    return a
+
+
+@pytest.fixture(scope='module')
+def panel():
+    return make_panel()
+
+
+def flat_windows(a, num):
+    """
+    :return: 窗口内所有值都相同的位置，前num - 1行为False
+    """
+    flat = np.zeros(a.shape, dtype=bool)
+    flat[num - 1:] = np.ptp(sliding_window_view(a, num, axis=0), axis=-1) == 0
+    return flat
+
+
+@pytest.mark.parametrize('num', range(2, 32))
+@pytest.mark.parametrize('name', list(KERNELS))
+def test_matches_legacy(panel, name, num):
+    new = KERNELS[name](panel, num)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref = getattr(legacy, name)(panel, num)
+
+    assert np.all(new[:num - 1] == 0)
+    flat = flat_windows(panel, num)
+    if name == 'tsmean':
+        np.testing.assert_allclose(new[flat], panel[flat], rtol=1e-12)
+    else:  # 原先除以0得到nan或者inf，现在平坦窗口为0
+        assert np.all(new[flat] == 0)
+
+    check = ~flat
+    check[:num - 1] = False
+    if name in ['tsmean', 'tsstd']:
+        scale = np.nanmax(np.abs(panel), axis=0) + 1
+        new, ref = new / scale, ref / scale
+    rtol, atol = TOLERANCE[name]
+    np.testing.assert_allclose(new[check], ref[check], rtol=rtol, atol=atol, equal_nan=True)
+    assert np.array_equal(np.isnan(new[check]), np.isnan(ref[check]))  # 窗口内有nan时结果为nan
+
+
+@pytest.mark.parametrize('name', list(KERNELS))
+def test_signal_generator_uses_kernels(panel, name):
+    operation = SignalGenerator(data=None).operation_dic[name]
+    out = np.full(panel.shape, -1.0)
+    assert operation(panel, 5, out=out) is out
+    np.testing.assert_array_equal(out, KERNELS[name](panel, 5))
+
+
+@pytest.mark.parametrize('name', list(KERNELS))
+def test_window_longer_than_panel(name):
+    a = make_panel()[:10]
+    assert np.all(KERNELS[name](a, 12) == 0)
+
+
+@pytest.mark.parametrize('num', range(2, 32))
+def test_rolling_rank_matches_legacy(panel, num):
+    a = panel.copy()
+    a[:, 13:] = np.round(a[:, 13:] / 3)  # 窗口内有并列值
+    a[:, 14] = np.where(np.arange(len(a)) % 4 == 0, -1.0, a[:, 14])  # nan按0比较时有严格小于0的值
+    new = rolling_rank(a, num)
+    np.testing.assert_array_equal(new, legacy.tsrank(a, num))
+    assert np.all(new[:num - 1] == 0)
+    out = np.full(a.shape, -1.0)
+    assert SignalGenerator(data=None).operation_dic['tsrank'](a, num, out=out) is out
+    np.testing.assert_array_equal(out, new)
@@ -0,0 +1,37 @@
+# Copyright (c) 2021 Dai HBG
+
+"""
+TradingCalendar按日期查找最近的交易日，超出范围时报错
+"""
+
+import datetime
+
+import pytest
+
+from TradingCalendar import TradingCalendar
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar(['2021-02-08', '2021-02-09', '2021-02-10', '2021-02-18', '2021-02-19'])
+
+
+def test_nearest_dates(calendar):
+    assert calendar.next_date('2021-02-11') == datetime.date(2021, 2, 18)
+    assert calendar.prev_date('2021-02-11') == datetime.date(2021, 2, 10)
+    assert calendar.next_date('2021-02-08') == calendar.prev_date('2021-02-08') == datetime.date(2021, 2, 8)
+    assert calendar.next_date('2021-1-1') == datetime.date(2021, 2, 8)
+    assert calendar.prev_date(datetime.date(2021, 3, 1)) == datetime.date(2021, 2, 19)
+    assert calendar.between('2021-02-09', '2021-02-18') == [datetime.date(2021, 2, 9), datetime.date(2021, 2, 10),
+                                                            datetime.date(2021, 2, 18)]
+
+
+def test_out_of_range(calendar):
+    assert calendar.prev_index('2021-02-07') == -1
+    assert calendar.next_index('2021-02-20') == len(calendar)
+    with pytest.raises(ValueError, match='2021-02-07'):
+        calendar.prev_date('2021-02-07')
+    with pytest.raises(ValueError, match='2021-02-20'):
+        calendar.next_date('2021-02-20')
+    with pytest.raises(ValueError):
+        TradingCalendar([]).prev_date('2021-02-07')